@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Approval queue for human-in-the-loop tool calls.
+
+When HumanInTheLoopMiddleware interrupts a session, the request is put on
+this queue instead of blocking the process on ``input()``. The session waits
+on its approval asynchronously, and other sessions keep running. Requests
+and decisions are persisted in SQLite, so they survive a restart. A decision
+made while the agent is down is picked up when the session is resumed.
+
+Decisions can come from:
+  - ``decide()`` in the same process, e.g. the HTTP endpoint of ApprovalServer
+  - another process writing the same database, e.g. ``panda_cli.py approvals approve ID``
+  - a JSON file dropped into the inbox directory:
+    ``{"id": "...", "decision": "approve"}`` or ``{"id": "...", "decisions": [...]}``
+
+Per-tool policies approve or reject a call without asking a human. A request is
+only decided automatically when a policy covers every action in it. Otherwise
+the whole request goes to a human, because the middleware expects all of its
+decisions at once.
+
+This module only uses the standard library, so the CLI can import it cheaply.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+# A policy is "approve", "reject", or a callable that takes the action request
+# ({"name", "args", "description"}) and returns one of those, or None to ask a human
+Policy = Union[str, Callable[[Dict[str, Any]], Optional[str]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS approvals (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    interrupt_id TEXT NOT NULL,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    decisions TEXT,
+    decided_by TEXT,
+    created REAL NOT NULL,
+    decided REAL,
+    UNIQUE (thread_id, interrupt_id)
+);
+CREATE INDEX IF NOT EXISTS approvals_status ON approvals (status, created);
+"""
+
+AUTO_DECISIONS = ("approve", "reject")
+# An inbox file that is not valid JSON yet is retried for this long before it is set aside
+INBOX_WRITE_GRACE_S = 5.0
+
+
+@dataclass
+class Approval:
+    """One interrupt waiting for (or holding) a human decision."""
+
+    id: str
+    thread_id: str
+    interrupt_id: str
+    request: Dict[str, Any]
+    status: str
+    decisions: Optional[List[Dict[str, Any]]] = None
+    decided_by: Optional[str] = None
+    created: float = 0.0
+    decided: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "thread_id": self.thread_id,
+            "status": self.status,
+            "actions": self.request.get("action_requests", []),
+            "allowed_decisions": [c.get("allowed_decisions") for c in self.request.get("review_configs", [])],
+            "decisions": self.decisions,
+            "decided_by": self.decided_by,
+            "created": self.created,
+            "decided": self.decided,
+        }
+
+
+def expand_decision(request: Dict[str, Any], decision: str, message: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Apply one decision type ("approve" or "reject") to every action of ``request``."""
+    if decision not in AUTO_DECISIONS:
+        raise ValueError(f"decision must be one of {AUTO_DECISIONS}, got {decision!r}")
+    item = {"type": decision}
+    if decision == "reject" and message:
+        item["message"] = message
+    return [dict(item) for _ in request.get("action_requests", [])]
+
+
+class ApprovalQueue:
+    """Persistent queue of pending tool-call approvals, shared by all sessions of a process."""
+
+    def __init__(self, path: str = ".panda_cache/approvals.db", inbox: Optional[str] = ".panda_cache/approvals",
+                 policies: Optional[Dict[str, Policy]] = None, poll_interval: float = 0.5):
+        """
+        Args:
+            path: SQLite database, created if missing. Several processes may share it.
+            inbox: Directory scanned for dropped decision files, None to disable.
+            policies: Tool name -> policy. The key "*" applies to tools without their own entry.
+            poll_interval: Seconds between checks for decisions made outside this process.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if inbox:
+            os.makedirs(inbox, exist_ok=True)
+        self.path = path
+        self.inbox = inbox
+        self.policies = dict(policies or {})
+        self.poll_interval = poll_interval
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        # approval id -> callbacks run with the decisions, from whichever thread decided
+        self._waiters: Dict[str, List[Callable[[List[Dict[str, Any]]], None]]] = {}
+        # One thread polls for outside decisions on behalf of every waiter, while there are any
+        self._poller: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    # -- requests --------------------------------------------------------------------------
+
+    def submit(self, thread_id: str, interrupt: Any) -> str:
+        """
+        Record the interrupt of ``thread_id`` and return its approval id.
+
+        Submitting the same interrupt again (a resumed session re-raises it) returns the
+        existing approval, including a decision made in the meantime.
+        """
+        interrupt_id = getattr(interrupt, "id", None) or uuid.uuid4().hex
+        request = getattr(interrupt, "value", interrupt)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id FROM approvals WHERE thread_id = ? AND interrupt_id = ?", (thread_id, interrupt_id)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            approval_id = uuid.uuid4().hex[:12]
+            decisions = self._auto_decisions(request)
+            self.conn.execute(
+                "INSERT INTO approvals (id, thread_id, interrupt_id, request, status, decisions, decided_by, created,"
+                " decided) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    approval_id, thread_id, interrupt_id, json.dumps(request, ensure_ascii=False, default=str),
+                    "pending" if decisions is None else "decided",
+                    None if decisions is None else json.dumps(decisions, ensure_ascii=False),
+                    None if decisions is None else "policy",
+                    time.time(), None if decisions is None else time.time(),
+                ),
+            )
+        return approval_id
+
+    def _auto_decisions(self, request: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        decisions = []
+        for action in request.get("action_requests", []) if isinstance(request, dict) else []:
+            policy = self.policies.get(action.get("name"), self.policies.get("*"))
+            decision = policy(action) if callable(policy) else policy
+            if decision not in AUTO_DECISIONS:
+                return None
+            item = {"type": decision}
+            if decision == "reject":
+                item["message"] = f"Tool {action.get('name')} is not allowed by policy."
+            decisions.append(item)
+        return decisions or None
+
+    def get(self, approval_id: str) -> Optional[Approval]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, thread_id, interrupt_id, request, status, decisions, decided_by, created, decided"
+                " FROM approvals WHERE id = ?", (approval_id,)
+            ).fetchone()
+        return None if row is None else self._approval(row)
+
+    def pending(self, thread_id: Optional[str] = None) -> List[Approval]:
+        """Approvals still waiting for a human, oldest first."""
+        query = ("SELECT id, thread_id, interrupt_id, request, status, decisions, decided_by, created, decided"
+                 " FROM approvals WHERE status = 'pending'")
+        params = ()
+        if thread_id is not None:
+            query += " AND thread_id = ?"
+            params = (thread_id,)
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY created", params).fetchall()
+        return [self._approval(row) for row in rows]
+
+    @staticmethod
+    def _approval(row) -> Approval:
+        return Approval(
+            id=row[0], thread_id=row[1], interrupt_id=row[2], request=json.loads(row[3]), status=row[4],
+            decisions=json.loads(row[5]) if row[5] else None, decided_by=row[6], created=row[7], decided=row[8],
+        )
+
+    # -- decisions -------------------------------------------------------------------------
+
+    def decide(self, approval_id: str, decisions: Union[str, List[Dict[str, Any]]], message: Optional[str] = None,
+               decided_by: str = "human") -> Approval:
+        """
+        Record the decisions for a pending approval and wake the session waiting on it.
+
+        Args:
+            decisions: One decision per action of the request, in the format of
+                HumanInTheLoopMiddleware, or "approve"/"reject" for all of them.
+            message: Reason given to the model when ``decisions`` is "reject".
+
+        Raises:
+            KeyError: There is no approval with this id.
+            ValueError: It was already decided, or the decisions don't fit the request.
+        """
+        with self._lock:
+            approval = self.get(approval_id)
+            if approval is None:
+                raise KeyError(approval_id)
+            if approval.status != "pending":
+                raise ValueError(f"approval {approval_id} was already decided")
+            if isinstance(decisions, str):
+                decisions = expand_decision(approval.request, decisions, message)
+            self._validate(approval.request, decisions)
+            # Conditional, so that of several writers of the database (other processes too) one wins
+            updated = self.conn.execute(
+                "UPDATE approvals SET status = 'decided', decisions = ?, decided_by = ?, decided = ?"
+                " WHERE id = ? AND status = 'pending'",
+                (json.dumps(decisions, ensure_ascii=False), decided_by, time.time(), approval_id),
+            ).rowcount
+            if updated == 0:
+                raise ValueError(f"approval {approval_id} was already decided")
+        self._notify(approval_id, decisions)
+        return self.get(approval_id)
+
+    @staticmethod
+    def _validate(request: Dict[str, Any], decisions: List[Dict[str, Any]]):
+        actions = request.get("action_requests", [])
+        configs = request.get("review_configs", [])
+        if not isinstance(decisions, list) or len(decisions) != len(actions):
+            raise ValueError(f"expected {len(actions)} decisions, got {decisions!r}")
+        allowed_by_name = {c.get("action_name"): c.get("allowed_decisions") for c in configs}
+        for action, decision in zip(actions, decisions):
+            allowed = allowed_by_name.get(action.get("name"))
+            kind = decision.get("type") if isinstance(decision, dict) else None
+            if allowed is not None and kind not in allowed:
+                raise ValueError(f"decision {kind!r} is not allowed for {action.get('name')}, expected one of {allowed}")
+
+    def decisions(self, approval_id: str) -> Optional[List[Dict[str, Any]]]:
+        """The decisions of an approval, None while it is pending."""
+        approval = self.get(approval_id)
+        return None if approval is None or approval.status != "decided" else approval.decisions
+
+    def _notify(self, approval_id: str, decisions: List[Dict[str, Any]]):
+        with self._lock:
+            callbacks = self._waiters.pop(approval_id, [])
+        for callback in callbacks:
+            callback(decisions)
+
+    def _add_waiter(self, approval_id: str, callback: Callable[[List[Dict[str, Any]]], None]):
+        with self._lock:
+            self._waiters.setdefault(approval_id, []).append(callback)
+            if self._poller is None and not self._closed.is_set():
+                self._poller = threading.Thread(target=self._poll_while_waited_on, name="approval-poller",
+                                                daemon=True)
+                self._poller.start()
+
+    def _poll_while_waited_on(self):
+        while not self._closed.wait(self.poll_interval):
+            with self._lock:
+                if not self._waiters:
+                    # Under the lock, so that the next _add_waiter starts a new poller
+                    self._poller = None
+                    return
+            try:
+                self.poll()
+            except sqlite3.Error:
+                if self._closed.is_set():
+                    return
+                # E.g. another writer holds the database; the next round tries again
+
+    def _remove_waiter(self, approval_id: str, callback: Callable[[List[Dict[str, Any]]], None]):
+        with self._lock:
+            callbacks = self._waiters.get(approval_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._waiters.pop(approval_id, None)
+
+    def poll(self) -> int:
+        """
+        Pick up decisions made outside this process: dropped inbox files and other
+        writers of the database. Returns the number of waiting sessions woken up.
+        """
+        if self.inbox:
+            self._read_inbox()
+        with self._lock:
+            waiting = list(self._waiters)
+            # One query for all waiting sessions, in chunks below SQLite's limit of bound parameters
+            decided = []
+            for start in range(0, len(waiting), 500):
+                chunk = waiting[start:start + 500]
+                decided.extend(self.conn.execute(
+                    f"SELECT id, decisions FROM approvals WHERE status = 'decided'"
+                    f" AND id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        for approval_id, decisions in decided:
+            self._notify(approval_id, json.loads(decisions))
+        return len(decided)
+
+    def _read_inbox(self):
+        for path in sorted(glob.glob(os.path.join(self.inbox, "*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    drop = json.load(f)
+            except OSError:
+                continue
+            except ValueError as e:
+                try:
+                    written = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                if time.time() - written < INBOX_WRITE_GRACE_S:
+                    # Probably still being written; read it again on the next poll
+                    continue
+                self._set_aside(path, e)
+                continue
+            # Claim the file, so that concurrent pollers (threads or processes) apply it once
+            claimed = f"{path}.{uuid.uuid4().hex}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                self.decide(drop["id"], drop.get("decisions") or drop["decision"], drop.get("message"),
+                            decided_by=drop.get("decided_by", "inbox"))
+            except (ValueError, KeyError, TypeError) as e:
+                self._set_aside(claimed, e, path)
+                continue
+            os.remove(claimed)
+
+    @staticmethod
+    def _set_aside(path: str, error: Exception, name: Optional[str] = None):
+        # Keep the file for inspection, but never read it again
+        name = name or path
+        try:
+            os.replace(path, f"{name}.error")
+        except FileNotFoundError:
+            return
+        with open(f"{name}.error.txt", "w", encoding="utf-8") as f:
+            f.write(f"{type(error).__name__}: {error}\n")
+
+    # -- waiting ---------------------------------------------------------------------------
+
+    async def wait(self, approval_id: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Wait for the decisions of ``approval_id`` without blocking the event loop.
+
+        A decision made in this process wakes the waiter directly. One poller thread
+        per queue picks up outside decisions for every waiter, so many waiting sessions
+        cost one database query per ``poll_interval``, none of it on the loop.
+
+        Raises:
+            asyncio.TimeoutError: No decision within ``timeout`` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake(decisions):
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(decisions))
+
+        self._add_waiter(approval_id, wake)
+        try:
+            # Decided before the waiter was registered
+            decisions = await asyncio.to_thread(self.decisions, approval_id)
+            if decisions is not None:
+                return decisions
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"no decision for approval {approval_id}") from None
+        finally:
+            self._remove_waiter(approval_id, wake)
+
+    def wait_sync(self, approval_id: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Blocking version of :meth:`wait`, for the single-session console drivers."""
+        event = threading.Event()
+        woken: List[List[Dict[str, Any]]] = []
+
+        def wake(decisions):
+            woken.append(decisions)
+            event.set()
+
+        self._add_waiter(approval_id, wake)
+        try:
+            decisions = self.decisions(approval_id)
+            if decisions is not None:
+                return decisions
+            if not event.wait(timeout):
+                raise TimeoutError(f"no decision for approval {approval_id}")
+            return woken[0]
+        finally:
+            self._remove_waiter(approval_id, wake)
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self.conn.close()
+
+
+class ApprovalServer:
+    """
+    Local HTTP endpoint for decisions, served from a daemon thread.
+
+      GET  /approvals          pending approvals
+      GET  /approvals/<id>     one approval
+      POST /approvals/<id>     {"decision": "approve"} | {"decision": "reject", "message": "..."} | {"decisions": [...]}
+    """
+
+    def __init__(self, queue: ApprovalQueue, host: str = "127.0.0.1", port: int = 0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        approvals = queue
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: Any):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _approval_id(self) -> Optional[str]:
+                parts = self.path.strip("/").split("/")
+                return parts[1] if len(parts) == 2 and parts[0] == "approvals" else None
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/approvals":
+                    return self._reply(200, [a.to_dict() for a in approvals.pending()])
+                approval = approvals.get(self._approval_id() or "")
+                if approval is None:
+                    return self._reply(404, {"error": "not found"})
+                self._reply(200, approval.to_dict())
+
+            def do_POST(self):
+                approval_id = self._approval_id()
+                if approval_id is None:
+                    return self._reply(404, {"error": "not found"})
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                    approval = approvals.decide(approval_id, body.get("decisions") or body["decision"],
+                                                body.get("message"), decided_by=body.get("decided_by", "http"))
+                except KeyError as e:
+                    return self._reply(404 if e.args == (approval_id,) else 400, {"error": f"missing {e}"})
+                except (ValueError, TypeError, AttributeError) as e:
+                    return self._reply(409 if "already decided" in str(e) else 400, {"error": str(e)})
+                self._reply(200, approval.to_dict())
+
+            def log_message(self, format, *args):
+                pass
+
+        self.queue = queue
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="approval-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ApprovalServer":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Test script for the approval queue and approval-driven resumes in AsyncAgentRunner."""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+import pytest
+from langchain.agents import create_agent
+from langchain.agents.middleware import HumanInTheLoopMiddleware
+from langchain_core.messages import ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Interrupt
+
+from approval.approval_queue import ApprovalQueue, ApprovalServer
+from models.scripted_model import ScriptedChatModel
+from runner.async_agent_runner import AsyncAgentRunner, build_async_coding_agent
+
+
+def _request(*names):
+    return {
+        "action_requests": [{"name": name, "args": {}, "description": name} for name in names],
+        "review_configs": [{"action_name": name, "allowed_decisions": ["approve", "reject"]} for name in names],
+    }
+
+
+def _queue(tmp, **kwargs):
+    return ApprovalQueue(os.path.join(tmp, "approvals.db"), inbox=os.path.join(tmp, "inbox"), poll_interval=0.05,
+                         **kwargs)
+
+
+def test_policies_resubmits_and_validation():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = _queue(tmp, policies={"read_file": "approve", "rm": "reject"})
+        auto = queue.submit("t1", Interrupt(_request("read_file", "rm"), id="i1"))
+        assert [d["type"] for d in queue.decisions(auto)] == ["approve", "reject"]
+        assert queue.get(auto).decided_by == "policy"
+
+        pending = queue.submit("t1", Interrupt(_request("read_file", "write_file"), id="i2"))
+        assert queue.decisions(pending) is None
+        # A resumed session re-raises the same interrupt and gets the same approval back
+        assert queue.submit("t1", Interrupt(_request("read_file", "write_file"), id="i2")) == pending
+        assert [a.id for a in queue.pending()] == [pending]
+
+        with pytest.raises(ValueError):
+            queue.decide(pending, [{"type": "approve"}])
+        with pytest.raises(ValueError):
+            queue.decide(pending, [{"type": "approve"}, {"type": "edit"}])
+        with pytest.raises(KeyError):
+            queue.decide("missing", "approve")
+        queue.decide(pending, "reject", "no")
+        assert queue.decisions(pending) == [{"type": "reject", "message": "no"}] * 2
+        with pytest.raises(ValueError):
+            queue.decide(pending, "approve")
+
+        # Persisted: a new queue on the same database sees the decision
+        assert _queue(tmp).decisions(pending) == [{"type": "reject", "message": "no"}] * 2
+
+
+def test_decisions_from_inbox_another_process_and_http():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = _queue(tmp)
+        dropped = queue.submit("t", Interrupt(_request("a"), id="i1"))
+        other = queue.submit("t", Interrupt(_request("b"), id="i2"))
+        posted = queue.submit("t", Interrupt(_request("c"), id="i3"))
+
+        async def decide_later():
+            await asyncio.sleep(0.1)
+            with open(os.path.join(tmp, "inbox", "d.json"), "w", encoding="utf-8") as f:
+                json.dump({"id": dropped, "decision": "approve"}, f)
+            _queue(tmp).decide(other, "reject")
+
+        async def main():
+            decider = asyncio.create_task(decide_later())
+            results = await asyncio.gather(queue.wait(dropped, timeout=5), queue.wait(other, timeout=5))
+            await decider
+            return results
+
+        assert asyncio.run(main()) == [[{"type": "approve"}], [{"type": "reject"}]]
+        assert os.listdir(os.path.join(tmp, "inbox")) == []
+
+        server = ApprovalServer(queue).start()
+        try:
+            with urllib.request.urlopen(f"{server.url}/approvals") as response:
+                assert [a["id"] for a in json.load(response)] == [posted]
+            post = urllib.request.Request(f"{server.url}/approvals/{posted}", method="POST",
+                                          data=json.dumps({"decision": "approve"}).encode())
+            with urllib.request.urlopen(post) as response:
+                assert json.load(response)["status"] == "decided"
+        finally:
+            server.close()
+        assert queue.wait_sync(posted, timeout=1) == [{"type": "approve"}]
+        with pytest.raises(TimeoutError):
+            queue.wait_sync(queue.submit("t", Interrupt(_request("d"), id="i4")), timeout=0.1)
+
+
+def test_concurrent_decisions_and_waiters():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue, other = _queue(tmp), _queue(tmp)
+        approval_id = queue.submit("t", Interrupt(_request("a"), id="i1"))
+        # The other process read the approval while it was still pending, then lost the race
+        stale = other.get(approval_id)
+        queue.decide(approval_id, "approve")
+        other.get = lambda _: stale
+        with pytest.raises(ValueError, match="already decided"):
+            other.decide(approval_id, "reject")
+        assert queue.decisions(approval_id) == [{"type": "approve"}]
+
+        # A waiter that gives up leaves the others on the same approval registered
+        pending = queue.submit("t", Interrupt(_request("b"), id="i2"))
+        woken = []
+        queue._add_waiter(pending, woken.append)
+        with pytest.raises(TimeoutError):
+            queue.wait_sync(pending, timeout=0.1)
+        queue.decide(pending, "approve")
+        assert woken == [[{"type": "approve"}]]
+
+
+def test_many_waiters_share_one_poller():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = _queue(tmp)
+        ids = [queue.submit("t", Interrupt(_request("a"), id=f"i{k}")) for k in range(200)]
+        polls = []
+        poll = queue.poll
+        queue.poll = lambda: polls.append(threading.current_thread().name) or poll()
+
+        async def main():
+            waiting = asyncio.gather(*(queue.wait(approval_id, timeout=5) for approval_id in ids))
+            await asyncio.sleep(0.2)
+            # Decided by another process: only the poller can see it
+            outside = _queue(tmp)
+            for approval_id in ids:
+                outside.decide(approval_id, "approve")
+            return await waiting
+
+        assert asyncio.run(main()) == [[{"type": "approve"}]] * 200
+        # One poll per interval for all 200 waiters, never on the event loop's thread
+        assert 0 < len(polls) < 20 and set(polls) == {"approval-poller"}
+        time.sleep(0.2)
+        assert queue._poller is None
+
+
+def write_note(text: str) -> str:
+    """Write a note."""
+    return f"wrote {text}"
+
+
+def test_waiting_session_does_not_hold_a_concurrency_slot():
+    model = ScriptedChatModel(script=[{"name": "write_note", "args": {"text": "hi"}}])
+    agent = create_agent(
+        model=model,
+        tools=[write_note],
+        middleware=[HumanInTheLoopMiddleware(interrupt_on={"write_note": True})],
+        checkpointer=InMemorySaver(),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = _queue(tmp)
+        # One slot: if the waiting session kept it, none of the others could run
+        runner = AsyncAgentRunner(agent, max_concurrency=1, approvals=queue)
+
+        async def approve_all_but_held(stop):
+            while not stop.is_set():
+                for approval in queue.pending():
+                    if approval.thread_id != "held":
+                        queue.decide(approval.id, "approve")
+                await asyncio.sleep(0.01)
+
+        async def main():
+            stop = asyncio.Event()
+            approver = asyncio.create_task(approve_all_but_held(stop))
+            held = asyncio.create_task(runner.run("go", session_id="held"))
+            others = await asyncio.wait_for(
+                asyncio.gather(*(runner.run("go", session_id=f"s{i}") for i in range(10))), 10
+            )
+            stop.set()
+            await approver
+            assert not held.done()
+            [approval] = queue.pending()
+            queue.decide(approval.id, "reject", "not now")
+            return others, await asyncio.wait_for(held, 5)
+
+        others, held = asyncio.run(main())
+        assert all(r.error is None and r.final_message.content == "done" for r in others)
+        assert all(len(r.interrupts) == 1 for r in others)
+        assert held.error is None and held.approval_wait > 0
+        state = agent.get_state({"configurable": {"thread_id": "held"}})
+        rejected = [m for m in state.values["messages"] if isinstance(m, ToolMessage)]
+        assert rejected and "not now" in rejected[0].content
+
+
+def test_approved_sessions_resume_on_the_default_async_agent():
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "note.txt")
+        model = ScriptedChatModel(script=[{"name": "write_file", "args": {"file_path": target, "content": "hi"}}])
+        queue = _queue(tmp)
+        with pytest.raises(ValueError, match="checkpointer"):
+            AsyncAgentRunner(create_agent(model=model, tools=[write_note]), approvals=queue)
+        # No checkpointer passed: the builder keeps the sessions in memory so they can be resumed
+        runner = AsyncAgentRunner(build_async_coding_agent(model, interrupt_on={"write_file": True}),
+                                  approvals=queue)
+
+        async def main():
+            session = asyncio.create_task(runner.run("write a note"))
+            while not queue.pending():
+                await asyncio.sleep(0.01)
+            queue.decide(queue.pending()[0].id, "approve")
+            return await asyncio.wait_for(session, 10)
+
+        result = asyncio.run(main())
+        assert result.error is None and len(result.interrupts) == 1 and result.final_message.content == "done"
+        with open(target) as f:
+            assert f.read() == "hi"
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the CLI, based on ``python -X importtime``.
+
+For each module it imports the module in a fresh interpreter with
+``-X importtime``, and reports the cumulative import time, the heaviest
+imports, and whether any of the heavy frameworks (langchain, langgraph,
+openai, ...) were loaded. It also times ``panda_cli.py --help`` end to end.
+The script exits with status 1 when a threshold is exceeded or a forbidden
+module is imported, so it can guard against regressions in CI.
+
+Usage:
+    python bench_panda_cli.py
+    python bench_panda_cli.py --max-import-ms 150 --max-help-ms 400 --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MODULES = ["panda_cli", "panda_coding_agent"]
+# Loading any of these at import time costs hundreds of milliseconds
+FORBIDDEN = ["langchain", "langchain_core", "langchain_openai", "langgraph", "openai", "diskcache", "httpx"]
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_times(module: str) -> List[Tuple[int, int, str]]:
+    """(self_us, cumulative_us, name) for every import made by ``import module`` in a fresh interpreter.
+
+    Imports done by interpreter start-up (site, .pth files) are left out.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), len(match.group(3)), match.group(4)))
+    # A module is reported after everything it imported, with those imports indented deeper
+    end = max(i for i, row in enumerate(rows) if row[3] == module)
+    start = end
+    while start > 0 and rows[start - 1][2] > rows[end][2]:
+        start -= 1
+    return [(self_us, cumulative_us, name) for self_us, cumulative_us, _, name in rows[start:end + 1]]
+
+
+def measure_module(module: str, runs: int) -> Dict:
+    samples = [import_times(module) for _ in range(runs)]
+    rows = samples[-1]
+    loaded = {name for _, _, name in rows}
+    return {
+        # The module itself is the last row of its subtree
+        "import_ms": statistics.median(rows[-1][1] for rows in samples) / 1000,
+        "heaviest": sorted(rows[:-1], key=lambda row: row[1], reverse=True)[:5],
+        "forbidden": sorted({name.split(".")[0] for name in loaded} & set(FORBIDDEN)),
+    }
+
+
+def measure_help(runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "panda_cli.py", "--help"], cwd=ROOT, capture_output=True, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=150.0, help="threshold per module (cumulative)")
+    parser.add_argument("--max-help-ms", type=float, default=400.0, help="threshold for `panda_cli.py --help`")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in MODULES:
+        result = measure_module(module, args.runs)
+        print(f"{module}: {result['import_ms']:.1f} ms")
+        for self_us, cumulative_us, name in result["heaviest"]:
+            print(f"    {cumulative_us / 1000:>8.1f} ms  {name}")
+        if result["import_ms"] > args.max_import_ms:
+            failures.append(f"import {module} took {result['import_ms']:.1f} ms > {args.max_import_ms} ms")
+        if result["forbidden"]:
+            failures.append(f"import {module} loads {', '.join(result['forbidden'])}")
+
+    help_ms = measure_help(args.runs)
+    print(f"panda_cli.py --help: {help_ms:.1f} ms (interpreter start included)")
+    if help_ms > args.max_help_ms:
+        failures.append(f"panda_cli.py --help took {help_ms:.1f} ms > {args.max_help_ms} ms")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
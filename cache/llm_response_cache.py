@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for chat model responses, with record/replay modes.
+
+Plug it into any langchain chat model through its ``cache`` field::
+
+    model = ChatOpenAI(..., cache=DiskResponseCache(".panda_cache/llm"))
+
+Entries are keyed by a canonical SHA-256 of the model configuration (model
+name, params and bound tool schemas, i.e. langchain's ``llm_string``) and the
+messages with volatile fields such as message ids and usage metadata removed,
+so re-running an identical task hits the cache.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from diskcache import Cache
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.outputs import ChatGeneration
+
+
+# Serialized message fields that differ between otherwise identical runs
+_VOLATILE_KEYS = frozenset({"id", "response_metadata", "usage_metadata"})
+
+MODES = ("auto", "record", "replay")
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        kwargs = value.get("kwargs")
+        if value.get("lc") == 1 and isinstance(kwargs, dict):
+            # Serialized langchain object: drop per-run fields from its kwargs only
+            value = {**value, "kwargs": {k: v for k, v in kwargs.items() if k not in _VOLATILE_KEYS}}
+        return {k: _strip_volatile(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Canonical hash of a request: serialized messages plus model/params/tools string."""
+    try:
+        prompt = json.dumps(_strip_volatile(json.loads(prompt)), sort_keys=True, ensure_ascii=False,
+                            separators=(",", ":"))
+    except ValueError:
+        pass
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DiskResponseCache(BaseCache):
+    """Chat model response cache backed by diskcache, with size-based LRU eviction."""
+
+    def __init__(self, directory: str = ".panda_cache/llm", size_limit: int = 1 << 30, mode: str = "auto"):
+        """
+        Args:
+            directory: Directory holding the cache database.
+            size_limit: Maximum size on disk in bytes; least recently used entries are evicted beyond it.
+            mode: "auto" serves hits and records misses, "record" always calls the model and
+                overwrites entries, "replay" serves hits only and raises CacheMissError on a miss,
+                which keeps offline tests deterministic.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode: {mode}. Must be one of: {', '.join(MODES)}")
+        self.mode = mode
+        self._cache = Cache(directory, size_limit=size_limit, eviction_policy="least-recently-used")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.mode == "record":
+            return None
+        key = cache_key(prompt, llm_string)
+        value = self._cache.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None and self.mode == "replay":
+            raise CacheMissError(f"No recorded response for request {key[:16]} (replay mode)")
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.mode == "replay":
+            return
+        self._cache.set(cache_key(prompt, llm_string), self._normalize(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        self._cache.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def _normalize(return_val: Sequence[Any]):
+        # The model assigns a fresh run id to cached messages without one, so replays never collide
+        return [
+            ChatGeneration(message=g.message.model_copy(update={"id": None}), generation_info=g.generation_info)
+            if isinstance(g, ChatGeneration) and g.message.id is not None
+            else g
+            for g in return_val
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current size on disk."""
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._cache),
+            "size_bytes": self._cache.volume(),
+        }
+
+    def close(self):
+        self._cache.close()
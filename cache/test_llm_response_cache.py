@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Test script for DiskResponseCache."""
+
+import tempfile
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from cache.llm_response_cache import CacheMissError, DiskResponseCache
+
+
+def _model(cache, replies):
+    return GenericFakeChatModel(messages=iter(AIMessage(content=r) for r in replies), cache=cache)
+
+
+def test_identical_requests_hit_the_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskResponseCache(directory)
+        first = _model(cache, ["first"]).invoke([HumanMessage(content="hello", id="a")])
+        # A new model whose only reply differs proves the answer came from disk; the message id differs too
+        second = _model(cache, ["second"]).invoke([HumanMessage(content="hello", id="b")])
+
+        assert first.content == second.content == "first"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+
+def test_replay_mode_raises_on_miss():
+    with tempfile.TemporaryDirectory() as directory:
+        _model(DiskResponseCache(directory), ["recorded"]).invoke("known")
+
+        replay = DiskResponseCache(directory, mode="replay")
+        assert _model(replay, ["live"]).invoke("known").content == "recorded"
+        with pytest.raises(CacheMissError):
+            _model(replay, ["live"]).invoke("unknown")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Per-step checkpoint overhead at different session lengths.
+
+Simulates an agent step (one AIMessage plus one ToolMessage appended to the
+history) and times ``put`` at 10, 100 and 1000 messages for:
+  delta:  SqliteDeltaSaver (only the new messages are written)
+  full:   SqliteDeltaSaver with snapshot_every=1 (whole history every step)
+  memory: langgraph's InMemorySaver, for reference (serializes the whole history)
+
+Usage:
+    python checkpoint/bench_sqlite_checkpointer.py --sizes 10 100 1000 --steps 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from checkpoint.sqlite_checkpointer import SqliteDeltaSaver
+
+PAYLOAD = "def hello_world():\n    return True\n" * 30  # ~1KB tool result
+
+
+def _step(i: int):
+    call = {"name": "read_file", "args": {"file_path": f"f{i}.py"}, "id": f"call_{i}"}
+    return [
+        AIMessage(content="", tool_calls=[call], id=f"ai_{i}"),
+        ToolMessage(content=PAYLOAD, tool_call_id=f"call_{i}", name="read_file", id=f"tool_{i}"),
+    ]
+
+
+def bench(saver, size: int, steps: int) -> float:
+    """Average seconds per put() once the history holds ``size`` messages."""
+    config = {"configurable": {"thread_id": f"bench-{size}", "checkpoint_ns": ""}}
+    messages = [HumanMessage(content="fix the bug", id="human")]
+    checkpoint = empty_checkpoint()
+    version = None
+    i = 0
+    elapsed = 0.0
+    while len(messages) < size + 2 * steps:
+        # Like add_messages: a new list that reuses the existing message objects
+        messages = messages + _step(i)
+        version = saver.get_next_version(version, None)
+        checkpoint = create_checkpoint(checkpoint, None, i)
+        checkpoint["channel_values"] = {"messages": messages}
+        checkpoint["channel_versions"] = {"messages": version}
+        started = time.perf_counter()
+        config = saver.put(config, checkpoint, {"step": i}, {"messages": version})
+        if len(messages) > size:
+            elapsed += time.perf_counter() - started
+        i += 1
+    return elapsed / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--steps", type=int, default=50, help="timed steps per size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        savers = {
+            "delta": SqliteDeltaSaver(os.path.join(directory, "delta.db")),
+            "full": SqliteDeltaSaver(os.path.join(directory, "full.db"), snapshot_every=1),
+            "memory": InMemorySaver(),
+        }
+        print(f"{'messages':>9}" + "".join(f"{name + ' ms/step':>17}" for name in savers))
+        for size in args.sizes:
+            row = [bench(saver, size, args.steps) for saver in savers.values()]
+            print(f"{size:>9}" + "".join(f"{value * 1000:>17.3f}" for value in row))
+        for saver in savers.values():
+            if isinstance(saver, SqliteDeltaSaver):
+                saver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Durable SQLite checkpointer for agent sessions.
+
+Stores LangGraph checkpoints in a local SQLite database (WAL mode) so a crash
+or restart doesn't lose a coding session: invoking the agent again with the
+same ``thread_id`` resumes from the last checkpoint.
+
+Only what changed is written per step. Channels are stored per version (only
+``new_versions`` are written), and list channels such as ``messages`` are
+stored as deltas: the number of items kept from the previous version plus
+the new tail. The shared prefix is detected by object identity, which costs
+a pointer comparison per item instead of re-serializing the whole history.
+Every ``snapshot_every`` deltas a full copy is written so a resume never has
+to replay a long chain.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    -- list deltas: value = base[:keep] + blob
+    base_version TEXT,
+    keep INTEGER,
+    depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    blob BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# Delta rows store "delta:<serde type>" in the type column
+_DELTA = "delta:"
+_EMPTY = "empty"
+
+
+class SqliteDeltaSaver(BaseCheckpointSaver[str]):
+    """Checkpointer backed by SQLite in WAL mode that writes only per-step deltas."""
+
+    def __init__(self, path: str = ".panda_cache/checkpoints.db", snapshot_every: int = 50,
+                 max_cached_threads: int = 256, serde=None):
+        """
+        Args:
+            path: SQLite database file, created with its directory if missing. ":memory:" works for tests.
+            snapshot_every: Write a full copy of a list channel after this many deltas.
+                1 disables deltas.
+            max_cached_threads: Threads whose last list values are remembered for delta detection.
+        """
+        super().__init__(serde=serde)
+        if snapshot_every < 1:
+            raise ValueError("snapshot_every must be a positive integer")
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.max_cached_threads = max_cached_threads
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        # (thread_id, ns, channel) -> (version, items, depth) of the last list value seen
+        self._lists: "OrderedDict[Tuple[str, str, str], Tuple[str, tuple, int]]" = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ---- list delta bookkeeping ----
+
+    def _remember(self, key: Tuple[str, str, str], version: str, value: list, depth: int):
+        self._lists[key] = (version, tuple(value), depth)
+        self._lists.move_to_end(key)
+        while len(self._lists) > self.max_cached_threads * 4:
+            self._lists.popitem(last=False)
+
+    def _blob_row(self, thread_id: str, ns: str, channel: str, version: str, value: Any,
+                  remember: List[tuple]) -> tuple:
+        """Row of ``value``, a delta against the last list value seen when it extends it.
+
+        What to remember for the next delta is appended to ``remember``; the caller passes it
+        to :meth:`_remember` once the row is committed, so the cache never names a base that
+        was not stored.
+        """
+        key = (thread_id, ns, channel)
+        if isinstance(value, list):
+            previous = self._lists.get(key)
+            if previous is not None and previous[2] + 1 < self.snapshot_every:
+                base_version, base_items, depth = previous
+                keep = 0
+                for old, new in zip(base_items, value):
+                    if old is not new:
+                        break
+                    keep += 1
+                if keep:
+                    remember.append((key, version, value, depth + 1))
+                    type_, blob = self.serde.dumps_typed(value[keep:])
+                    return (thread_id, ns, channel, version, _DELTA + type_, blob, base_version, keep, depth + 1)
+            remember.append((key, version, value, 0))
+        type_, blob = self.serde.dumps_typed(value)
+        return (thread_id, ns, channel, version, type_, blob, None, None, 0)
+
+    def _load_blob(self, thread_id: str, ns: str, channel: str, version: str) -> Tuple[Any, int]:
+        """Return (value, delta depth) of a stored channel version; value is None when absent."""
+        row = self.conn.execute(
+            "SELECT type, blob, base_version, keep, depth FROM blobs "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            (thread_id, ns, channel, version),
+        ).fetchone()
+        if row is None:
+            return None, 0
+        type_, blob, base_version, keep, depth = row
+        if type_ == _EMPTY:
+            return None, 0
+        if not type_.startswith(_DELTA):
+            return self.serde.loads_typed((type_, blob)), 0
+        # Walk back to the nearest full snapshot, then apply the deltas forward
+        chain = [(type_, blob, keep)]
+        while True:
+            type_, blob, base, keep = self.conn.execute(
+                "SELECT type, blob, base_version, keep FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, ns, channel, base_version),
+            ).fetchone()
+            if not type_.startswith(_DELTA):
+                value = list(self.serde.loads_typed((type_, blob)))
+                break
+            chain.append((type_, blob, keep))
+            base_version = base
+        for type_, blob, keep in reversed(chain):
+            value = value[:keep] + list(self.serde.loads_typed((type_[len(_DELTA):], blob)))
+        return value, depth
+
+    def _load_channel_values(self, thread_id: str, ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        values = {}
+        for channel, version in versions.items():
+            value, depth = self._load_blob(thread_id, ns, channel, version)
+            if value is None:
+                continue
+            values[channel] = value
+            if isinstance(value, list):
+                # The graph keeps using these objects, so the next put can diff against them
+                self._remember((thread_id, ns, channel), version, value, depth)
+        return values
+
+    # ---- BaseCheckpointSaver ----
+
+    def _tuple(self, thread_id: str, ns: str, checkpoint_id: str, parent_id: Optional[str],
+               type_: str, checkpoint_blob: bytes, metadata_type: str, metadata_blob: bytes) -> CheckpointTuple:
+        checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channel_values(thread_id, ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, b))) for task_id, channel, t, b in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        args: Tuple[Any, ...] = (thread_id, ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            args += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self.conn.execute(query, args).fetchone()
+            if row is None:
+                return None
+            return self._tuple(thread_id, ns, *row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        clauses, args = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            args.append(config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                args.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                args.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            args.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self.conn.execute(query, args).fetchall()
+        for thread_id, ns, checkpoint_id, parent_id, type_, blob, metadata_type, metadata in rows:
+            if filter:
+                values = self.serde.loads_typed((metadata_type, metadata))
+                if not all(values.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            with self._lock:
+                item = self._tuple(thread_id, ns, checkpoint_id, parent_id, type_, blob, metadata_type, metadata)
+            yield item
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        remember: List[tuple] = []
+        with self._lock:
+            rows = [
+                self._blob_row(thread_id, ns, channel, version, values[channel], remember)
+                if channel in values
+                else (thread_id, ns, channel, version, _EMPTY, None, None, None, 0)
+                for channel, version in new_versions.items()
+            ]
+            type_, blob = self.serde.dumps_typed(stored)
+            metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO blobs "
+                    "(thread_id, checkpoint_ns, channel, version, type, blob, base_version, keep, depth) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     type_, blob, metadata_type, metadata_blob),
+                )
+            # Only after the commit: a failed write leaves the cache on the last stored versions
+            for entry in remember:
+                self._remember(*entry)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Regular writes are idempotent per task; special writes (errors, interrupts) overwrite
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, type_, blob, task_path))
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            for table in ("checkpoints", "blobs", "writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            for key in [k for k in self._lists if k[0] == thread_id]:
+                del self._lists[key]
+
+    def list_threads(self) -> List[str]:
+        """Thread ids with at least one checkpoint, most recently updated first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---- async API: SQLite calls are short, run them off the event loop ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in tuples:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Test script for SqliteDeltaSaver."""
+
+import os
+import sqlite3
+import tempfile
+from typing import Annotated, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from checkpoint.sqlite_checkpointer import SqliteDeltaSaver
+
+
+class _State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _graph(checkpointer):
+    def reply(state: _State):
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(_State)
+    builder.add_node("reply", reply)
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_session_survives_restart_and_writes_deltas():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "checkpoints.db")
+        config = {"configurable": {"thread_id": "session-1"}}
+
+        with SqliteDeltaSaver(path, snapshot_every=3) as saver:
+            graph = _graph(saver)
+            for i in range(4):
+                graph.invoke({"messages": f"question {i}"}, config)
+            types = [row[0] for row in saver.conn.execute(
+                "SELECT type FROM blobs WHERE channel = 'messages' ORDER BY version")]
+        # Full snapshots are interleaved with deltas
+        assert any(t.startswith("delta:") for t in types)
+        assert sum(not t.startswith("delta:") for t in types) >= 2
+
+        # A new process resumes the thread with the full history
+        with SqliteDeltaSaver(path, snapshot_every=3) as saver:
+            graph = _graph(saver)
+            result = graph.invoke({"messages": "question 4"}, config)
+            assert [m.content for m in result["messages"]][-2:] == ["question 4", "reply 9"]
+            assert len(result["messages"]) == 10
+            assert saver.list_threads() == ["session-1"]
+
+
+def test_failed_put_is_not_used_as_a_delta_base():
+    def put(saver, config, messages, version):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": messages}
+        checkpoint["channel_versions"] = {"messages": version}
+        return saver.put(config, checkpoint, {}, {"messages": version})
+
+    messages = [AIMessage(content=f"reply {i}") for i in range(3)]
+    with SqliteDeltaSaver(":memory:", snapshot_every=10) as saver:
+        first = put(saver, {"configurable": {"thread_id": "t"}}, messages[:1], "1")
+        saver.conn.execute("CREATE TEMP TRIGGER fail BEFORE INSERT ON checkpoints BEGIN SELECT RAISE(ABORT, 'full'); END")
+        with pytest.raises(sqlite3.IntegrityError):
+            put(saver, first, messages[:2], "2")
+        saver.conn.execute("DROP TRIGGER fail")
+        # A delta against version 2 could not be read back: that version was rolled back
+        last = put(saver, first, messages, "3")
+        assert saver.get_tuple(last).checkpoint["channel_values"]["messages"] == messages
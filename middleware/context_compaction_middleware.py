@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted context compaction for agents built with create_agent.
+
+Whole files from ``read_file`` and large ``custom_grep`` dumps stay in the
+message history forever, so every later model call pays for them again. Once
+the conversation grows past a token budget, this middleware replaces the
+oldest large ToolMessage payloads with short stubs. A stub names the tool
+call that produced the payload, so the model can simply call it again when it
+needs the content back.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+
+# Tools whose results are safe to drop: they can be re-fetched by calling the tool again
+COMPACTABLE_TOOLS = frozenset({"read_file", "custom_grep"})
+
+
+def default_stub(message: ToolMessage, tool_name: str, tool_args: Dict[str, Any], preview_lines: int = 3) -> str:
+    """Build the text that replaces a compacted tool result."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    lines = content.splitlines()
+    args = ", ".join(f"{k}={v!r}" for k, v in tool_args.items())
+    stub = (
+        f"[compacted] {tool_name}({args}) returned {len(content)} chars / {len(lines)} lines. "
+        f"The full result was removed to save context; call {tool_name} again with the same arguments if you need it."
+    )
+    if preview_lines > 0 and lines:
+        stub += "\nPreview:\n" + "\n".join(lines[:preview_lines])
+    return stub
+
+
+class ContextCompactionMiddleware(AgentMiddleware):
+    """Replace old, large tool results with re-fetchable stubs once the context exceeds a token budget."""
+
+    def __init__(
+        self,
+        max_tokens: int = 32 * 1024,
+        target_tokens: Optional[int] = None,
+        keep_recent: int = 4,
+        min_tokens: int = 200,
+        compactable_tools: Optional[Iterable[str]] = COMPACTABLE_TOOLS,
+        summarize: Optional[Callable[[ToolMessage, str, Dict[str, Any]], str]] = None,
+        token_counter: Callable[[List[BaseMessage]], int] = count_tokens_approximately,
+    ):
+        """
+        Args:
+            max_tokens: Token budget for the conversation sent to the model.
+            target_tokens: Size to compact down to once the budget is exceeded, 3/4 of
+                max_tokens by default. Compacting in batches rewrites the message history
+                (and so breaks the provider's cached prompt prefix) less often.
+            keep_recent: Number of most recent tool results that are never compacted.
+            min_tokens: Tool results smaller than this are not worth compacting.
+            compactable_tools: Names of the tools whose results may be compacted; None means all tools.
+            summarize: Custom stub builder ``(message, tool_name, tool_args) -> str``,
+                e.g. a cheap model summary. Defaults to :func:`default_stub`.
+            token_counter: Counts the tokens of a list of messages.
+        """
+        super().__init__()
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be a positive integer")
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens if target_tokens is not None else max_tokens * 3 // 4
+        self.keep_recent = keep_recent
+        self.min_tokens = min_tokens
+        self.compactable_tools = frozenset(compactable_tools) if compactable_tools is not None else None
+        self.summarize = summarize or default_stub
+        self.token_counter = token_counter
+        self.compacted_messages = 0
+        self.tokens_saved = 0
+
+    def before_model(self, state, runtime) -> Optional[Dict[str, Any]]:
+        replacements = self.compact(state["messages"])
+        if not replacements:
+            return None
+        # add_messages replaces messages with the same id, so the stubs overwrite the originals
+        return {"messages": replacements}
+
+    def compact(self, messages: List[BaseMessage]) -> List[ToolMessage]:
+        """Return stub ToolMessages for the oldest large results until the history is back under target."""
+        total = self.token_counter(messages)
+        if total <= self.max_tokens:
+            return []
+
+        calls = {
+            call["id"]: call
+            for message in messages
+            if isinstance(message, AIMessage)
+            for call in message.tool_calls
+        }
+        candidates = [
+            m for m in messages
+            if isinstance(m, ToolMessage) and not m.additional_kwargs.get("compacted")
+        ]
+        if self.keep_recent > 0:
+            candidates = candidates[:-self.keep_recent]
+
+        replacements = []
+        for message in candidates:
+            if total <= self.target_tokens:
+                break
+            call = calls.get(message.tool_call_id, {})
+            tool_name = message.name or call.get("name", "tool")
+            if self.compactable_tools is not None and tool_name not in self.compactable_tools:
+                continue
+            before = self.token_counter([message])
+            if before < self.min_tokens:
+                continue
+            stub = ToolMessage(
+                content=self.summarize(message, tool_name, call.get("args", {})),
+                tool_call_id=message.tool_call_id,
+                name=message.name,
+                id=message.id,
+                additional_kwargs={**message.additional_kwargs, "compacted": True},
+            )
+            saved = before - self.token_counter([stub])
+            if saved <= 0:
+                continue
+            total -= saved
+            self.tokens_saved += saved
+            self.compacted_messages += 1
+            replacements.append(stub)
+        return replacements
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Per-step latency and token instrumentation for agents built with create_agent.
+
+Records, for every model call, the call duration, time to first token, the
+prompt size and the input/output/cached token counts the provider reports;
+for every tool call, the tool name, argument size, result size and duration;
+and for every run, the wall time not spent in the model or in tools (stream
+loop, checkpointing, middleware). Records are appended to a rotating JSONL
+trace and kept in memory for :meth:`InstrumentationMiddleware.summary`.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.base import BaseCallbackManager
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables.config import var_child_runnable_config
+from langgraph.types import Command
+
+from middleware.run_context import current_thread_id
+
+
+class _FirstTokenTimer(BaseCallbackHandler):
+    """Remembers when the first streamed token of a model call arrived."""
+
+    # Called inline by the async callback manager instead of in an executor
+    run_inline = True
+
+    def __init__(self):
+        self.first_token: Optional[float] = None
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+
+def _with_callback(config: Dict[str, Any], handler: BaseCallbackHandler) -> Dict[str, Any]:
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    else:
+        callbacks = [*(callbacks or []), handler]
+    return {**config, "callbacks": callbacks}
+
+
+def _chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "total": round(sum(values), 3),
+        "p50": round(_percentile(values, 0.5), 3),
+        "p95": round(_percentile(values, 0.95), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+class InstrumentationMiddleware(AgentMiddleware):
+    """Record model, tool and run timings plus token counts to a rotating JSONL trace."""
+
+    def __init__(
+        self,
+        trace_path: Optional[str] = None,
+        max_bytes: int = 10 << 20,
+        backup_count: int = 5,
+        history: int = 10000,
+        on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        Args:
+            trace_path: JSONL file the records are appended to; None keeps them in memory only.
+            max_bytes: Size at which the trace file is rotated.
+            backup_count: Number of rotated trace files kept (trace.jsonl.1, .2, ...).
+            history: Number of records kept in memory for ``summary``.
+            on_record: Called with every record, e.g. to forward it to a metrics backend.
+        """
+        super().__init__()
+        self.trace_path = trace_path
+        self.on_record = on_record
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        # thread id -> model calls of the current run / start time and accumulated durations of the run
+        self._steps: Dict[Optional[str], int] = defaultdict(int)
+        self._runs: Dict[Optional[str], Dict[str, float]] = {}
+        self._logger = None
+        if trace_path:
+            directory = os.path.dirname(trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(trace_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"panda.trace.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    def _record(self, record: Dict[str, Any]):
+        record["ts"] = time.time()
+        with self._lock:
+            self.records.append(record)
+            run = self._runs.get(record.get("thread_id"))
+            if run is not None and "duration_ms" in record:
+                run[record["event"] + "_ms"] += record["duration_ms"]
+        if self._logger is not None:
+            self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        if self.on_record is not None:
+            self.on_record(record)
+
+    # -- runs ----------------------------------------------------------------
+
+    def before_agent(self, state, runtime):
+        with self._lock:
+            self._runs[current_thread_id()] = {"start": time.perf_counter(), "model_ms": 0.0, "tool_ms": 0.0}
+        return None
+
+    async def abefore_agent(self, state, runtime):
+        return self.before_agent(state, runtime)
+
+    def after_agent(self, state, runtime):
+        thread_id = current_thread_id()
+        with self._lock:
+            run = self._runs.pop(thread_id, None)
+            self._steps.pop(thread_id, None)
+        if run is not None:
+            wall_ms = (time.perf_counter() - run["start"]) * 1000
+            self._record({
+                "event": "run",
+                "thread_id": thread_id,
+                "wall_ms": round(wall_ms, 3),
+                "model_ms": round(run["model_ms"], 3),
+                "tool_ms": round(run["tool_ms"], 3),
+                # Tools may run in parallel, so this can be negative when they dominate
+                "overhead_ms": round(wall_ms - run["model_ms"] - run["tool_ms"], 3),
+                "messages": len(state.get("messages", [])),
+            })
+        return None
+
+    async def aafter_agent(self, state, runtime):
+        return self.after_agent(state, runtime)
+
+    # -- model calls ---------------------------------------------------------
+
+    def wrap_model_call(self, request, handler):
+        timer = _FirstTokenTimer()
+        token = var_child_runnable_config.set(_with_callback(var_child_runnable_config.get() or {}, timer))
+        start = time.perf_counter()
+        try:
+            response = handler(request)
+        except Exception as e:
+            self._model_record(request, None, timer, start, error=e)
+            raise
+        finally:
+            var_child_runnable_config.reset(token)
+        self._model_record(request, response, timer, start)
+        return response
+
+    async def awrap_model_call(self, request, handler):
+        timer = _FirstTokenTimer()
+        token = var_child_runnable_config.set(_with_callback(var_child_runnable_config.get() or {}, timer))
+        start = time.perf_counter()
+        try:
+            response = await handler(request)
+        except Exception as e:
+            self._model_record(request, None, timer, start, error=e)
+            raise
+        finally:
+            var_child_runnable_config.reset(token)
+        self._model_record(request, response, timer, start)
+        return response
+
+    def _model_record(self, request, response, timer: _FirstTokenTimer, start: float, error=None):
+        end = time.perf_counter()
+        thread_id = current_thread_id()
+        with self._lock:
+            self._steps[thread_id] += 1
+            step = self._steps[thread_id]
+        system = request.system_message.content if request.system_message is not None else ""
+        record = {
+            "event": "model",
+            "thread_id": thread_id,
+            "step": step,
+            # The model actually called, after any routing middleware swapped it
+            "model": getattr(request.model, "model_name", None) or type(request.model).__name__,
+            "duration_ms": round((end - start) * 1000, 3),
+            # Without token streaming the first token arrives with the whole response
+            "ttft_ms": round(((timer.first_token or end) - start) * 1000, 3),
+            "streamed": timer.first_token is not None,
+            "messages": len(request.messages),
+            "prompt_chars": _chars(system) + sum(_chars(m.content) for m in request.messages),
+            "prompt_tokens_est": count_tokens_approximately(
+                [request.system_message, *request.messages] if request.system_message is not None else request.messages
+            ),
+            "tools": len(request.tools),
+        }
+        message = next(
+            (m for m in getattr(response, "result", None) or [] if isinstance(m, AIMessage)), None
+        )
+        if message is not None:
+            usage = message.usage_metadata or {}
+            record.update(
+                input_tokens=usage.get("input_tokens"),
+                output_tokens=usage.get("output_tokens"),
+                cached_tokens=(usage.get("input_token_details") or {}).get("cache_read"),
+                tool_calls=[call["name"] for call in message.tool_calls],
+            )
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        self._record(record)
+
+    # -- tool calls ----------------------------------------------------------
+
+    def wrap_tool_call(self, request, handler):
+        start = time.perf_counter()
+        try:
+            response = handler(request)
+        except Exception as e:
+            self._tool_record(request, None, start, error=e)
+            raise
+        self._tool_record(request, response, start)
+        return response
+
+    async def awrap_tool_call(self, request, handler):
+        start = time.perf_counter()
+        try:
+            response = await handler(request)
+        except Exception as e:
+            self._tool_record(request, None, start, error=e)
+            raise
+        self._tool_record(request, response, start)
+        return response
+
+    def _tool_record(self, request, response, start: float, error=None):
+        call = request.tool_call
+        runtime = getattr(request, "runtime", None)
+        config = getattr(runtime, "config", None) or {}
+        thread_id = config.get("configurable", {}).get("thread_id") if config else current_thread_id()
+        if isinstance(response, Command):
+            messages = (response.update or {}).get("messages", []) if isinstance(response.update, dict) else []
+        else:
+            messages = [response] if response is not None else []
+        record = {
+            "event": "tool",
+            "thread_id": thread_id,
+            "step": self._steps.get(thread_id, 0),
+            "name": call.get("name"),
+            "call_id": call.get("id"),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "args_chars": _chars(call.get("args", {})),
+            "result_chars": sum(_chars(m.content) for m in messages if isinstance(m, ToolMessage)),
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        elif any(isinstance(m, ToolMessage) and m.status == "error" for m in messages):
+            record["error"] = "tool returned an error"
+        self._record(record)
+
+    # -- summary -------------------------------------------------------------
+
+    def summary(self, top: int = 5, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate the recorded calls: model latency and tokens, per-tool latency and sizes, run overhead.
+
+        Args:
+            top: Number of entries in ``slowest_tools`` and ``largest_prompts``.
+            thread_id: Only aggregate the records of this thread.
+        """
+        with self._lock:
+            records = list(self.records)
+        if thread_id is not None:
+            records = [r for r in records if r.get("thread_id") == thread_id]
+        models = [r for r in records if r["event"] == "model"]
+        tools = [r for r in records if r["event"] == "tool"]
+        runs = [r for r in records if r["event"] == "run"]
+
+        by_tool: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for record in tools:
+            by_tool[record["name"]].append(record)
+        tool_summary = {
+            name: {
+                "calls": len(calls),
+                "errors": sum(1 for c in calls if "error" in c),
+                "duration_ms": _stats([c["duration_ms"] for c in calls]),
+                "mean_args_chars": round(sum(c["args_chars"] for c in calls) / len(calls), 1),
+                "mean_result_chars": round(sum(c["result_chars"] for c in calls) / len(calls), 1),
+            }
+            for name, calls in by_tool.items()
+        }
+        return {
+            "model": {
+                "calls": len(models),
+                "duration_ms": _stats([r["duration_ms"] for r in models]),
+                "ttft_ms": _stats([r["ttft_ms"] for r in models]),
+                "input_tokens": sum(r.get("input_tokens") or 0 for r in models),
+                "output_tokens": sum(r.get("output_tokens") or 0 for r in models),
+                "cached_tokens": sum(r.get("cached_tokens") or 0 for r in models),
+            },
+            "tools": tool_summary,
+            "slowest_tools": sorted(tool_summary, key=lambda n: tool_summary[n]["duration_ms"]["total"], reverse=True)[:top],
+            "largest_prompts": [
+                {k: r.get(k) for k in ("thread_id", "step", "prompt_tokens_est", "input_tokens", "messages")}
+                for r in sorted(models, key=lambda r: r["prompt_tokens_est"], reverse=True)[:top]
+            ],
+            "runs": {
+                "count": len(runs),
+                "wall_ms": _stats([r["wall_ms"] for r in runs]),
+                "overhead_ms": _stats([r["overhead_ms"] for r in runs]),
+            },
+        }
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Per-step model routing for agents built with create_agent.
+
+Not every step needs the strongest model. "grep next" decisions after a
+search are cheap, while writing an edit after reading a file is not. Before
+each model call, this middleware picks a route (a named chat model) from an
+ordered list of rules. The rules look at:
+
+  - the tools that answered the previous step (navigation vs. edit tools);
+  - whether an edit is expected next: the previous step read a file, or an edit failed;
+  - the remaining latency budget of the run.
+
+The first matching rule wins. Without a match the default route is used.
+Latency, tokens and cost are recorded per route, and :meth:`summary` reports them
+so the rules can be tuned.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from middleware.run_context import current_thread_id
+
+NAVIGATION_TOOLS = frozenset({"read_file", "custom_grep", "get_city", "get_weather", "sequential_thinking"})
+EDIT_TOOLS = frozenset({"edit_file", "write_file"})
+
+
+@dataclass
+class StepContext:
+    """What the rules see about the step about to run."""
+
+    previous_tools: FrozenSet[str]
+    previous_errors: FrozenSet[str]
+    edit_expected: bool
+    remaining_s: Optional[float]
+    step: int
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """Use ``route`` when every condition that is set holds."""
+
+    route: str
+    # The previous step only called tools from this set
+    previous_tools: Optional[FrozenSet[str]] = None
+    edit_expected: Optional[bool] = None
+    # Less than this many seconds of the latency budget are left
+    max_remaining_s: Optional[float] = None
+
+    def matches(self, step: StepContext) -> bool:
+        if self.previous_tools is not None and not (step.previous_tools and step.previous_tools <= self.previous_tools):
+            return False
+        if self.edit_expected is not None and step.edit_expected != self.edit_expected:
+            return False
+        if self.max_remaining_s is not None and (step.remaining_s is None or step.remaining_s >= self.max_remaining_s):
+            return False
+        return True
+
+
+Rule = Union[RouteRule, Callable[[StepContext], Optional[str]]]
+
+DEFAULT_RULES: List[Rule] = [
+    # Running out of time: answer fast, whatever the step
+    RouteRule("fast", max_remaining_s=15.0),
+    RouteRule("strong", edit_expected=True),
+    RouteRule("fast", previous_tools=NAVIGATION_TOOLS),
+]
+
+
+def step_context(messages: List[BaseMessage], remaining_s: Optional[float] = None) -> StepContext:
+    """Describe the step that follows ``messages``."""
+    tools, errors = set(), set()
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            break
+        if isinstance(message, ToolMessage):
+            tools.add(message.name)
+            if message.status == "error" or str(message.content).startswith("Error"):
+                errors.add(message.name)
+    return StepContext(
+        previous_tools=frozenset(tools),
+        previous_errors=frozenset(errors),
+        edit_expected="read_file" in tools or bool(errors & EDIT_TOOLS),
+        remaining_s=remaining_s,
+        step=sum(1 for m in messages if isinstance(m, AIMessage)),
+    )
+
+
+class ModelRouterMiddleware(AgentMiddleware):
+    """Pick a chat model per step from rules and report latency, tokens and cost per route."""
+
+    def __init__(
+        self,
+        routes: Dict[str, BaseChatModel],
+        rules: Optional[List[Rule]] = None,
+        default: str = "strong",
+        latency_budget_s: Optional[float] = None,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        history: int = 10000,
+    ):
+        """
+        Args:
+            routes: Route name -> chat model, e.g. {"strong": big_model, "fast": small_model}.
+            rules: Tried in order; a RouteRule, or a callable returning a route name or None.
+                Defaults to DEFAULT_RULES. Rules naming a route that is not configured are skipped.
+            default: Route used when no rule matches.
+            latency_budget_s: Wall-time budget of one run, for the max_remaining_s conditions.
+            prices: Route -> (input, output) price per million tokens, for the cost report.
+            history: Latency samples kept per route for the percentiles.
+        """
+        super().__init__()
+        if default not in routes:
+            raise ValueError(f"default route {default!r} is not one of {sorted(routes)}")
+        self.routes = dict(routes)
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+        self.default = default
+        self.latency_budget_s = latency_budget_s
+        self.prices = dict(prices or {})
+        self._lock = threading.Lock()
+        self._started: Dict[Optional[str], float] = {}
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"calls": 0, "errors": 0, "latency_ms": deque(maxlen=history), "input_tokens": 0, "output_tokens": 0}
+        )
+
+    def before_agent(self, state, runtime):
+        with self._lock:
+            self._started[current_thread_id()] = time.perf_counter()
+        return None
+
+    async def abefore_agent(self, state, runtime):
+        return self.before_agent(state, runtime)
+
+    def after_agent(self, state, runtime):
+        with self._lock:
+            self._started.pop(current_thread_id(), None)
+        return None
+
+    async def aafter_agent(self, state, runtime):
+        return self.after_agent(state, runtime)
+
+    def choose(self, messages: List[BaseMessage], thread_id: Optional[str] = None) -> str:
+        """Route for the step that follows ``messages``."""
+        remaining = None
+        if self.latency_budget_s is not None:
+            with self._lock:
+                started = self._started.get(thread_id)
+            if started is not None:
+                remaining = self.latency_budget_s - (time.perf_counter() - started)
+        step = step_context(messages, remaining)
+        for rule in self.rules:
+            if isinstance(rule, RouteRule):
+                route = rule.route if rule.matches(step) else None
+            else:
+                route = rule(step)
+            if route in self.routes:
+                return route
+        return self.default
+
+    def wrap_model_call(self, request, handler):
+        route = self.choose(request.messages, current_thread_id())
+        start = time.perf_counter()
+        try:
+            response = handler(request.override(model=self.routes[route]))
+        except Exception:
+            self._record(route, None, start)
+            raise
+        self._record(route, response, start)
+        return response
+
+    async def awrap_model_call(self, request, handler):
+        route = self.choose(request.messages, current_thread_id())
+        start = time.perf_counter()
+        try:
+            response = await handler(request.override(model=self.routes[route]))
+        except Exception:
+            self._record(route, None, start)
+            raise
+        self._record(route, response, start)
+        return response
+
+    def _record(self, route: str, response, start: float):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        message = next((m for m in getattr(response, "result", None) or [] if isinstance(m, AIMessage)), None)
+        usage = (message.usage_metadata if message is not None else None) or {}
+        with self._lock:
+            stats = self._stats[route]
+            stats["calls"] += 1
+            stats["errors"] += response is None
+            stats["latency_ms"].append(elapsed_ms)
+            stats["input_tokens"] += usage.get("input_tokens") or 0
+            stats["output_tokens"] += usage.get("output_tokens") or 0
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, latency percentiles, tokens and cost per route."""
+        report = {}
+        with self._lock:
+            for route, stats in self._stats.items():
+                latencies = sorted(stats["latency_ms"])
+                input_price, output_price = self.prices.get(route, (0.0, 0.0))
+                report[route] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "p50_ms": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3)
+                    if latencies else 0.0,
+                    "input_tokens": stats["input_tokens"],
+                    "output_tokens": stats["output_tokens"],
+                    "cost": round((stats["input_tokens"] * input_price + stats["output_tokens"] * output_price) / 1e6, 6),
+                }
+        return report
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Parallel tool execution for agents built with create_agent.
+
+When the model returns several tool calls in one turn, read-only tools are
+dispatched to a bounded thread pool, while side-effecting tools keep the
+order in which the model issued them: a side-effecting call waits for every
+earlier call of the same turn, and later calls wait for it. A call whose turn
+is still blocked after ``wait_timeout`` is not run; it returns an error.
+"""
+
+import asyncio
+import contextvars
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, ToolMessage
+
+
+# Tools that never change the environment and can safely run concurrently
+READ_ONLY_TOOLS = frozenset({"read_file", "custom_grep", "get_weather"})
+
+
+class _Turn:
+    """Bookkeeping for the tool calls of a single AIMessage."""
+
+    def __init__(self, calls: List[dict], cond=None):
+        self.index = {call["id"]: i for i, call in enumerate(calls)}
+        self.names = [call["name"] for call in calls]
+        self.done = set()
+        self.cond = cond if cond is not None else threading.Condition()
+
+
+class ParallelToolMiddleware(AgentMiddleware):
+    """Run read-only tools concurrently and keep side-effecting tools ordered."""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        read_only_tools: Iterable[str] = READ_ONLY_TOOLS,
+        wait_timeout: float = 300.0,
+    ):
+        """
+        Args:
+            max_workers: Size of the thread pool used for read-only tools.
+            read_only_tools: Names of the tools that may run concurrently.
+                Every other tool is treated as side-effecting.
+            wait_timeout: Maximum seconds a call waits for earlier calls of the
+                same turn; after that it is not run and returns an error.
+        """
+        super().__init__()
+        if not isinstance(max_workers, int) or max_workers <= 0:
+            raise ValueError("max_workers must be a positive integer")
+        self.max_workers = max_workers
+        self.read_only_tools = frozenset(read_only_tools)
+        self.wait_timeout = wait_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="panda-tool")
+        self._turns: Dict[tuple, _Turn] = {}
+        self._lock = threading.Lock()
+        # Async path: sessions share one event loop, so no thread pool is needed. A semaphore is
+        # bound to the loop it is first used on, so each loop gets its own
+        self._aturns: Dict[tuple, _Turn] = {}
+        self._asemaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def is_read_only(self, tool_name: str) -> bool:
+        return tool_name in self.read_only_tools
+
+    def wrap_tool_call(self, request, handler: Callable):
+        call_id = request.tool_call.get("id")
+        calls = self._pending_calls(request.state, call_id)
+        if call_id is None or len(calls) < 2:
+            # Nothing to parallelise or order
+            return self._run(request, handler)
+
+        key = tuple(c["id"] for c in calls)
+        turn = self._acquire_turn(key, calls)
+        position = turn.index[call_id]
+        try:
+            with turn.cond:
+                ready = turn.cond.wait_for(
+                    lambda: self._may_start(turn, position),
+                    timeout=self.wait_timeout,
+                )
+            if not ready:
+                return self._timed_out(request)
+            return self._run(request, handler)
+        finally:
+            with turn.cond:
+                turn.done.add(position)
+                turn.cond.notify_all()
+            self._release_turn(key, turn)
+
+    async def awrap_tool_call(self, request, handler: Callable):
+        call_id = request.tool_call.get("id")
+        calls = self._pending_calls(request.state, call_id)
+        if call_id is None or len(calls) < 2:
+            return await self._arun(request, handler)
+
+        key = tuple(c["id"] for c in calls)
+        turn = self._aturns.get(key)
+        if turn is None:
+            turn = self._aturns[key] = _Turn(calls, cond=asyncio.Condition())
+        position = turn.index[call_id]
+        try:
+            async with turn.cond:
+                try:
+                    await asyncio.wait_for(
+                        turn.cond.wait_for(lambda: self._may_start(turn, position)),
+                        timeout=self.wait_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    return self._timed_out(request)
+            return await self._arun(request, handler)
+        finally:
+            async with turn.cond:
+                turn.done.add(position)
+                turn.cond.notify_all()
+            if len(turn.done) == len(turn.index):
+                self._aturns.pop(key, None)
+
+    async def _arun(self, request, handler: Callable):
+        if not self.is_read_only(request.tool_call["name"]):
+            return await handler(request)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._asemaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._asemaphores[loop] = asyncio.Semaphore(self.max_workers)
+        async with semaphore:
+            return await handler(request)
+
+    def _timed_out(self, request) -> ToolMessage:
+        # Running it anyway could reorder side effects, e.g. a write_file before the edit_file it follows
+        call = request.tool_call
+        return ToolMessage(
+            content=(f"Error: {call['name']} was not run: earlier tool calls of this turn did not finish "
+                     f"within {self.wait_timeout:g}s. Call it again once they have."),
+            tool_call_id=call["id"], name=call["name"], status="error",
+        )
+
+    def _run(self, request, handler: Callable):
+        if self.is_read_only(request.tool_call["name"]):
+            # Carry the graph's run config over to the pool thread (get_config, callbacks)
+            return self._pool.submit(contextvars.copy_context().run, handler, request).result()
+        return handler(request)
+
+    def _may_start(self, turn: _Turn, position: int) -> bool:
+        names = turn.names
+        if not self.is_read_only(names[position]):
+            # Side-effecting calls wait for every earlier call of the turn
+            return all(i in turn.done for i in range(position))
+        # Read-only calls only wait for earlier side-effecting calls
+        return all(
+            i in turn.done
+            for i in range(position)
+            if not self.is_read_only(names[i])
+        )
+
+    def _acquire_turn(self, key: tuple, calls: List[dict]) -> _Turn:
+        with self._lock:
+            turn = self._turns.get(key)
+            if turn is None:
+                turn = self._turns[key] = _Turn(calls)
+            return turn
+
+    def _release_turn(self, key: tuple, turn: _Turn):
+        with self._lock:
+            if len(turn.done) == len(turn.index):
+                self._turns.pop(key, None)
+
+    @staticmethod
+    def _pending_calls(state, call_id: Optional[str]) -> List[dict]:
+        """Return the unanswered tool calls of the AIMessage that issued ``call_id``."""
+        messages = state.get("messages", []) if isinstance(state, dict) else []
+        answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+        for message in reversed(messages):
+            if isinstance(message, AIMessage) and any(c.get("id") == call_id for c in message.tool_calls):
+                # Calls already answered (e.g. before an interrupt) are not part of this batch
+                return [c for c in message.tool_calls if c["id"] not in answered]
+        return []
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Prefix-stable prompt assembly for provider-side prompt caching.
+
+Providers cache the longest byte-identical prefix of a request: system prompt,
+then tool schemas, then messages. The system prompt (``plan_act_prompt``) and
+the long tool docstrings are sent on every call, so keeping them byte-stable
+makes them cacheable. This middleware:
+
+- orders tools by name and serializes each schema once, so the tool block is
+  identical on every call;
+- appends volatile context (time, budgets, ...) after the conversation instead
+  of mixing it into the system prompt, without storing it in the state;
+- reports per request how much of the prompt is a stable, cacheable prefix,
+  and how many input tokens the provider says it served from cache.
+"""
+
+import json
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, message_to_dict
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from middleware.run_context import current_thread_id
+
+
+@dataclass
+class PrefixReport:
+    """Cacheability of one model request."""
+
+    thread_id: Optional[str]
+    prefix_chars: int
+    total_chars: int
+    # Which part of the prompt first differed from the previous request: "system", "tools", "messages" or None
+    first_change: Optional[str]
+    cached_tokens: Optional[int] = None
+    input_tokens: Optional[int] = None
+    timestamp: float = 0.0
+
+    @property
+    def cacheable_ratio(self) -> float:
+        return self.prefix_chars / self.total_chars if self.total_chars else 0.0
+
+
+# id(tool) -> (weak reference to the tool, schema), shared by every instance so a newly built agent starts with
+# converted schemas. Tools are unhashable (pydantic models), hence the id; the entry goes away with its tool.
+_SCHEMA_CACHE: Dict[int, tuple] = {}
+_SCHEMA_LOCK = threading.Lock()
+
+
+def _forget_schema(ref: weakref.ref, key: int):
+    # Runs when the tool is collected, possibly inside a locked section of this thread: no lock here
+    if _SCHEMA_CACHE.get(key, (None,))[0] is ref:
+        _SCHEMA_CACHE.pop(key, None)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class StablePrefixMiddleware(AgentMiddleware):
+    """Keep the prompt prefix byte-stable and report the cacheable-prefix length per request."""
+
+    def __init__(
+        self,
+        volatile_context: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+        on_report: Optional[Callable[[PrefixReport], None]] = None,
+        history: int = 1000,
+        max_threads: int = 1024,
+    ):
+        """
+        Args:
+            volatile_context: Optional ``state -> str`` whose text is sent after the
+                conversation for this call only (never stored in the state).
+            on_report: Called with a PrefixReport after every model call.
+            history: Number of reports kept in ``reports``.
+            max_threads: Number of threads whose previous prompt is remembered for comparison.
+        """
+        super().__init__()
+        self.volatile_context = volatile_context
+        self.on_report = on_report
+        self.reports: Deque[PrefixReport] = deque(maxlen=history)
+        self.max_threads = max_threads
+        # thread id -> [(length, hash)] of the previous request's segments
+        self._previous: Dict[Optional[str], List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def _schema(self, tool) -> Dict[str, Any]:
+        if isinstance(tool, dict):
+            return tool
+        key = id(tool)
+        cached = _SCHEMA_CACHE.get(key)
+        if cached is None or cached[0]() is not tool:
+            # Converted once per tool instance, so every call sends the exact same bytes
+            schema = convert_to_openai_tool(tool)
+            ref = weakref.ref(tool, lambda ref, key=key: _forget_schema(ref, key))
+            with _SCHEMA_LOCK:
+                cached = _SCHEMA_CACHE.get(key)
+                if cached is None or cached[0]() is not tool:
+                    cached = _SCHEMA_CACHE[key] = (ref, schema)
+        return cached[1]
+
+    def warm(self, tools: List[Any]):
+        """Convert the tool schemas now instead of on the first model call."""
+        self.stable_tools(tools)
+
+    def stable_tools(self, tools: List[Any]) -> List[Dict[str, Any]]:
+        """Tool schemas in a fixed (name) order."""
+        return sorted((self._schema(t) for t in tools), key=lambda s: s.get("function", s).get("name", ""))
+
+    def wrap_model_call(self, request, handler):
+        request = self._prepare(request)
+        response = handler(request)
+        self._report(request, response)
+        return response
+
+    async def awrap_model_call(self, request, handler):
+        request = self._prepare(request)
+        response = await handler(request)
+        self._report(request, response)
+        return response
+
+    def _prepare(self, request):
+        overrides = {"tools": self.stable_tools(request.tools)}
+        if self.volatile_context is not None:
+            volatile = self.volatile_context(request.state)
+            if volatile:
+                overrides["messages"] = [*request.messages, HumanMessage(content=volatile)]
+        return request.override(**overrides)
+
+    def _segments(self, request) -> List[tuple]:
+        system = request.system_message.content if request.system_message is not None else ""
+        texts = [
+            _dumps(system),
+            _dumps(request.tools),
+            *(_dumps(message_to_dict(m)) for m in request.messages),
+        ]
+        return [(len(text), hash(text)) for text in texts]
+
+    def _report(self, request, response):
+        segments = self._segments(request)
+        thread_id = current_thread_id()
+        with self._lock:
+            previous = self._previous.pop(thread_id, [])
+            self._previous[thread_id] = segments
+            if len(self._previous) > self.max_threads:
+                self._previous.pop(next(iter(self._previous)))
+
+        prefix_chars = 0
+        first_change = None
+        for i, segment in enumerate(segments):
+            if i < len(previous) and previous[i] == segment:
+                prefix_chars += segment[0]
+                continue
+            if previous:
+                first_change = "system" if i == 0 else "tools" if i == 1 else "messages"
+            break
+
+        report = PrefixReport(
+            thread_id=thread_id,
+            prefix_chars=prefix_chars,
+            total_chars=sum(length for length, _ in segments),
+            first_change=first_change,
+            timestamp=time.time(),
+        )
+        usage = _usage(response)
+        if usage:
+            report.input_tokens = usage.get("input_tokens")
+            report.cached_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+        self.reports.append(report)
+        if self.on_report is not None:
+            self.on_report(report)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate cacheability over the recorded requests."""
+        reports = list(self.reports)
+        total = sum(r.total_chars for r in reports)
+        input_tokens = sum(r.input_tokens or 0 for r in reports)
+        cached_tokens = sum(r.cached_tokens or 0 for r in reports)
+        return {
+            "requests": len(reports),
+            "cacheable_ratio": sum(r.prefix_chars for r in reports) / total if total else 0.0,
+            "prefix_breaks": sum(1 for r in reports if r.first_change in ("system", "tools")),
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "cache_hit_ratio": cached_tokens / input_tokens if input_tokens else 0.0,
+        }
+
+
+def _usage(response) -> Optional[Dict[str, Any]]:
+    messages: List[BaseMessage] = getattr(response, "result", None) or []
+    for message in messages:
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            return message.usage_metadata
+    return None
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+The graph run a middleware hook or tool is called from.
+
+Per-session state (routes, timings, thought trees, dedup counts) is keyed by
+the LangGraph thread id of the run. It is read from the config of the current
+run rather than passed around, since hooks and tools only get the request.
+"""
+
+from typing import Optional
+
+
+def current_thread_id() -> Optional[str]:
+    """Thread id of the current graph run, None when called outside of one."""
+    try:
+        # Imported on first call: langgraph is slow to import, and the CLI imports the tools without running them
+        from langgraph.config import get_config
+
+        return get_config().get("configurable", {}).get("thread_id")
+    except (ImportError, RuntimeError):
+        return None
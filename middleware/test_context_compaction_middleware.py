@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Test script for ContextCompactionMiddleware."""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from middleware.context_compaction_middleware import ContextCompactionMiddleware
+
+
+def _history(files: int, size: int):
+    messages = [HumanMessage(content="fix the bug", id="h")]
+    for i in range(files):
+        call = {"name": "read_file", "args": {"file_path": f"f{i}.py"}, "id": f"call_{i}"}
+        messages.append(AIMessage(content="", tool_calls=[call], id=f"ai_{i}"))
+        messages.append(ToolMessage(content="x = 1\n" * size, tool_call_id=f"call_{i}", name="read_file", id=f"tool_{i}"))
+    return messages
+
+
+def test_under_budget_is_untouched():
+    middleware = ContextCompactionMiddleware(max_tokens=100_000)
+    assert middleware.before_model({"messages": _history(3, 100)}, None) is None
+
+
+def test_oldest_results_are_stubbed_and_recent_kept():
+    middleware = ContextCompactionMiddleware(max_tokens=2_000, keep_recent=2)
+    messages = _history(6, 400)
+    update = middleware.before_model({"messages": messages}, None)
+
+    stubs = update["messages"]
+    assert stubs, "expected some tool results to be compacted"
+    # Stubs reuse the original ids so add_messages replaces them in place
+    assert [s.id for s in stubs] == [f"tool_{i}" for i in range(len(stubs))]
+    assert all(s.id not in ("tool_4", "tool_5") for s in stubs)
+    # The stub tells the model how to get the content back
+    assert "read_file(file_path='f0.py')" in stubs[0].content
+    assert stubs[0].additional_kwargs["compacted"] is True
+    assert middleware.tokens_saved > 0
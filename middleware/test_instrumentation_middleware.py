@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Test script for InstrumentationMiddleware."""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain.agents import create_agent
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from middleware.instrumentation_middleware import InstrumentationMiddleware
+
+
+def slow_tool(key: str) -> str:
+    """Sleep a little and return a payload."""
+    time.sleep(0.02)
+    return "x" * 100
+
+
+def fast_tool(key: str) -> str:
+    """Return a payload."""
+    return "y" * 10
+
+
+class _TwoStepModel(BaseChatModel):
+    """Calls both tools once, then answers with usage metadata."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "two-step-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if len(messages) > 1:
+            message = AIMessage(content="done", usage_metadata={
+                "input_tokens": 40, "output_tokens": 2, "total_tokens": 42, "input_token_details": {"cache_read": 32},
+            })
+        else:
+            message = AIMessage(content="", tool_calls=[
+                {"name": "slow_tool", "args": {"key": "a"}, "id": "call_slow"},
+                {"name": "fast_tool", "args": {"key": "b"}, "id": "call_fast"},
+            ])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_records_model_tool_and_run_events():
+    with tempfile.TemporaryDirectory() as directory:
+        trace = os.path.join(directory, "traces", "agent.jsonl")
+        middleware = InstrumentationMiddleware(trace)
+        agent = create_agent(model=_TwoStepModel(), tools=[slow_tool, fast_tool], middleware=[middleware])
+        agent.invoke({"messages": "go"}, config={"configurable": {"thread_id": "t1"}})
+        middleware.close()
+
+        with open(trace) as f:
+            events = [json.loads(line) for line in f]
+        assert [e["event"] for e in events if e["event"] != "tool"] == ["model", "model", "run"]
+        tools = {e["name"]: e for e in events if e["event"] == "tool"}
+        assert tools["slow_tool"]["duration_ms"] >= 20 and tools["slow_tool"]["result_chars"] == 100
+        assert all(e["thread_id"] == "t1" for e in events)
+
+    summary = middleware.summary()
+    assert summary["model"]["calls"] == 2
+    assert summary["model"]["cached_tokens"] == 32
+    assert summary["slowest_tools"][0] == "slow_tool"
+    assert summary["runs"]["count"] == 1
+
+
+def test_trace_rotates():
+    with tempfile.TemporaryDirectory() as directory:
+        trace = os.path.join(directory, "agent.jsonl")
+        middleware = InstrumentationMiddleware(trace, max_bytes=500, backup_count=2)
+        for i in range(50):
+            middleware._record({"event": "tool", "name": "t", "i": i})
+        middleware.close()
+        assert sorted(os.listdir(directory)) == ["agent.jsonl", "agent.jsonl.1", "agent.jsonl.2"]
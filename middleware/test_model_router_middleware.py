@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Test script for ModelRouterMiddleware."""
+
+import os
+import tempfile
+
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from middleware.instrumentation_middleware import InstrumentationMiddleware
+from middleware.model_router_middleware import ModelRouterMiddleware, RouteRule
+from models.scripted_model import ScriptedChatModel
+from panda_coding_agent import custom_grep, read_file, write_file
+
+
+def _after(*tools, error=False):
+    messages = [HumanMessage(content="go"), AIMessage(content="", id="ai")]
+    for name in tools:
+        content = "Error: no match" if error else "ok"
+        messages.append(ToolMessage(content=content, tool_call_id=name, name=name))
+    return messages
+
+
+def test_rules_pick_routes_in_order():
+    router = ModelRouterMiddleware({"strong": ScriptedChatModel(), "fast": ScriptedChatModel()})
+    assert router.choose([HumanMessage(content="go")]) == "strong"
+    assert router.choose(_after("custom_grep")) == "fast"
+    assert router.choose(_after("custom_grep", "read_file")) == "strong"
+    assert router.choose(_after("edit_file", error=True)) == "strong"
+
+    budget = ModelRouterMiddleware(
+        {"strong": ScriptedChatModel(), "fast": ScriptedChatModel()},
+        latency_budget_s=10,
+        rules=[lambda step: "strong" if step.step == 0 else None, RouteRule("fast", max_remaining_s=20)],
+        default="strong",
+    )
+    # No run started for this thread: the budget condition cannot match
+    assert budget.choose(_after("read_file"), "t") == "strong"
+    budget.before_agent({}, None)
+    assert budget.choose(_after("read_file"), None) == "fast"
+    assert budget.choose([HumanMessage(content="go")], None) == "strong"
+
+
+def test_routes_are_used_and_reported():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.py")
+        with open(path, "w") as f:
+            f.write("x = 1\n")
+        script = [
+            {"name": "custom_grep", "args": {"pattern": "x", "path": tmp}},
+            {"name": "read_file", "args": {"file_path": path}},
+            {"name": "write_file", "args": {"file_path": path, "content": "x = 2\n"}},
+        ]
+        strong = ScriptedChatModel(script=script, final="strong done")
+        fast = ScriptedChatModel(script=script, final="fast done")
+        router = ModelRouterMiddleware({"strong": strong, "fast": fast}, prices={"strong": (2.0, 8.0)})
+        instrumentation = InstrumentationMiddleware()
+        agent = create_agent(strong, tools=[custom_grep, read_file, write_file], middleware=[router, instrumentation],
+                             checkpointer=InMemorySaver())
+        result = agent.invoke({"messages": "go"}, {"configurable": {"thread_id": "router-test"}})
+
+    assert result["messages"][-1].content == "strong done"
+    summary = router.summary()
+    assert summary["strong"]["calls"] == 3 and summary["fast"]["calls"] == 1
+    assert summary["strong"]["input_tokens"] > 0 and summary["strong"]["cost"] > 0
+    assert summary["fast"]["cost"] == 0
+    assert len([r for r in instrumentation.records if r["event"] == "model"]) == 4
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Test script for ParallelToolMiddleware."""
+
+import asyncio
+import threading
+import time
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+
+from middleware.parallel_tool_middleware import ParallelToolMiddleware
+
+
+class _ScriptedModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def test_read_only_tools_run_concurrently_and_writes_stay_ordered():
+    events = []
+    lock = threading.Lock()
+
+    def record(event):
+        with lock:
+            events.append(event)
+
+    def read_file(file_path: str) -> str:
+        """Read the content of a file."""
+        record(("start", file_path))
+        time.sleep(0.2)
+        record(("end", file_path))
+        return file_path
+
+    def write_file(file_path: str, content: str) -> str:
+        """Write content to a file."""
+        record(("start", file_path))
+        record(("end", file_path))
+        return f"Successfully wrote to {file_path}"
+
+    tool_calls = [
+        {"name": "read_file", "args": {"file_path": "a"}, "id": "1"},
+        {"name": "read_file", "args": {"file_path": "b"}, "id": "2"},
+        {"name": "write_file", "args": {"file_path": "c", "content": ""}, "id": "3"},
+        {"name": "read_file", "args": {"file_path": "d"}, "id": "4"},
+    ]
+    model = _ScriptedModel(messages=iter([AIMessage(content="", tool_calls=tool_calls), AIMessage(content="done")]))
+    agent = create_agent(model=model, tools=[read_file, write_file], middleware=[ParallelToolMiddleware(max_workers=4)])
+
+    started = time.perf_counter()
+    result = agent.invoke({"messages": "go"})
+    elapsed = time.perf_counter() - started
+
+    # a and b overlap, so the turn takes roughly two reads instead of three
+    assert elapsed < 0.55
+    # The write starts only after both earlier reads, and d only after the write
+    assert events.index(("start", "c")) > events.index(("end", "a"))
+    assert events.index(("start", "c")) > events.index(("end", "b"))
+    assert events.index(("start", "d")) > events.index(("end", "c"))
+    # Results come back in call order
+    tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert [m.tool_call_id for m in tool_messages] == ["1", "2", "3", "4"]
+
+
+def test_blocked_calls_time_out_instead_of_running_out_of_order():
+    ran = []
+    release = threading.Event()
+
+    def write_file(file_path: str, content: str) -> str:
+        """Write content to a file."""
+        if file_path == "a":
+            release.wait(5)
+        ran.append(file_path)
+        return f"Successfully wrote to {file_path}"
+
+    tool_calls = [
+        {"name": "write_file", "args": {"file_path": "a", "content": ""}, "id": "1"},
+        {"name": "write_file", "args": {"file_path": "b", "content": ""}, "id": "2"},
+    ]
+    model = _ScriptedModel(messages=iter([AIMessage(content="", tool_calls=tool_calls), AIMessage(content="done")]))
+    agent = create_agent(model=model, tools=[write_file],
+                         middleware=[ParallelToolMiddleware(max_workers=2, wait_timeout=0.2)])
+    threading.Timer(1.0, release.set).start()
+    result = agent.invoke({"messages": "go"})
+    b = [m for m in result["messages"] if isinstance(m, ToolMessage) and m.tool_call_id == "2"][0]
+    # b gave up waiting for a; it did not write ahead of it
+    assert ran == ["a"] and b.status == "error" and "was not run" in b.content
+
+
+def test_async_read_only_limit_works_on_every_loop():
+    middleware = ParallelToolMiddleware(max_workers=2)
+    active, peak = [0], [0]
+
+    async def handler(request):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return "ok"
+
+    class _Request:
+        tool_call = {"name": "read_file", "args": {}, "id": "1"}
+        state = {"messages": []}
+
+    async def run():
+        return await asyncio.gather(*(middleware.awrap_tool_call(_Request(), handler) for _ in range(6)))
+
+    # A second asyncio.run used to fail on the semaphore bound to the first loop
+    assert asyncio.run(run()) == ["ok"] * 6
+    assert asyncio.run(run()) == ["ok"] * 6 and peak[0] == 2
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test script for StablePrefixMiddleware."""
+
+import gc
+import itertools
+
+from langchain.agents import create_agent
+from langchain_core.messages import HumanMessage, message_to_dict
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from middleware import prompt_prefix_middleware
+from middleware.prompt_prefix_middleware import StablePrefixMiddleware, _dumps
+from models.scripted_model import ScriptedChatModel
+
+
+@tool
+def list_files(directory: str) -> str:
+    """List the files of a directory."""
+    return "a.py\nb.py"
+
+
+@tool
+def count_lines(file_path: str) -> str:
+    """Count the lines of a file."""
+    return "12"
+
+
+def test_tools_are_sorted_and_converted_once():
+    middleware = StablePrefixMiddleware()
+    first = middleware.stable_tools([list_files, count_lines])
+    second = middleware.stable_tools([count_lines, list_files])
+    assert [s["function"]["name"] for s in first] == ["count_lines", "list_files"]
+    # The same schema objects, so every request serializes to the same bytes
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_schema_cache_does_not_keep_tools_alive():
+    @tool
+    def scratch(text: str) -> str:
+        """A tool built for one agent only."""
+        return text
+
+    key = id(scratch)
+    StablePrefixMiddleware().warm([scratch])
+    assert key in prompt_prefix_middleware._SCHEMA_CACHE
+    del scratch
+    gc.collect()
+    assert key not in prompt_prefix_middleware._SCHEMA_CACHE
+
+
+def test_volatile_context_comes_after_a_stable_prefix():
+    clock = itertools.count()
+    middleware = StablePrefixMiddleware(volatile_context=lambda state: f"now: step {next(clock)}")
+    agent = create_agent(
+        ScriptedChatModel(script=[{"name": "list_files", "args": {"directory": "."}},
+                                  {"name": "count_lines", "args": {"file_path": "a.py"}}]),
+        tools=[list_files, count_lines], system_prompt="You are a careful coding agent. " * 20,
+        middleware=[middleware], checkpointer=InMemorySaver(),
+    )
+    config = {"configurable": {"thread_id": "prefix"}}
+    state = agent.invoke({"messages": "count the lines"}, config)
+
+    first, *later = middleware.reports
+    assert first.thread_id == "prefix" and first.first_change is None and first.prefix_chars == 0
+    assert len(later) == 2
+    for step, (previous, report) in enumerate(zip(middleware.reports, later)):
+        # System prompt, tools and the earlier messages are unchanged; only the volatile tail differs
+        volatile = len(_dumps(message_to_dict(HumanMessage(content=f"now: step {step}"))))
+        assert report.first_change == "messages"
+        assert report.prefix_chars == previous.total_chars - volatile
+    # Never stored in the conversation
+    assert not any(isinstance(m, HumanMessage) and m.content.startswith("now:") for m in state["messages"])
+    assert middleware.summary()["prefix_breaks"] == 0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Test script for ThoughtCompactionMiddleware."""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from middleware.thought_compaction_middleware import ThoughtCompactionMiddleware
+from tools.thinking.thought_store import ThoughtStore
+
+
+def _thinking_history(store, thoughts):
+    messages = [HumanMessage(content="plan the refactor", id="h")]
+    graph = store.get("t")
+    for i, args in enumerate(thoughts):
+        graph.add(**args)
+        call = {"name": "sequential_thinking", "args": args, "id": f"call_{i}"}
+        messages.append(AIMessage(content="", tool_calls=[call], id=f"ai_{i}"))
+        messages.append(ToolMessage(content=graph.render(), tool_call_id=f"call_{i}", name="sequential_thinking",
+                                    id=f"tool_{i}"))
+    return messages
+
+
+def _thought(n, text, **kwargs):
+    return {"thought": text, "thought_number": n, "total_thoughts": 4, "next_thought_needed": True, **kwargs}
+
+
+def test_old_thoughts_are_condensed_and_pruned_ones_dropped():
+    store = ThoughtStore()
+    long_text = "Check the parser first. " + "details " * 200
+    messages = _thinking_history(store, [
+        _thought(1, long_text),
+        _thought(2, "abandoned idea " * 100),
+        _thought(2, "the better idea", branch_from_thought=1, branch_id="b"),
+        _thought(3, "latest thought, kept in full " * 10, branch_id="b"),
+    ])
+    middleware = ThoughtCompactionMiddleware(store=store, digest_chars=40)
+    replacements = {m.id: m for m in middleware.condense(messages, "t")}
+
+    assert set(replacements) == {"ai_0", "ai_1", "ai_2", "tool_0", "tool_1", "tool_2"}
+    assert replacements["ai_0"].tool_calls[0]["args"]["thought"] == "[condensed] Check the parser first. details details…"
+    assert replacements["ai_1"].tool_calls[0]["args"]["thought"] == "[condensed] pruned"
+    assert replacements["ai_1"].tool_calls[0]["args"]["thought_number"] == 2
+    assert replacements["tool_0"].content.startswith("[condensed] superseded")
+    assert middleware.chars_saved > len(long_text)
+
+    # Applying the rewrite again changes nothing
+    rewritten = [replacements.get(m.id, m) for m in messages]
+    assert middleware.condense(rewritten, "t") == []
+    assert middleware.condense(messages[:3], "t") == []
+
+    # The next model call condenses the same history again; it is only counted once
+    counters = (middleware.condensed_calls, middleware.chars_saved)
+    assert counters[0] == 3
+    assert len(middleware.condense(messages, "t")) == 6
+    assert (middleware.condensed_calls, middleware.chars_saved) == counters
+
+
+def test_only_the_model_request_is_rewritten():
+    from langchain.agents import create_agent
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from models.scripted_model import ScriptedChatModel
+    from panda_coding_agent import sequential_thinking
+
+    seen = []
+
+    class Recorder(ScriptedChatModel):
+        def reply(self, messages):
+            seen.append([m for m in messages if isinstance(m, AIMessage)])
+            return super().reply(messages)
+
+    script = [{"name": "sequential_thinking", "args": _thought(n, f"thought {n} " + "x" * 500)} for n in (1, 2, 3)]
+    middleware = ThoughtCompactionMiddleware()
+    agent = create_agent(Recorder(script=script), tools=[sequential_thinking],
+                         middleware=[middleware], checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "compaction-test"}}
+    agent.invoke({"messages": "go"}, config)
+
+    last_request = [m.tool_calls[0]["args"]["thought"] for m in seen[-1]]
+    assert [t.startswith("[condensed]") for t in last_request] == [True, True, False]
+    # Thought 1 was condensed for two model calls, thought 2 for one
+    assert middleware.condensed_calls == 2
+    stored = [m for m in agent.get_state(config).values["messages"] if isinstance(m, AIMessage) and m.tool_calls]
+    assert all(len(m.tool_calls[0]["args"]["thought"]) > 500 for m in stored)
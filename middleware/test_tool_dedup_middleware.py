@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test script for ToolDedupMiddleware."""
+
+import os
+import tempfile
+
+from langchain.agents import create_agent
+from langchain_core.messages import ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from middleware.context_compaction_middleware import ContextCompactionMiddleware
+from middleware.tool_dedup_middleware import ToolDedupMiddleware
+from models.scripted_model import ScriptedChatModel
+from panda_coding_agent import custom_grep, read_file, write_file
+
+
+def _run(script, middleware, thread_id):
+    agent = create_agent(ScriptedChatModel(script=script), tools=[read_file, write_file, custom_grep],
+                         middleware=middleware, checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": thread_id}}
+    agent.invoke({"messages": "go"}, config)
+    return [m for m in agent.get_state(config).values["messages"] if isinstance(m, ToolMessage)]
+
+
+def test_unchanged_repeat_is_answered_by_reference():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.py")
+        with open(path, "w") as f:
+            f.write("value = 1\n" * 200)
+        read = {"name": "read_file", "args": {"file_path": path}}
+        dedup = ToolDedupMiddleware()
+        results = _run([
+            read,
+            read,
+            {"name": "write_file", "args": {"file_path": path, "content": "value = 2\n" * 200}},
+            read,
+            read,
+        ], [dedup], "dedup-test")
+
+        first, repeat, _, changed, repeat_changed = results
+        assert "value = 1" in first.content and first.additional_kwargs["dedup_key"]
+        assert repeat.content.startswith("[duplicate] read_file") and first.tool_call_id in repeat.content
+        assert "value = 2" in changed.content
+        assert repeat_changed.additional_kwargs["dedup_of"] == changed.tool_call_id
+        stats = dedup.stats("dedup-test")
+        assert stats["hits"] == 2 and stats["tokens_saved"] > 500
+        assert dedup.stats()["sessions"] == 1
+
+
+def test_compacted_or_small_results_are_not_referenced():
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, "big.py")
+        small = os.path.join(tmp, "small.py")
+        with open(big, "w") as f:
+            f.write("needle = 1\n" * 400)
+        with open(small, "w") as f:
+            f.write("x = 1\n")
+        script = [{"name": "read_file", "args": {"file_path": big}}] * 2 + [
+            {"name": "read_file", "args": {"file_path": small}}] * 2
+        # A budget this small compacts the first read before the repeat runs
+        results = _run(script, [ToolDedupMiddleware(), ContextCompactionMiddleware(max_tokens=500, keep_recent=0)],
+                       "compacted")
+        assert results[0].additional_kwargs["compacted"]
+        assert not results[1].content.startswith("[duplicate]")
+        assert not results[3].content.startswith("[duplicate]")
+
+
+def test_directory_search_sees_edits_made_outside_the_agent():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "pkg"))
+        path = os.path.join(tmp, "pkg", "a.py")
+        with open(path, "w") as f:
+            f.write("needle = 1\n" * 100)
+        dedup = ToolDedupMiddleware()
+        grep = {"name": "custom_grep", "args": {"pattern": "needle", "path": tmp, "output_mode": "content"}}
+        before = dedup.fingerprint(grep)
+        assert dedup.fingerprint(grep) == before
+        # Neither the searched directory nor the file cache sees this write
+        stat = os.stat(os.path.join(tmp, "pkg"))
+        with open(path, "a") as f:
+            f.write("needle = 2\n")
+        os.utime(os.path.join(tmp, "pkg"), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert dedup.fingerprint(grep) != before
+
+
+def test_directory_state_covers_only_the_filtered_files_of_small_trees():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("a.py", "b.py", "notes.md"):
+            with open(os.path.join(tmp, name), "w") as f:
+                f.write("needle\n")
+        grep = {"name": "custom_grep", "args": {"pattern": "needle", "path": tmp, "glob": "*.py"}}
+        before = ToolDedupMiddleware().fingerprint(grep)
+        # Not a file the search reads
+        with open(os.path.join(tmp, "notes.md"), "a") as f:
+            f.write("more\n")
+        assert ToolDedupMiddleware().fingerprint(grep) == before
+        # Above the limit the files are not stat'ed and the search always runs
+        assert ToolDedupMiddleware(max_dir_files=1).fingerprint(grep) is None
+        assert ToolDedupMiddleware(max_dir_files=2).fingerprint(grep) is not None
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Condense old ``sequential_thinking`` calls in the message history.
+
+Every thought is sent as the ``thought`` argument of a tool call. Each
+result is the condensed state of the active path, which already lists a
+digest of every thought that is still relevant. So the full text of older
+thoughts, and the older state results, are redundant in the history and make
+each later model call slower. Before every model call, this middleware
+rewrites them in the request:
+
+  - the arguments of older thoughts on the active path are cut to a digest;
+  - thoughts that were revised or pruned with an abandoned branch keep a one-line marker only;
+  - older state results become a stub, because the latest result supersedes them.
+
+The most recent ``keep_recent`` thoughts are left untouched. Only the request
+is rewritten, in ``wrap_model_call``. The checkpointed history keeps the full
+text, and the graph gets no extra node per step. A rewritten thought only
+changes again when it is revised or pruned, so the provider's cached prompt
+prefix mostly stays intact.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from middleware.run_context import current_thread_id
+from tools.thinking.thought_store import ThoughtStore, digest, thought_store
+
+CONDENSED = "[condensed]"
+
+
+class ThoughtCompactionMiddleware(AgentMiddleware):
+    """Keep only the active reasoning branch of sequential_thinking in the model's context."""
+
+    def __init__(self, store: ThoughtStore = thought_store, tool_name: str = "sequential_thinking",
+                 keep_recent: int = 1, digest_chars: int = 160, max_threads: int = 1024):
+        """
+        Args:
+            store: Where the tool keeps each session's thought graph.
+            tool_name: Name of the thinking tool.
+            keep_recent: Number of most recent thoughts (and results) left as they are.
+            digest_chars: Length a condensed thought is cut to.
+            max_threads: Number of sessions whose condensed messages are remembered for the counters.
+        """
+        super().__init__()
+        self.store = store
+        self.tool_name = tool_name
+        self.keep_recent = keep_recent
+        self.digest_chars = digest_chars
+        self.max_threads = max_threads
+        # Every model call rewrites the same messages again; each thought and result is counted once
+        self.condensed_calls = 0
+        self.chars_saved = 0
+        # thread id -> ids of the calls and results already counted
+        self._counted: Dict[Optional[str], Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def wrap_model_call(self, request, handler):
+        return handler(self._prepare(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(self._prepare(request))
+
+    def _prepare(self, request):
+        replacements = {m.id: m for m in self.condense(request.messages, current_thread_id())}
+        if not replacements:
+            return request
+        return request.override(messages=[replacements.get(m.id, m) for m in request.messages])
+
+    def condense(self, messages: List[BaseMessage], thread_id: Optional[str] = None) -> List[BaseMessage]:
+        """Rewritten copies of the messages that hold old thoughts or old state results."""
+        call_ids = [
+            call["id"]
+            for message in messages if isinstance(message, AIMessage)
+            for call in message.tool_calls if call["name"] == self.tool_name
+        ]
+        old = set(call_ids[:-self.keep_recent] if self.keep_recent > 0 else call_ids)
+        if not old:
+            return []
+        graph = self.store.peek(thread_id or "default")
+
+        replacements = []
+        for message in messages:
+            if isinstance(message, AIMessage) and any(call["id"] in old for call in message.tool_calls):
+                calls = []
+                for call in message.tool_calls:
+                    condensed = self._condense_call(call, graph) if call["id"] in old else call
+                    if condensed is not call:
+                        self._count(thread_id, call["id"], len(call["args"]["thought"])
+                                    - len(condensed["args"]["thought"]), call=True)
+                    calls.append(condensed)
+                if calls != message.tool_calls:
+                    replacements.append(message.model_copy(update={"tool_calls": calls}))
+            elif (isinstance(message, ToolMessage) and message.tool_call_id in old
+                  and isinstance(message.content, str) and not message.content.startswith(CONDENSED)):
+                stub = f"{CONDENSED} superseded by the latest {self.tool_name} result"
+                self._count(thread_id, f"result:{message.tool_call_id}", len(message.content) - len(stub))
+                replacements.append(message.model_copy(update={"content": stub}))
+        return replacements
+
+    def _count(self, thread_id: Optional[str], key: str, chars: int, call: bool = False):
+        with self._lock:
+            counted = self._counted.pop(thread_id, None)
+            if counted is None:
+                counted = set()
+                if len(self._counted) >= self.max_threads:
+                    self._counted.pop(next(iter(self._counted)))
+            # Most recently used last
+            self._counted[thread_id] = counted
+            if key in counted:
+                return
+            counted.add(key)
+            if call:
+                self.condensed_calls += 1
+            self.chars_saved += chars
+
+    def _condense_call(self, call: Dict[str, Any], graph) -> Dict[str, Any]:
+        args = call.get("args", {})
+        text = args.get("thought")
+        if not isinstance(text, str) or text.startswith(CONDENSED):
+            return call
+        status = "active"
+        if graph is not None and isinstance(args.get("thought_number"), int):
+            status = graph.status(args["thought_number"], args.get("branch_id"))
+        if status == "active":
+            condensed = f"{CONDENSED} {digest(text, self.digest_chars)}"
+        else:
+            condensed = f"{CONDENSED} {status}"
+        return {**call, "args": {**args, "thought": condensed}}
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Deduplicate repeated tool calls within a session.
+
+Agents often repeat the exact same ``read_file`` or ``custom_grep`` call a few
+steps later. Each repeat would inject the full payload into the context
+again. This middleware fingerprints every call by its tool, its canonical
+arguments and the state of the file or directory it reads. The fingerprint
+is stored on the resulting ToolMessage. When the same fingerprint comes back
+while that earlier result is still in the context (not compacted), the tool
+is not run. The model gets a short reference to the earlier message instead.
+
+File state is the (mtime, size, inode) of the path. For a directory it adds
+the (mtime, size) of every file a search of it reads (after the call's glob and
+type filters), from the grep service's cached file list
+(tools/grep/grep_service.py), and the write generation of the shared file
+cache. An edit anywhere in the tree, by the agent or outside it, changes the
+state, so a repeated grep runs again. Taking that state costs one stat per
+file, so searches over more than DEDUP_MAX_DIR_FILES files are not deduplicated.
+
+Place it after ParallelToolMiddleware, so that the file state is taken once the
+earlier side-effecting calls of the same turn have run.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from middleware.run_context import current_thread_id
+from tools.file.file_cache import file_cache
+from tools.grep.grep_service import grep_service
+
+# Tool name -> the argument holding the path it reads, and that argument's default
+DEDUP_TOOLS: Dict[str, tuple] = {
+    "read_file": ("file_path", None),
+    "custom_grep": ("path", "."),
+}
+
+# Directory searches reading more files are always run: stat'ing them all would cost more than it saves
+DEDUP_MAX_DIR_FILES = 2000
+
+
+def path_state(path: Optional[str], glob: Optional[str] = None, type: Optional[str] = None,
+               max_files: int = DEDUP_MAX_DIR_FILES) -> Any:
+    """
+    What has to stay the same for a read of ``path`` to return the same result; None when
+    there is no path, or when ``path`` is a directory with more than ``max_files`` files to search.
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    state = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+    if os.path.isdir(path):
+        # The list is revalidated with one stat per directory; each file is stat'ed for its content
+        paths = grep_service.files(path, glob, type)
+        if len(paths) > max_files:
+            return None
+        files = hashlib.sha1()
+        for abspath in paths:
+            try:
+                child = os.stat(abspath)
+            except OSError:
+                continue
+            files.update(f"{abspath}\0{child.st_mtime_ns}\0{child.st_size}\n".encode("utf-8", "surrogateescape"))
+        state.extend([file_cache.generation, files.hexdigest()])
+    return state
+
+
+class ToolDedupMiddleware(AgentMiddleware):
+    """Answer an unchanged repeat of a read-only tool call with a reference to the earlier result."""
+
+    def __init__(self, dedup_tools: Optional[Dict[str, tuple]] = None, min_tokens: int = 50,
+                 max_dir_files: int = DEDUP_MAX_DIR_FILES):
+        """
+        Args:
+            dedup_tools: Tool name -> (path argument, default path), see DEDUP_TOOLS.
+            min_tokens: Results smaller than this are cheaper to repeat than to reference.
+            max_dir_files: Directory searches reading more files than this are never deduplicated.
+        """
+        super().__init__()
+        self.dedup_tools = dict(dedup_tools if dedup_tools is not None else DEDUP_TOOLS)
+        self.min_tokens = min_tokens
+        self.max_dir_files = max_dir_files
+        self._lock = threading.Lock()
+        self._saved: Dict[Optional[str], Dict[str, int]] = defaultdict(lambda: {"hits": 0, "tokens_saved": 0})
+
+    def fingerprint(self, call: Dict[str, Any]) -> Optional[str]:
+        name = call.get("name")
+        if name not in self.dedup_tools:
+            return None
+        args = call.get("args") or {}
+        path_arg, default = self.dedup_tools[name]
+        path = args.get(path_arg) or default
+        state = path_state(path, args.get("glob"), args.get("type"), self.max_dir_files)
+        if path and state is None:
+            return None
+        key = json.dumps([name, args, os.path.abspath(path) if path else None, state],
+                         sort_keys=True, ensure_ascii=False, default=str)
+        # Stored on every tagged ToolMessage, so keep it short
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+    def wrap_tool_call(self, request, handler):
+        key = self.fingerprint(request.tool_call)
+        reference = self._reference(request, key)
+        if reference is not None:
+            return reference
+        return self._tag(handler(request), key)
+
+    async def awrap_tool_call(self, request, handler):
+        key = self.fingerprint(request.tool_call)
+        reference = self._reference(request, key)
+        if reference is not None:
+            return reference
+        return self._tag(await handler(request), key)
+
+    def _reference(self, request, key: Optional[str]) -> Optional[ToolMessage]:
+        if key is None:
+            return None
+        messages: List[Any] = (request.state or {}).get("messages", []) if isinstance(request.state, dict) else []
+        for message in reversed(messages):
+            if (isinstance(message, ToolMessage) and message.additional_kwargs.get("dedup_key") == key
+                    and not message.additional_kwargs.get("compacted")):
+                break
+        else:
+            return None
+        call = request.tool_call
+        content = (f"[duplicate] {call['name']} returned the same result as call {message.tool_call_id} "
+                   f"and the file state is unchanged; use that earlier result.")
+        saved = count_tokens_approximately([message]) - count_tokens_approximately([ToolMessage(content, tool_call_id="")])
+        with self._lock:
+            stats = self._saved[current_thread_id()]
+            stats["hits"] += 1
+            stats["tokens_saved"] += max(saved, 0)
+        return ToolMessage(content=content, tool_call_id=call["id"], name=call["name"],
+                           additional_kwargs={"dedup_of": message.tool_call_id})
+
+    def _tag(self, response, key: Optional[str]):
+        if (key is not None and isinstance(response, ToolMessage) and response.status != "error"
+                and not str(response.content).startswith("Error")
+                and count_tokens_approximately([response]) >= self.min_tokens):
+            response.additional_kwargs["dedup_key"] = key
+        return response
+
+    def stats(self, thread_id: Optional[str] = None) -> Dict[str, int]:
+        """Repeats answered by reference and the tokens that saved, for one session or all of them."""
+        with self._lock:
+            if thread_id is not None:
+                return dict(self._saved.get(thread_id, {"hits": 0, "tokens_saved": 0}))
+            return {
+                "hits": sum(s["hits"] for s in self._saved.values()),
+                "tokens_saved": sum(s["tokens_saved"] for s in self._saved.values()),
+                "sessions": len(self._saved),
+            }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cold vs warm request latency for the shared model-client factory.
+
+Starts a local OpenAI-compatible stub endpoint (HTTP/1.1 keep-alive) and
+compares:
+  cold: a new ChatOpenAI, and therefore a new HTTP connection, per request
+  warm: the factory's shared client reusing pooled connections
+
+Usage:
+    python models/bench_model_factory.py --requests 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_openai import ChatOpenAI
+
+from models.model_factory import ModelClientFactory, ModelEndpoint, httpx
+
+_COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_COMPLETION)))
+        self.end_headers()
+        self.wfile.write(_COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.mean(samples) * 1000,
+        samples[len(samples) // 2] * 1000,
+        samples[int(len(samples) * 0.95) - 1] * 1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = ModelEndpoint(
+        model="stub",
+        base_url=f"http://127.0.0.1:{server.server_port}/v1",
+        api_key="stub",
+        extra_body={},
+        max_retries=0,
+        cache_dir=None,
+    )
+    factory = ModelClientFactory({"stub": endpoint})
+
+    cold = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        http_client = httpx.Client()
+        model = ChatOpenAI(model=endpoint.model, base_url=endpoint.base_url, api_key=endpoint.api_key,
+                           max_retries=0, http_client=http_client)
+        model.invoke("ping")
+        cold.append(time.perf_counter() - started)
+        http_client.close()
+
+    warm = []
+    factory.get_model("stub").invoke("ping")  # open the pooled connection
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        factory.get_model("stub").invoke("ping")
+        warm.append(time.perf_counter() - started)
+
+    factory.close()
+    server.shutdown()
+
+    print(f"requests={args.requests} endpoint={endpoint.base_url}")
+    print(f"{'':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for label, samples in (("cold", cold), ("warm", warm)):
+        mean, p50, p95 = _percentiles(samples)
+        print(f"{label:>6} {mean:>9.2f} {p50:>9.2f} {p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
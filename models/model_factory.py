@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Shared chat-model client factory.
+
+Agents used to build their own ``ChatOpenAI`` with hard-coded settings, so
+nothing was shared and every agent opened fresh HTTP connections. This module
+keeps one pooled ``httpx`` client per endpoint (keep-alive, bounded pool,
+per-endpoint timeouts) and one ``ChatOpenAI`` instance per endpoint name,
+reused across agents and sessions.
+
+Each model gets a sync and an async client. The async client's connections
+belong to the event loop they were opened on and can only be closed there:
+programs that used the models asynchronously (``ainvoke``/``astream``,
+AsyncAgentRunner) call ``await factory.aclose()`` on that loop before it ends.
+Sync programs call ``factory.close()``.
+"""
+
+import asyncio
+import os
+import threading
+import warnings
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+try:
+    # Newer openai releases are built on httpx2 and only accept its client types
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+if TYPE_CHECKING:
+    # langchain_openai pulls in the whole openai SDK; it is imported when the first client is built
+    from langchain_openai import ChatOpenAI
+
+    from cache.llm_response_cache import DiskResponseCache
+
+
+@dataclass(frozen=True)
+class ModelEndpoint:
+    """Connection and generation settings for one model endpoint."""
+
+    model: str = os.getenv("PANDA_MODEL", "")  # e.g. "doubao-seed-1-6-251015"
+    base_url: str = os.getenv("PANDA_MODEL_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+    api_key: str = os.getenv("PANDA_MODEL_API_KEY", "")  # 替换为你自己的 Key
+    temperature: float = 0
+    max_tokens: int = 8 * 1024
+    # 如果需要推理，这里可以设置为 {"thinking": {"type": "auto"}}
+    extra_body: Dict[str, Any] = field(default_factory=lambda: {"thinking": {"type": "disabled"}})
+    # HTTP pool / timeout settings
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    max_retries: int = 2
+    # Directory of the on-disk response cache (record/replay), off unless set, e.g. ".panda_cache/llm"
+    cache_dir: Optional[str] = os.getenv("PANDA_LLM_CACHE_DIR") or None
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def key(self) -> tuple:
+        """Hashable identity of the settings (extra_body is a dict, so the default hash can't be used)."""
+        return (self.model, self.base_url, self.api_key, self.temperature, self.max_tokens,
+                repr(sorted(self.extra_body.items())), self.cache_dir)
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+ENDPOINTS: Dict[str, ModelEndpoint] = {
+    "default": ModelEndpoint(),
+    # Small, fast model for navigation steps (see middleware/model_router_middleware.py); unset disables routing
+    "fast": ModelEndpoint(model=os.getenv("PANDA_FAST_MODEL", ""), max_tokens=2 * 1024),
+}
+
+
+class ModelClientFactory:
+    """Hands out shared, connection-pooled chat model clients."""
+
+    def __init__(self, endpoints: Optional[Dict[str, ModelEndpoint]] = None):
+        self.endpoints = dict(endpoints if endpoints is not None else ENDPOINTS)
+        self._models: Dict[str, "ChatOpenAI"] = {}
+        self._http_clients: Dict[str, httpx.Client] = {}
+        self._async_http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._caches: Dict[str, "DiskResponseCache"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, endpoint: ModelEndpoint):
+        """Add or replace an endpoint; a replaced endpoint gets a new model instance on next use."""
+        with self._lock:
+            self.endpoints[name] = endpoint
+            self._models.pop(name, None)
+
+    def get_model(self, name: str = "default", **overrides) -> "ChatOpenAI":
+        """
+        Return the shared chat model for an endpoint.
+
+        Args:
+            name: Registered endpoint name.
+            **overrides: ModelEndpoint fields to change; the result is registered as its own
+                endpoint so repeated calls with the same overrides share one instance too.
+        """
+        endpoint = self.endpoints[name]
+        if overrides:
+            endpoint = replace(endpoint, **overrides)
+            name = f"{name}:{endpoint.key()!r}"
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = self._build(endpoint)
+            return model
+
+    def prewarm(self, name: str = "default", connections: int = 2, path: str = "/models") -> int:
+        """
+        Build the endpoint's model and open ``connections`` keep-alive connections ahead of the
+        first request, so a session does not pay for the import, DNS, TCP and TLS setup.
+
+        Any HTTP response counts: even a 401 leaves the connection open in the pool.
+        Returns the number of connections opened.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.get_model(name)
+        endpoint = self.endpoints[name]
+        with self._lock:
+            client = self._http_client(endpoint)
+        url = endpoint.base_url.rstrip("/") + path
+        # Each response is held until every request has one, otherwise a fast server lets the
+        # later requests reuse the first connection
+        barrier = threading.Barrier(connections)
+
+        def touch(_):
+            try:
+                with client.stream("GET", url, headers={"Authorization": f"Bearer {endpoint.api_key}"}) as response:
+                    try:
+                        barrier.wait(endpoint.connect_timeout)
+                    except threading.BrokenBarrierError:
+                        pass
+                    # Read to the end, so that the connection goes back to the pool
+                    response.read()
+                return 1
+            except Exception:
+                # The first real request opens the connection instead
+                barrier.abort()
+                return 0
+
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            return sum(pool.map(touch, range(connections)))
+
+    async def aprewarm(self, name: str = "default", connections: int = 2, path: str = "/models") -> int:
+        """Async version of :meth:`prewarm`, for the client used by ``ainvoke``/``astream``."""
+        await asyncio.to_thread(self.get_model, name)
+        endpoint = self.endpoints[name]
+        with self._lock:
+            client = self._async_http_client(endpoint)
+        url = endpoint.base_url.rstrip("/") + path
+        # As in prewarm, each response is held until every request has one
+        pending = [connections]
+        everyone = asyncio.Event()
+
+        def arrived():
+            pending[0] -= 1
+            if pending[0] <= 0:
+                everyone.set()
+
+        async def touch():
+            try:
+                async with client.stream("GET", url,
+                                         headers={"Authorization": f"Bearer {endpoint.api_key}"}) as response:
+                    arrived()
+                    try:
+                        await asyncio.wait_for(everyone.wait(), endpoint.connect_timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    await response.aread()
+                return 1
+            except Exception:
+                arrived()
+                return 0
+
+        return sum(await asyncio.gather(*(touch() for _ in range(connections))))
+
+    def _build(self, endpoint: ModelEndpoint) -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+
+        from cache.llm_response_cache import DiskResponseCache
+
+        kwargs = {}
+        if endpoint.cache_dir:
+            cache = self._caches.get(endpoint.cache_dir)
+            if cache is None:
+                cache = self._caches[endpoint.cache_dir] = DiskResponseCache(endpoint.cache_dir)
+            kwargs["cache"] = cache
+        return ChatOpenAI(
+            model=endpoint.model,
+            base_url=endpoint.base_url,
+            api_key=endpoint.api_key,
+            temperature=endpoint.temperature,
+            max_tokens=endpoint.max_tokens,
+            extra_body=endpoint.extra_body,
+            timeout=endpoint.timeout(),
+            max_retries=endpoint.max_retries,
+            http_client=self._http_client(endpoint),
+            http_async_client=self._async_http_client(endpoint),
+            **kwargs,
+        )
+
+    def _pool_key(self, endpoint: ModelEndpoint) -> str:
+        # Endpoints on the same host share one connection pool
+        return f"{endpoint.base_url}|{endpoint.timeout()}|{endpoint.limits()}"
+
+    def _http_client(self, endpoint: ModelEndpoint) -> httpx.Client:
+        key = self._pool_key(endpoint)
+        client = self._http_clients.get(key)
+        if client is None:
+            client = self._http_clients[key] = httpx.Client(timeout=endpoint.timeout(), limits=endpoint.limits())
+        return client
+
+    def _async_http_client(self, endpoint: ModelEndpoint) -> httpx.AsyncClient:
+        key = self._pool_key(endpoint)
+        client = self._async_http_clients.get(key)
+        if client is None:
+            client = self._async_http_clients[key] = httpx.AsyncClient(
+                timeout=endpoint.timeout(), limits=endpoint.limits()
+            )
+        return client
+
+    def close(self):
+        """
+        Close every pooled connection, for sync programs; models handed out before must not be
+        used afterwards. Async clients are closed on a new event loop, which only works for
+        connections never opened or opened on a loop that is still running: after async use,
+        call :meth:`aclose` on that loop instead.
+
+        Raises:
+            RuntimeError: Called from a running event loop; use ``await aclose()`` there.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("ModelClientFactory.close() called from a running event loop; "
+                               "use 'await factory.aclose()'")
+        async_clients = self._detach()
+        for client in async_clients:
+            try:
+                asyncio.run(client.aclose())
+            except RuntimeError as e:
+                # Its connections belong to a loop that has been closed
+                warnings.warn(f"async HTTP client not closed ({e}); call 'await factory.aclose()' on the "
+                              f"event loop that used it", ResourceWarning, stacklevel=2)
+
+    async def aclose(self):
+        """Close every pooled connection, for async programs: await it on the loop that used the models."""
+        for client in self._detach():
+            await client.aclose()
+
+    def _detach(self) -> List[Any]:
+        """Forget every client, model and cache; close the sync ones and return the async clients."""
+        with self._lock:
+            sync_clients, self._http_clients = list(self._http_clients.values()), {}
+            async_clients, self._async_http_clients = list(self._async_http_clients.values()), {}
+            caches, self._caches = list(self._caches.values()), {}
+            self._models.clear()
+        for client in sync_clients:
+            client.close()
+        for cache in caches:
+            cache.close()
+        return async_clients
+
+
+_default_factory = ModelClientFactory()
+
+
+def get_chat_model(name: str = "default", **overrides) -> "ChatOpenAI":
+    """Shared chat model from the process-wide factory."""
+    return _default_factory.get_model(name, **overrides)
+
+
+def prewarm(name: str = "default", connections: int = 2) -> int:
+    """Open keep-alive connections of the process-wide factory ahead of time, see ModelClientFactory.prewarm."""
+    return _default_factory.prewarm(name, connections)
+
+
+async def aclose():
+    """Close the process-wide factory's connections on the running loop, see ModelClientFactory.aclose."""
+    await _default_factory.aclose()
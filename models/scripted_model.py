@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Deterministic, offline chat model that plays back a script of turns.
+
+Benchmarks and tests need a model that returns the same tool calls every run
+and costs nothing. ``ScriptedChatModel`` picks its reply from the number of
+AIMessages already in the conversation, so it keeps no state of its own: the
+same instance can serve many concurrent sessions, and a resumed session
+continues where it stopped. Optional latency, token streaming and usage
+metadata make it stand in for a real endpoint.
+
+A script entry is one of:
+  - a string: the final answer (no tool calls);
+  - a dict ``{"name": ..., "args": {...}}``: one tool call;
+  - a list of such dicts: parallel tool calls in one turn;
+  - an AIMessage, returned as is.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+ScriptTurn = Union[str, Dict[str, Any], List[Dict[str, Any]], AIMessage]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Replays ``script`` turn by turn; after the last turn it answers ``final``."""
+
+    script: List[Any] = []
+    final: str = "done"
+    # Seconds slept per call, standing in for network latency
+    latency: float = 0.0
+    # Characters per streamed chunk when the model is streamed (0 streams the whole reply at once)
+    chunk_size: int = 0
+    # Attach approximate usage metadata, like a real provider would
+    usage: bool = True
+
+    @classmethod
+    def looping(cls, turn: ScriptTurn, steps: int, final: str = "done", **kwargs) -> "ScriptedChatModel":
+        """Repeat the same turn ``steps`` times, then answer ``final``."""
+        return cls(script=[turn] * steps, final=final, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        # The script already names the tools; binding changes nothing
+        return self
+
+    def reply(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """The scripted reply for a conversation."""
+        turn = sum(1 for m in messages if isinstance(m, AIMessage))
+        entry = self.script[turn] if turn < len(self.script) else self.final
+        if isinstance(entry, AIMessage):
+            message = entry.model_copy()
+        elif isinstance(entry, str):
+            message = AIMessage(content=entry)
+        else:
+            calls = [entry] if isinstance(entry, dict) else entry
+            message = AIMessage(content="", tool_calls=[
+                {
+                    "name": call["name"],
+                    "args": call.get("args", {}),
+                    # Unique per conversation position, identical across runs
+                    "id": call.get("id") or f"call_{turn}_{i}",
+                    "type": "tool_call",
+                }
+                for i, call in enumerate(calls)
+            ])
+        if self.usage and message.usage_metadata is None:
+            input_tokens = count_tokens_approximately(messages)
+            output_tokens = count_tokens_approximately([message])
+            message.usage_metadata = {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            }
+        return message
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.reply(messages))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.reply(messages))])
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        content = message.content if isinstance(message.content, str) else ""
+        size = self.chunk_size or max(len(content), 1)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+        chunks = [AIMessageChunk(content=piece) for piece in pieces]
+        # Tool calls and usage travel on the last chunk
+        chunks[-1] = AIMessageChunk(
+            content=pieces[-1],
+            tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(message.tool_calls)
+            ],
+            usage_metadata=message.usage_metadata,
+        )
+        return chunks
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for chunk in self._chunks(self.reply(messages)):
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for chunk in self._chunks(self.reply(messages)):
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
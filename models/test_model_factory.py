@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Test script for ModelClientFactory."""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from models.model_factory import ModelClientFactory, ModelEndpoint
+
+
+def _factory():
+    endpoint = ModelEndpoint(model="stub", base_url="http://127.0.0.1:1/v1", api_key="stub", cache_dir=None)
+    return ModelClientFactory({"default": endpoint})
+
+
+def test_same_endpoint_returns_shared_instance():
+    factory = _factory()
+    assert factory.get_model() is factory.get_model()
+    factory.close()
+
+
+def test_overrides_get_own_model_but_share_connection_pool():
+    factory = _factory()
+    base = factory.get_model()
+    bigger = factory.get_model(max_tokens=16 * 1024)
+
+    assert bigger is not base
+    assert bigger is factory.get_model(max_tokens=16 * 1024)
+    assert bigger.max_tokens == 16 * 1024
+    assert len(factory._http_clients) == 1
+    factory.close()
+
+
+def _server():
+    """A local endpoint answering 401 to everything, and the client address of every connection it accepted."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = ModelEndpoint(model="stub", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                             api_key="stub", cache_dir=None)
+    return server, endpoint, connections
+
+
+def test_prewarm_opens_keep_alive_connections():
+    server, endpoint, connections = _server()
+    factory = ModelClientFactory({"default": endpoint})
+    try:
+        assert factory.prewarm(connections=3) == 3
+        assert len(connections) == 3
+        # Later requests reuse the pooled connections instead of opening new ones
+        factory._http_client(endpoint).get(f"{endpoint.base_url}/models")
+        assert len(connections) == 3
+    finally:
+        factory.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_async_clients_are_closed_on_their_loop():
+    server, endpoint, connections = _server()
+    try:
+        factory = ModelClientFactory({"default": endpoint})
+
+        async def run_and_close():
+            assert await factory.aprewarm(connections=2) == 2
+            client = factory._async_http_clients[factory._pool_key(endpoint)]
+            with pytest.raises(RuntimeError, match="aclose"):
+                factory.close()
+            await factory.aclose()
+            return client
+
+        client = asyncio.run(run_and_close())
+        assert client.is_closed and len(connections) == 2 and not factory._models
+
+        # After async use, close() can no longer reach connections of the finished loop
+        factory = ModelClientFactory({"default": endpoint})
+        asyncio.run(factory.aprewarm(connections=1))
+        with pytest.warns(ResourceWarning, match="aclose"):
+            factory.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+
+def test_response_cache_is_opt_in():
+    factory = ModelClientFactory({"default": ModelEndpoint(model="stub", base_url="http://127.0.0.1:1/v1",
+                                                           api_key="stub")})
+    try:
+        if not os.getenv("PANDA_LLM_CACHE_DIR"):
+            assert factory.get_model().cache is None and not factory._caches
+    finally:
+        factory.close()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Test script for ScriptedChatModel and the agent overhead suite."""
+
+from langchain.agents import create_agent
+from langchain_core.messages import AIMessage, HumanMessage
+
+from models.scripted_model import ScriptedChatModel
+from runner.bench_agent_overhead import compare, main
+
+
+def echo(text: str) -> str:
+    """Return the text."""
+    return text
+
+
+def test_reply_depends_only_on_the_conversation():
+    model = ScriptedChatModel(script=[{"name": "echo", "args": {"text": "a"}}, "plain answer"])
+    first = model.invoke([HumanMessage(content="go")])
+    assert first.tool_calls[0]["id"] == "call_0_0"
+    assert model.invoke([HumanMessage(content="go")]).tool_calls == first.tool_calls
+    assert model.invoke([HumanMessage(content="go"), AIMessage(content="")]).content == "plain answer"
+    assert model.invoke([HumanMessage(content="go")] + [AIMessage(content="")] * 5).content == "done"
+    assert first.usage_metadata["input_tokens"] > 0
+
+
+def test_agent_plays_back_parallel_calls_and_streams_tokens():
+    model = ScriptedChatModel(
+        script=[[{"name": "echo", "args": {"text": "a"}}, {"name": "echo", "args": {"text": "b"}}]],
+        final="all done",
+        chunk_size=3,
+    )
+    agent = create_agent(model=model, tools=[echo])
+    tokens = [
+        chunk.content
+        for chunk, _ in agent.stream({"messages": "go"}, stream_mode="messages")
+        if isinstance(chunk, AIMessage) and chunk.content
+    ]
+    assert tokens == ["all", " do", "ne"]
+    result = agent.invoke({"messages": "go"})
+    assert [m.content for m in result["messages"][2:4]] == ["a", "b"]
+
+
+def test_overhead_suite_runs_and_flags_regressions():
+    assert main(["--configs", "weather", "--steps", "3", "--sessions", "1"]) == 0
+    results = {"coding": {"ms_per_step": {10: 3.0}, "kb_per_step": {10: 10.0}}}
+    baseline = {"coding": {"ms_per_step": {"10": 1.0}, "kb_per_step": {"10": 10.0}}}
+    assert compare(results, baseline, tolerance=0.5) == ["coding ms_per_step@10: 3.0 > 1.0 (+200%)"]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for the panda agents.
+
+Only the standard library is imported up front. langchain, langgraph and the
+openai SDK cost about a second to import, so each subcommand imports what it
+needs when it runs: ``--help``, ``read``, ``grep`` and ``threads`` never load
+them, and short-lived processes start fast.
+
+Usage:
+    python panda_cli.py run "fix the failing test" [--thread-id ID]
+    python panda_cli.py weather
+    python panda_cli.py batch tasks.jsonl -o results.jsonl --workers 16
+    python panda_cli.py threads
+    python panda_cli.py approvals [approve|reject ID [--message TEXT] | serve --port 8765]
+    python panda_cli.py read panda_coding_agent.py --offset 1 --limit 40
+    python panda_cli.py grep "def build_" . --output-mode content [--json]
+    python panda_cli.py index . [--rebuild]
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+CHECKPOINT_DB = ".panda_cache/checkpoints.db"
+APPROVALS_DB = ".panda_cache/approvals.db"
+
+
+def _run(args):
+    from panda_coding_agent import exeCodingAgent
+
+    exeCodingAgent(args.thread_id, args.question, _policies(args))
+
+
+def _weather(args):
+    from panda_coding_agent import exeWeatherAgent
+
+    exeWeatherAgent(_policies(args))
+
+
+def _policies(args):
+    policies = {name: "approve" for name in args.auto_approve}
+    policies.update({name: "reject" for name in args.auto_reject})
+    return policies
+
+
+def _batch(argv: List[str]):
+    from runner.batch_runner import main as batch_main
+
+    batch_main(argv)
+
+
+def _threads(args):
+    import os
+
+    if not os.path.exists(args.db):
+        return
+    from checkpoint.sqlite_checkpointer import SqliteDeltaSaver
+
+    for thread_id in SqliteDeltaSaver(args.db).list_threads()[:args.limit]:
+        print(thread_id)
+
+
+def _approvals(args):
+    import json
+    import time
+
+    from approval.approval_queue import ApprovalQueue, ApprovalServer
+
+    queue = ApprovalQueue(args.db)
+    if args.action == "list":
+        for approval in queue.pending():
+            print(json.dumps(approval.to_dict(), ensure_ascii=False))
+    elif args.action == "serve":
+        server = ApprovalServer(queue, args.host, args.port).start()
+        print(f"serving approvals on {server.url}/approvals")
+        try:
+            while True:
+                # 同时处理inbox目录里投递的决定
+                queue.poll()
+                time.sleep(queue.poll_interval)
+        except KeyboardInterrupt:
+            server.close()
+    else:
+        if not args.id:
+            sys.exit(f"{args.action} needs an approval id")
+        try:
+            approval = queue.decide(args.id, args.action, args.message, decided_by="cli")
+        except KeyError:
+            sys.exit(f"error: no approval {args.id}")
+        except ValueError as e:
+            sys.exit(f"error: {e}")
+        print(json.dumps(approval.to_dict(), ensure_ascii=False))
+
+
+def _read(args):
+    from panda_coding_agent import read_file
+
+    print(read_file(args.file_path, args.offset, args.limit))
+
+
+def _grep(args):
+    import json
+    from itertools import islice
+
+    from tools.grep.grep_service import GrepError, grep_service
+
+    # Print hits as they are found; the search stops at --head-limit
+    if args.json:
+        # One [path, line_number, offset, length, [[start, end], ...]] array per matching line
+        lines = grep_service.matches(args.pattern, args.path, glob=args.glob, i=args.ignore_case,
+                                     head_limit=args.head_limit)
+        render = json.dumps
+    else:
+        lines = grep_service.stream(args.pattern, args.path, glob=args.glob, output_mode=args.output_mode,
+                                    i=args.ignore_case, n=args.line_number, head_limit=args.head_limit)
+        render = str
+    try:
+        for line in islice(lines, args.head_limit):
+            print(render(line))
+    except GrepError as e:
+        print(f"Error: {e}")
+    finally:
+        lines.close()
+
+
+def _index(args):
+    import json
+
+    from tools.grep.grep_service import grep_service
+
+    index = grep_service.trigram_index(args.path, create=True)
+    if args.rebuild or not index.exists():
+        print(json.dumps(index.build()))
+    else:
+        print(json.dumps({**index.refresh(), **index.stats()}))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="panda", description="panda coding agent")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the coding agent on a question")
+    run.add_argument("question", nargs="?", default=None)
+    run.add_argument("--thread-id", default=None, help="resume this session")
+    run.set_defaults(func=_run)
+
+    weather = commands.add_parser("weather", help="run the weather agent")
+    weather.set_defaults(func=_weather)
+
+    for command in (run, weather):
+        command.add_argument("--auto-approve", action="append", default=[], metavar="TOOL",
+                             help="approve calls to this tool without asking (repeatable)")
+        command.add_argument("--auto-reject", action="append", default=[], metavar="TOOL",
+                             help="reject calls to this tool without asking (repeatable)")
+
+    # Listed for --help only: main() hands its arguments straight to runner/batch_runner.py
+    commands.add_parser("batch", help="run a JSONL task file headless (see runner/batch_runner.py)")
+
+    threads = commands.add_parser("threads", help="list resumable sessions, most recent first")
+    threads.add_argument("--db", default=CHECKPOINT_DB)
+    threads.add_argument("--limit", type=int, default=20)
+    threads.set_defaults(func=_threads)
+
+    approvals = commands.add_parser("approvals", help="list, decide or serve pending tool-call approvals")
+    approvals.add_argument("action", nargs="?", default="list", choices=["list", "approve", "reject", "serve"])
+    approvals.add_argument("id", nargs="?", default=None)
+    approvals.add_argument("--message", default=None, help="reason sent to the model on reject")
+    approvals.add_argument("--db", default=APPROVALS_DB)
+    approvals.add_argument("--host", default="127.0.0.1")
+    approvals.add_argument("--port", type=int, default=8765)
+    approvals.set_defaults(func=_approvals)
+
+    read = commands.add_parser("read", help="print a file the way the read_file tool returns it")
+    read.add_argument("file_path")
+    read.add_argument("--offset", type=int, default=None)
+    read.add_argument("--limit", type=int, default=None)
+    read.set_defaults(func=_read)
+
+    grep = commands.add_parser("grep", help="search files with the custom_grep tool")
+    grep.add_argument("pattern")
+    grep.add_argument("path", nargs="?", default=".")
+    grep.add_argument("--glob", default=None)
+    grep.add_argument("--output-mode", default="files_with_matches", choices=["files_with_matches", "content", "count"])
+    grep.add_argument("-i", "--ignore-case", action="store_true")
+    grep.add_argument("-n", "--line-number", action="store_true")
+    grep.add_argument("--head-limit", type=int, default=None)
+    grep.add_argument("--json", action="store_true", help="one match record per line, with byte offsets")
+    grep.set_defaults(func=_grep)
+
+    index = commands.add_parser("index", help="build or refresh the trigram index custom_grep uses for a directory")
+    index.add_argument("path", nargs="?", default=".")
+    index.add_argument("--rebuild", action="store_true", help="index every file again instead of refreshing")
+    index.set_defaults(func=_index)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["batch"]:
+        # Every remaining argument, --help included, belongs to the batch runner's own parser
+        return _batch(argv[1:])
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,16 +1,23 @@
 # pip install -qU "langchain[anthropic]" to call the model
-
-from langchain.agents import create_agent
-from langchain.agents.middleware import HumanInTheLoopMiddleware
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, FunctionMessage
+import json
+import os
+import sys
+import threading
+import uuid
+from typing import List, Optional
+
+# langchain / langgraph / openai 的导入很重（约1秒），只在真正构建agent时才导入，见 build_*_agent 和 exe*Agent
+# from langchain.chat_models import init_chat_model
 # from langchain_deepseek import ChatDeepSeek
 # from langchain_ollama.chat_models import ChatOllama
-from langchain_openai import ChatOpenAI
-from langchain.agents.middleware import HumanInTheLoopMiddleware
 
+from middleware.run_context import current_thread_id
 from prompt.coding_v1_prompt import plan_act_prompt
+from tools.file.file_cache import file_cache
+from tools.file.file_editor import EditHunk, PatchError, edit_text_file
+from tools.file.file_reader import DEFAULT_LINE_LIMIT, read_text
 from tools.grep.custom_grep_tool import custom_grep
+from tools.thinking.thought_store import thought_store
 
 
 # from langgraph.checkpoint.memory import InMemorySaver
@@ -32,12 +39,27 @@ def get_city(city: str) -> str:
     return f"当前是杭州!"
 
 
-def read_file(file_path: str) -> str:
-    """Read the content of a file."""
+def read_file(file_path: str, offset: Optional[int] = None, limit: Optional[int] = None,
+              byte_start: Optional[int] = None, byte_end: Optional[int] = None) -> str:
+    """Read the content of a file.
+
+    Long files are paged: without a range at most 2000 lines are returned, followed by a
+    note with the offset of the next page. Binary files are refused.
+
+    Args:
+        file_path: Path of the file to read.
+        offset: 1-based line number to start reading from.
+        limit: Maximum number of lines to read.
+        byte_start: Start of a byte range to read instead of lines (inclusive).
+        byte_end: End of the byte range (exclusive)."""
     try:
         print("will read file")
-        with open(file_path, 'r') as file:
-            return file.read()
+        if limit is None and byte_start is None and byte_end is None:
+            limit = DEFAULT_LINE_LIMIT
+        text, first, last, total = read_text(file_path, offset, limit, byte_start, byte_end)
+        if last < total:
+            text += f"\n[showing lines {first}-{last} of {total}; call read_file with offset={last + 1} to read more]"
+        return text
     except FileNotFoundError:
         return f"Error: File {file_path} not found."
     except Exception as e:
@@ -45,16 +67,44 @@ def read_file(file_path: str) -> str:
 
 
 def write_file(file_path: str, content: str) -> str:
-    """Write content to a file."""
+    """Write content to a file. To change an existing file, use edit_file instead of rewriting it."""
     try:
         print("will write file")
         with open(file_path, 'w') as file:
             file.write(content)
+        # 写入后让共享的文件内容缓存失效，下次read_file读到新内容
+        file_cache.invalidate(file_path)
         return f"Successfully wrote to {file_path}"
     except Exception as e:
         return f"Error: {e}"
 
 
+def edit_file(file_path: str, edits: Optional[List[EditHunk]] = None, diff: Optional[str] = None) -> str:
+    """Edit an existing file in place. Prefer this over write_file: only the changed lines are sent.
+
+    Pass either `edits` or `diff`:
+    - edits: list of {"old_string", "new_string", "replace_all"} hunks applied in order.
+      old_string must match the file exactly (including indentation) and occur exactly once,
+      unless replace_all is true. Include enough surrounding lines to make it unique.
+    - diff: a unified diff of this one file (`@@ -start,count +start,count @@` hunks with ' ', '-', '+' lines).
+
+    Nothing is written if any hunk fails. Returns a short diff of the change.
+
+    Args:
+        file_path: Path of the file to edit.
+        edits: Search/replace hunks.
+        diff: Unified diff to apply."""
+    try:
+        print("will edit file")
+        return edit_text_file(file_path, edits, diff)
+    except FileNotFoundError:
+        return f"Error: File {file_path} not found."
+    except PatchError as e:
+        return f"Error: {e}. The file was not changed."
+    except Exception as e:
+        return f"Error: {e}"
+
+
 def finish_agent() -> str:
     """Finish the agent execution."""
     return "finish"
@@ -90,7 +140,10 @@ def local_grep() -> str:
     return ""
 
 
-def sequential_thinking() -> str:
+def sequential_thinking(thought: str, next_thought_needed: bool, thought_number: int, total_thoughts: int,
+                        is_revision: Optional[bool] = None, revises_thought: Optional[int] = None,
+                        branch_from_thought: Optional[int] = None, branch_id: Optional[str] = None,
+                        needs_more_thoughts: Optional[bool] = None) -> str:
     """A detailed tool for dynamic and reflective problem-solving through thoughts.
 This tool helps analyze problems through a flexible thinking process that can adapt and evolve.
 Each thought can build on, question, or revise previous insights as understanding deepens.
@@ -131,8 +184,58 @@ Parameters explained:
 - revises_thought: If is_revision is true, which thought number is being reconsidered
 - branch_from_thought: If branching, which thought number is the branching point
 - branch_id: Identifier for the current branch (if any)
-- needs_more_thoughts: If reaching end but realizing more thoughts needed"""
-    return "current thinking result is: %s"
+- needs_more_thoughts: If reaching end but realizing more thoughts needed
+
+The result is the condensed state of the active path. Thoughts on abandoned branches are pruned."""
+    # 每个会话一棵思考树，只把当前分支的压缩状态返回给模型，见 tools/thinking/thought_store.py
+    graph = thought_store.get(current_thread_id() or "default")
+    try:
+        graph.add(thought, thought_number, total_thoughts, next_thought_needed, bool(is_revision), revises_thought,
+                  branch_from_thought, branch_id, bool(needs_more_thoughts))
+    except ValueError as e:
+        return f"Error: {e}. The thought was not recorded."
+    return graph.render()
+
+
+def confirm_interrupts(interrupts) -> bool:
+    """Ask the user whether interrupted tool calls may continue."""
+    if not interrupts:
+        return True
+    # 人工确认是否继续
+    user_input = input("是否继续执行该工具？输入 yes 继续，其他键放弃：").strip().lower()
+    if user_input == "yes":
+        # 用户同意，继续后续流程
+        print("用户确认继续，工具将被调用…")
+        return True
+    print("放弃")
+    return False
+
+
+def resolve_interrupts(agent, interrupts, sink, config, approvals, tokens=False, seen=None):
+    """
+    Get a decision for each interrupted tool call from the approval queue, resume the agent,
+    and repeat until it finishes. Calls covered by an auto-approve policy don't wait at all.
+    ``tokens`` and ``seen`` are passed on to stream_deltas, as for the run that was interrupted.
+    """
+    from langgraph.types import Command
+
+    from streaming.delta_stream import stream_deltas
+
+    thread_id = config["configurable"]["thread_id"]
+    while interrupts:
+        resume = {}
+        for interrupt in interrupts:
+            approval_id = approvals.submit(thread_id, interrupt)
+            decisions = approvals.decisions(approval_id)
+            if decisions is None and sys.stdin.isatty():
+                decision = "approve" if confirm_interrupts([interrupt]) else "reject"
+                decisions = approvals.decide(approval_id, decision, "用户放弃执行该工具").decisions
+            elif decisions is None:
+                # 无人值守：等待 panda_cli.py approvals、HTTP接口或inbox目录里的决定
+                print(f"waiting for approval {approval_id}")
+                decisions = approvals.wait_sync(approval_id)
+            resume[interrupt.id] = {"decisions": decisions}
+        interrupts = stream_deltas(agent, Command(resume=resume), sink, config=config, tokens=tokens, seen=seen)
 
 
 # model = ChatDeepSeek(model="deepseek-chat", api_key="sk-xxxx", )
@@ -150,22 +253,12 @@ Parameters explained:
 #     )
 
 
-def exeWeatherAgent():
-    model = ChatOpenAI(
-        # model="doubao-seed-1-6-251015",
-        model="",
-        base_url="https://ark.cn-beijing.volces.com/api/v3",
-        api_key="",  # 替换为你自己的 Key
-        temperature=0,
-        max_tokens=8 * 1024,
-        extra_body={
-            "thinking": {
-                "type": "disabled"  # 如果需要推理，这里可以设置为 "auto"
-            }
-        }
-    )
+def build_weather_agent(model, checkpointer=None):
+    """Build the weather agent graph around the given chat model."""
+    from langchain.agents import create_agent
+    from langchain.agents.middleware import HumanInTheLoopMiddleware
 
-    agent = create_agent(
+    return create_agent(
         model=model,
         tools=[get_weather, get_city, read_file, write_file, finish_agent, sequential_thinking],
         middleware=[HumanInTheLoopMiddleware(
@@ -180,10 +273,24 @@ def exeWeatherAgent():
             # Individual tools can override this by specifying a "description" in their interrupt config
             description_prefix="Tool execution pending approval",
         )],
-        # checkpointer=InMemorySaver(),
+        checkpointer=checkpointer,
         system_prompt="从本地文件city.json中读取所有的城市，获取当前城市的天气。 必须完成2轮判断，你才可以使用finish工具结束任务。并将最终结果写入到文件weather.json中",
     )
 
+
+def exeWeatherAgent(approval_policies=None):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from approval.approval_queue import ApprovalQueue
+    from models.model_factory import get_chat_model
+    from streaming.delta_stream import ConsoleSink, stream_deltas
+
+    # 复用共享的模型客户端（HTTP连接池、keep-alive），配置见 models/model_factory.py
+    model = get_chat_model()
+    # 中断后要从checkpoint恢复执行，所以需要checkpointer和thread_id
+    agent = build_weather_agent(model, checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+
     ## 场景1：只输出最终的结果
     # result = agent.invoke(
     #     {'messages': '开始'},
@@ -192,61 +299,117 @@ def exeWeatherAgent():
     # result = result["messages"][-1].content
     # print(f"result: {result}")
 
-    ## 场景2：走流式输出
+    ## 场景2：走流式输出（增量）
     question = ''
-    for step in agent.stream(
-            {'messages': question},
-            stream_mode="values"
-    ):
-        ## 存在key为"messages"的元素，则打印
-        if "messages" in step:
-            step["messages"][-1].pretty_print()
-        elif "__interrupt__" in step:
-            print(f'step["__interrupt__"]: {step["__interrupt__"]}')
-            # 人工确认是否继续
-            user_input = input("是否继续执行该工具？输入 yes 继续，其他键放弃：").strip().lower()
-            if user_input == "yes":
-                # 用户同意，继续后续流程
-                print("用户确认继续，工具将被调用…")
-                continue
-            else:
-                print("放弃")
-
-
-def exeCodingAgent():
-    model = ChatOpenAI(
-        # model="doubao-seed-1-6-251015",
-        model="",
-        base_url="https://ark.cn-beijing.volces.com/api/v3",
-        api_key="",  # 替换为你自己的 Key
-        temperature=0,
-        max_tokens=8 * 1024,
-        extra_body={
-            "thinking": {
-                "type": "disabled"  # 如果需要推理，这里可以设置为 "auto"
-            }
-        }
-    )
-
-    agent = create_agent(
+    sink = ConsoleSink()
+    seen = set()
+    interrupts = stream_deltas(agent, {'messages': question}, sink, config=config, seen=seen)
+    resolve_interrupts(agent, interrupts, sink, config, ApprovalQueue(policies=approval_policies), seen=seen)
+
+
+CODING_TOOLS = [get_weather, get_city, read_file, write_file, edit_file, finish_agent, sequential_thinking, custom_grep]
+
+# function -> BaseTool, so every agent built in this process shares the same tool objects (and cached schemas)
+_TOOL_INSTANCES = {}
+
+
+def _as_tools(tools):
+    from langchain_core.tools import BaseTool
+    from langchain_core.tools import tool as create_tool
+
+    result = []
+    for t in tools:
+        if not isinstance(t, (BaseTool, dict)):
+            if t not in _TOOL_INSTANCES:
+                _TOOL_INSTANCES[t] = create_tool(t)
+            t = _TOOL_INSTANCES[t]
+        result.append(t)
+    return result
+
+
+def build_coding_agent(model, tools=None, max_tool_workers=4, checkpointer=None, context_budget=32 * 1024,
+                       instrumentation=None, interrupt_on=None, tool_dedup=None, router=None):
+    """Build the coding agent graph around the given chat model."""
+    from langchain.agents import create_agent
+    from langchain.agents.middleware import HumanInTheLoopMiddleware
+
+    from middleware.context_compaction_middleware import ContextCompactionMiddleware
+    from middleware.parallel_tool_middleware import ParallelToolMiddleware
+    from middleware.prompt_prefix_middleware import StablePrefixMiddleware
+    from middleware.thought_compaction_middleware import ThoughtCompactionMiddleware
+    from middleware.tool_dedup_middleware import ToolDedupMiddleware
+
+    tools = _as_tools(tools if tools is not None else CODING_TOOLS)
+    prefix = StablePrefixMiddleware()
+    # 工具schema在构建时就转换好，第一次模型调用不再付这部分开销
+    prefix.warm(tools)
+    middleware = [HumanInTheLoopMiddleware(
+        interrupt_on=interrupt_on if interrupt_on is not None else {
+            # "write_file": True,  # All decisions (approve, edit, reject) allowed
+            "execute_sql": {"allowed_decisions": ["approve", "reject"]},  # No editing allowed
+            # "read_data": True, # 读文件需要中断
+            # "read_file": True, # 读文件需要中断
+        },
+        # Prefix for interrupt messages - combined with tool name and args to form the full message
+        # e.g., "Tool execution pending approval: execute_sql with query='DELETE FROM...'"
+        # Individual tools can override this by specifying a "description" in their interrupt config
+        description_prefix="Tool execution pending approval",
+    ),
+        # 只读工具（read_file、custom_grep等）并行执行，write_file等有副作用的工具保持调用顺序
+        ParallelToolMiddleware(max_workers=max_tool_workers),
+        # 重复的read_file/custom_grep调用（参数和文件状态都没变）只返回对之前结果的引用
+        tool_dedup if tool_dedup is not None else ToolDedupMiddleware(),
+        # 上下文超过token预算后，把旧的read_file/custom_grep大结果替换为可重新获取的占位说明
+        ContextCompactionMiddleware(max_tokens=context_budget),
+        # sequential_thinking的旧思考只保留当前分支的摘要，废弃分支的思考直接剪掉
+        ThoughtCompactionMiddleware(),
+        # 固定工具顺序和schema序列化，保证提示词前缀字节稳定，命中服务端的prompt缓存
+        prefix,
+    ]
+    if router is not None:
+        # 按规则为每一步选择模型：导航步骤用小模型，预计要编辑时用大模型
+        middleware.append(router)
+    if instrumentation is not None:
+        # 放在最内层：只统计模型和工具本身的耗时，不含并行调度的等待
+        middleware.append(instrumentation)
+    return create_agent(
         model=model,
-        tools=[get_weather, get_city, read_file, write_file, finish_agent, sequential_thinking, custom_grep],
-        middleware=[HumanInTheLoopMiddleware(
-            interrupt_on={
-                # "write_file": True,  # All decisions (approve, edit, reject) allowed
-                "execute_sql": {"allowed_decisions": ["approve", "reject"]},  # No editing allowed
-                # "read_data": True, # 读文件需要中断
-                # "read_file": True, # 读文件需要中断
-            },
-            # Prefix for interrupt messages - combined with tool name and args to form the full message
-            # e.g., "Tool execution pending approval: execute_sql with query='DELETE FROM...'"
-            # Individual tools can override this by specifying a "description" in their interrupt config
-            description_prefix="Tool execution pending approval",
-        )],
-        # checkpointer=InMemorySaver(),
+        tools=tools,
+        middleware=middleware,
+        checkpointer=checkpointer,
         system_prompt=plan_act_prompt,
     )
 
+
+def exeCodingAgent(thread_id=None, question=None, approval_policies=None):
+    from approval.approval_queue import ApprovalQueue
+    from checkpoint.sqlite_checkpointer import SqliteDeltaSaver
+    from middleware.instrumentation_middleware import InstrumentationMiddleware
+    from middleware.tool_dedup_middleware import ToolDedupMiddleware
+    from models.model_factory import get_chat_model, prewarm
+    from streaming.delta_stream import ConsoleSink, stream_deltas
+
+    # 复用共享的模型客户端（HTTP连接池、keep-alive），配置见 models/model_factory.py
+    model = get_chat_model()
+    # 构建agent的同时在后台建立到模型服务的连接（DNS/TCP/TLS），第一次模型调用不用再等握手
+    threading.Thread(target=prewarm, daemon=True).start()
+    router = None
+    if os.getenv("PANDA_FAST_MODEL"):
+        from middleware.model_router_middleware import ModelRouterMiddleware
+
+        # 配置了小模型时，grep/read等导航步骤走小模型，编辑步骤走大模型
+        router = ModelRouterMiddleware({"strong": model, "fast": get_chat_model("fast")}, latency_budget_s=600)
+
+    # 每一步的模型/工具耗时和token数写入JSONL trace，结束时打印汇总
+    instrumentation = InstrumentationMiddleware(".panda_cache/traces/coding_agent.jsonl")
+    tool_dedup = ToolDedupMiddleware()
+    # 会话状态持久化到本地SQLite，进程崩溃或重启后用相同的thread_id即可继续
+    agent = build_coding_agent(model, checkpointer=SqliteDeltaSaver(".panda_cache/checkpoints.db"),
+                               instrumentation=instrumentation, tool_dedup=tool_dedup, router=router)
+    thread_id = thread_id or uuid.uuid4().hex
+    config = {"configurable": {"thread_id": thread_id}}
+    print(f"thread_id: {thread_id}")
+
     ## 场景1：只输出最终的结果
     # result = agent.invoke(
     #     {'messages': '开始'},
@@ -255,36 +418,28 @@ def exeCodingAgent():
     # result = result["messages"][-1].content
     # print(f"result: {result}")
 
-    ## 场景2：走流式输出
-    question = '根据custom_grep的注释，实现自定义的custom_grep工具'
-    for step in agent.stream(
-            {'messages': question},
-            stream_mode="values"
-    ):
-        message = step["messages"][-1]
-        if isinstance(message, HumanMessage):
-            print(f'human message: {message}')
-        if isinstance(message, AIMessage):
-            print(f'ai message: {message}')
-        if isinstance(message, ToolMessage):
-            print(f'tool message: {message}')
-        if isinstance(message, FunctionMessage):
-            print(f'function message: {message}')
-        ## 存在key为"messages"的元素，则打印
-        if "messages" in step:
-            step["messages"][-1].pretty_print()
-        elif "__interrupt__" in step:
-            print(f'step["__interrupt__"]: {step["__interrupt__"]}')
-            # 人工确认是否继续
-            user_input = input("是否继续执行该工具？输入 yes 继续，其他键放弃：").strip().lower()
-            if user_input == "yes":
-                # 用户同意，继续后续流程
-                print("用户确认继续，工具将被调用…")
-                continue
-            else:
-                print("放弃")
+    ## 场景2：走流式输出（增量）
+    question = question or '根据custom_grep的注释，实现自定义的custom_grep工具'
+    inputs = {'messages': question}
+    if agent.get_state(config).next:
+        # 上次会话没有执行完，从最后一个checkpoint继续
+        print("resume from the last checkpoint")
+        inputs = None
+    # 只输出新增的消息和token增量，不再每一步重放完整的消息列表
+    sink = ConsoleSink(show_tokens=True)
+    seen = set()
+    interrupts = stream_deltas(agent, inputs, sink, config=config, tokens=True, seen=seen)
+    # 待审批的工具调用持久化在 .panda_cache/approvals.db，可在其他终端用 panda_cli.py approvals 审批
+    resolve_interrupts(agent, interrupts, sink, config, ApprovalQueue(policies=approval_policies),
+                       tokens=True, seen=seen)
+    print(json.dumps(instrumentation.summary(), ensure_ascii=False, indent=2))
+    print(f"file cache: {file_cache.stats()}")
+    print(f"tool dedup: {tool_dedup.stats(thread_id)}")
+    if router is not None:
+        print(json.dumps({"routes": router.summary()}, ensure_ascii=False, indent=2))
 
 
 if __name__ == '__main__':
     # exeWeatherAgent()
-    exeCodingAgent()
+    # 传入thread_id可以恢复之前中断的会话: python panda_coding_agent.py <thread_id>
+    exeCodingAgent(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Warm pool of compiled agent graphs.
+
+Building the coding agent (create_agent plus its middleware, tool conversion and
+thread pools) and opening the model's HTTP connections are paid before the
+first model call of a session. Under a burst of requests, every session pays
+them at the same moment. The pool builds graphs ahead of time, optionally runs
+a prewarm hook (e.g. ``models.model_factory.prewarm`` to open keep-alive
+connections), and hands graphs out to sessions, which return them afterwards.
+
+A graph keeps no session state (that lives in the checkpointer), so any idle
+graph can serve any session. When all graphs are in use, a new one is built,
+up to ``max_size``; beyond that, checkout waits for one to be returned.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class AgentPool:
+    """Pre-built agent graphs that sessions check out and return."""
+
+    def __init__(self, build: Callable[[], Any], size: int = 4, max_size: Optional[int] = None,
+                 prewarm: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            build: Returns a new compiled agent graph; it should share the checkpointer and model clients.
+            size: Graphs built ahead of time by :meth:`start`.
+            max_size: Upper bound on graphs in existence, ``4 * size`` by default.
+            prewarm: Called once by :meth:`start` before the graphs are built, e.g. to open connections.
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("size must be a positive integer")
+        self.build = build
+        self.size = size
+        self.max_size = max_size if max_size is not None else 4 * size
+        self.prewarm = prewarm
+        self._idle: List[Any] = []
+        self._built = 0
+        self._cond = threading.Condition()
+        self._ready = threading.Event()
+        # Coroutines waiting in acheckout: (their loop, a future set when a graph may be free)
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.prewarm_error: Optional[str] = None
+
+    def start(self, wait: bool = False) -> "AgentPool":
+        """Run the prewarm hook and build ``size`` graphs, in a background thread unless ``wait`` is set."""
+        if wait:
+            self._warm()
+        else:
+            threading.Thread(target=self._warm, name="agent-pool-warm", daemon=True).start()
+        return self
+
+    def _warm(self):
+        try:
+            if self.prewarm is not None:
+                try:
+                    self.prewarm()
+                except Exception as e:
+                    # A cold connection is only slower, never fatal
+                    self.prewarm_error = f"{type(e).__name__}: {e}"
+            while True:
+                with self._cond:
+                    if self._built >= self.size:
+                        return
+                    self._built += 1
+                agent = self._build_counted()
+                if agent is not None:
+                    self.checkin(agent)
+        finally:
+            self._ready.set()
+
+    def _build_counted(self) -> Any:
+        try:
+            return self.build()
+        except Exception:
+            with self._cond:
+                self._built -= 1
+                self._cond.notify()
+                self._notify_async()
+            raise
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until :meth:`start` has finished warming."""
+        return self._ready.wait(timeout)
+
+    def checkout(self, timeout: Optional[float] = None) -> Any:
+        """
+        Take an idle graph, building one when none is idle and the pool is below ``max_size``.
+
+        Raises:
+            TimeoutError: No graph became available within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._idle:
+                if self._built < self.max_size:
+                    self._built += 1
+                    self.misses += 1
+                    break
+                self.waits += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"no agent available within {timeout} s ({self.max_size} in use)")
+                self._cond.wait(remaining)
+            else:
+                self.hits += 1
+                return self._idle.pop()
+        return self._build_counted()
+
+    def try_checkout(self) -> Optional[Any]:
+        """An idle graph, or None without waiting or building."""
+        with self._cond:
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+        return None
+
+    def checkin(self, agent: Any):
+        with self._cond:
+            self._idle.append(agent)
+            self._cond.notify()
+            self._notify_async()
+
+    def _notify_async(self):
+        """Wake one coroutine waiting in :meth:`acheckout`; called with the lock held."""
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._wake, waiter)
+                return
+            except RuntimeError:
+                # Its loop is closed
+                continue
+
+    def _wake(self, waiter: asyncio.Future):
+        if waiter.done():
+            # Cancelled in the meantime: the next waiter gets the wake-up
+            with self._cond:
+                self._notify_async()
+        else:
+            waiter.set_result(None)
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        agent = self.checkout(timeout)
+        try:
+            yield agent
+        finally:
+            self.checkin(agent)
+
+    async def acheckout(self, timeout: Optional[float] = None) -> Any:
+        """
+        Async :meth:`checkout`. Waiting for a graph suspends the coroutine instead of
+        holding an executor thread, which the sessions' own tools need to finish and
+        check their graphs back in. A cancelled or timed-out wait takes no graph.
+
+        Raises:
+            TimeoutError: No graph became available within ``timeout`` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._cond:
+                if self._idle:
+                    self.hits += 1
+                    return self._idle.pop()
+                if self._built < self.max_size:
+                    self._built += 1
+                    self.misses += 1
+                    waiter = None
+                else:
+                    self.waits += 1
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if waiter is None:
+                return await asyncio.to_thread(self._build_counted)
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(waiter, remaining)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        pass
+                    if waiter.done() and not waiter.cancelled():
+                        # Woken but leaving: pass the wake-up on
+                        self._notify_async()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise TimeoutError(f"no agent available within {timeout} s ({self.max_size} in use)") from None
+
+    @asynccontextmanager
+    async def asession(self, timeout: Optional[float] = None):
+        agent = await self.acheckout(timeout)
+        try:
+            yield agent
+        finally:
+            self.checkin(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "built": self._built,
+                "idle": len(self._idle),
+                "in_use": self._built - len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "prewarm_error": self.prewarm_error,
+            }
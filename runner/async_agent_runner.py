@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Asyncio runner for serving many coding-agent sessions in one process.
+
+The synchronous drivers in panda_coding_agent.py block on ``agent.stream`` and
+``input()``, so a process can only serve one session. This runner drives
+``agent.astream`` instead, uses async wrappers for the blocking file and grep
+tools, and caps the number of sessions in flight with a semaphore. With an
+ApprovalQueue, an interrupted session waits for its decision on the queue,
+without holding its concurrency slot, and is then resumed.
+"""
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional, Set
+
+from langchain_core.tools import StructuredTool
+from langgraph.types import Command
+
+from approval.approval_queue import ApprovalQueue
+from panda_coding_agent import CODING_TOOLS, build_coding_agent, edit_file, read_file, write_file
+from runner.agent_pool import AgentPool
+from streaming.delta_stream import StreamSink, astream_deltas
+from tools.file.file_editor import EditHunk
+from tools.grep.custom_grep_tool import custom_grep
+
+
+async def aread_file(file_path: str, offset: Optional[int] = None, limit: Optional[int] = None,
+                     byte_start: Optional[int] = None, byte_end: Optional[int] = None) -> str:
+    """Read the content of a file."""
+    return await asyncio.to_thread(read_file, file_path, offset, limit, byte_start, byte_end)
+
+
+async def awrite_file(file_path: str, content: str) -> str:
+    """Write content to a file."""
+    return await asyncio.to_thread(write_file, file_path, content)
+
+
+async def aedit_file(file_path: str, edits: Optional[List[EditHunk]] = None, diff: Optional[str] = None) -> str:
+    """Edit an existing file in place."""
+    return await asyncio.to_thread(edit_file, file_path, edits, diff)
+
+
+async def acustom_grep(
+    pattern: str,
+    path: str = ".",
+    glob: Optional[str] = None,
+    output_mode: str = "files_with_matches",
+    B: Optional[int] = None,
+    A: Optional[int] = None,
+    C: Optional[int] = None,
+    n: bool = False,
+    i: bool = False,
+    type: Optional[str] = None,
+    head_limit: Optional[int] = None,
+    multiline: bool = False
+) -> str:
+    """Async wrapper around custom_grep, the ripgrep subprocess runs off the event loop."""
+    return await asyncio.to_thread(
+        custom_grep, pattern, path, glob, output_mode, B, A, C, n, i, type, head_limit, multiline
+    )
+
+
+def _async_tool(func, coroutine) -> StructuredTool:
+    # Keep the sync function for the schema and description so the model sees the same tool
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=func.__name__)
+
+
+_ASYNC_OVERRIDES = {
+    "read_file": _async_tool(read_file, aread_file),
+    "write_file": _async_tool(write_file, awrite_file),
+    "edit_file": _async_tool(edit_file, aedit_file),
+    "custom_grep": _async_tool(custom_grep, acustom_grep),
+}
+
+ASYNC_CODING_TOOLS = [_ASYNC_OVERRIDES.get(t.__name__, t) for t in CODING_TOOLS]
+
+
+@dataclass
+class SessionResult:
+    """Outcome of one agent session."""
+
+    session_id: str
+    question: str
+    final_message: Any = None
+    steps: int = 0
+    interrupts: List[Any] = field(default_factory=list)
+    elapsed: float = 0.0
+    approval_wait: float = 0.0
+    error: Optional[str] = None
+
+
+class _SessionSink(StreamSink):
+    """Track step count and the last message of a session, forwarding to an optional user sink."""
+
+    def __init__(self, result: SessionResult, downstream: Optional[StreamSink] = None):
+        self.result = result
+        self.downstream = downstream
+
+    def on_message(self, message, node=None):
+        self.result.steps += 1
+        self.result.final_message = message
+        if self.downstream is not None:
+            self.downstream.on_message(message, node)
+
+    def on_interrupt(self, interrupt):
+        if self.downstream is not None:
+            self.downstream.on_interrupt(interrupt)
+
+
+class AsyncAgentRunner:
+    """Run agent sessions concurrently on a single event loop."""
+
+    def __init__(self, agent, max_concurrency: int = 100, recursion_limit: int = 50,
+                 approvals: Optional[ApprovalQueue] = None):
+        """
+        Args:
+            agent: Compiled agent graph, e.g. from ``build_async_coding_agent``.
+                The graph is stateless between sessions and is shared by all of them.
+                An AgentPool works too: each session segment checks a graph out of it.
+            max_concurrency: Maximum number of sessions in flight at once.
+            recursion_limit: LangGraph recursion limit per session.
+            approvals: Queue that interrupted sessions wait on. Without one, interrupts
+                are only recorded and the session ends at the first of them. Sessions are
+                resumed from their checkpoint, so the graph needs a checkpointer.
+
+        Raises:
+            ValueError: Invalid max_concurrency, or approvals for a graph without a checkpointer.
+        """
+        if not isinstance(max_concurrency, int) or max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive integer")
+        # Graphs of a pool are built later; the pool's builder is expected to share a checkpointer
+        if approvals is not None and not isinstance(agent, AgentPool) and not getattr(agent, "checkpointer", None):
+            raise ValueError("approvals need a graph compiled with a checkpointer, interrupted sessions are "
+                             "resumed from their checkpoint")
+        self.agent = agent
+        self.max_concurrency = max_concurrency
+        self.recursion_limit = recursion_limit
+        self.approvals = approvals
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def run(self, question: str, session_id: Optional[str] = None,
+                  sink: Optional[StreamSink] = None) -> SessionResult:
+        """
+        Run one session to completion.
+
+        Interrupts are recorded. With an approval queue the session then waits for the
+        decisions and resumes; otherwise it ends there instead of waiting on a human.
+
+        Args:
+            question: The task for the agent.
+            session_id: Thread id for the session, generated when omitted.
+            sink: Optional sink that also receives the session's new messages.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        result = SessionResult(session_id=session_id or uuid.uuid4().hex, question=question)
+        config = {
+            "configurable": {"thread_id": result.session_id},
+            "recursion_limit": self.recursion_limit,
+        }
+        session_sink = _SessionSink(result, sink)
+        # Messages emitted so far, across resumes: rewrites of them are not recorded twice
+        seen: Set[str] = set()
+        inputs: Any = {'messages': question}
+        started = time.perf_counter()
+        try:
+            while True:
+                async with self._semaphore:
+                    interrupts = await self._stream(inputs, session_sink, config, seen)
+                result.interrupts.extend(interrupts)
+                if not interrupts or self.approvals is None:
+                    break
+                # Waiting on a human happens outside the semaphore, so other sessions keep the slot busy
+                waiting = time.perf_counter()
+                resume = {}
+                for interrupt in interrupts:
+                    approval_id = self.approvals.submit(result.session_id, interrupt)
+                    resume[interrupt.id] = {"decisions": await self.approvals.wait(approval_id)}
+                result.approval_wait += time.perf_counter() - waiting
+                inputs = Command(resume=resume)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    async def _stream(self, inputs, sink: StreamSink, config, seen: Set[str]) -> List[Any]:
+        if not isinstance(self.agent, AgentPool):
+            return await astream_deltas(self.agent, inputs, sink, config=config, seen=seen)
+        async with self.agent.asession() as agent:
+            return await astream_deltas(agent, inputs, sink, config=config, seen=seen)
+
+    async def run_many(self, questions: Iterable[str]) -> List[SessionResult]:
+        """Run one session per question; results are returned in input order."""
+        return await asyncio.gather(*(self.run(question) for question in questions))
+
+
+def build_async_coding_agent(model, max_tool_workers: int = 32, checkpointer=None, instrumentation=None,
+                             interrupt_on=None):
+    """
+    Build the coding agent with async-capable tools for use with AsyncAgentRunner.
+
+    Without a checkpointer the sessions are kept in an InMemorySaver of this graph, which
+    AsyncAgentRunner needs to resume interrupted sessions. Graphs of one AgentPool should
+    share a checkpointer instead, since a session may resume on another graph of the pool.
+    """
+    if checkpointer is None:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        checkpointer = InMemorySaver()
+    return build_coding_agent(
+        model,
+        tools=ASYNC_CODING_TOOLS,
+        max_tool_workers=max_tool_workers,
+        checkpointer=checkpointer,
+        instrumentation=instrumentation,
+        interrupt_on=interrupt_on,
+    )
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner: one isolated agent session per task, spread over a pool of worker processes.
+
+Tasks are read from a JSONL file shaped like ``requests.jsonl`` (``request_id``,
+``title``, ``body``; ``id``/``question`` also work). Each worker process builds
+the model client and the agent once and then runs one task at a time as its
+own session. A task that runs past ``--timeout`` is cancelled inside the
+worker; a worker that does not answer within the grace period after that is
+killed and replaced. One result line (status, answer and metrics) is appended
+to the output JSONL per task as soon as it finishes, so a batch that was
+stopped can be resumed: tasks that already have a result are skipped.
+
+Usage:
+    python runner/batch_runner.py tasks.jsonl -o results.jsonl --workers 16 --timeout 600
+    python runner/batch_runner.py tasks.jsonl -o results.jsonl --retry-failed   # resume, re-running errors
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Statuses that count as finished when resuming; "error" and "timeout" are re-run with --retry-failed
+FINAL_STATUSES = frozenset({"ok", "interrupted", "error", "timeout"})
+RETRYABLE_STATUSES = frozenset({"error", "timeout"})
+DEFAULT_MODEL_FACTORY = "models.model_factory:get_chat_model"
+
+
+def read_tasks(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield tasks with a ``task_id`` and a ``question``; blank lines are skipped."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            task = json.loads(line)
+            task_id = task.get("request_id") or task.get("id") or f"line-{number}"
+            question = task.get("question")
+            if question is None:
+                question = "\n\n".join(part for part in (task.get("title"), task.get("body")) if part)
+            yield {"task_id": str(task_id), "title": task.get("title"), "question": question}
+
+
+def finished_task_ids(path: str, retry_failed: bool = False) -> Set[str]:
+    """Ids of the tasks that already have a final result in ``path``."""
+    last_status: Dict[str, str] = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a batch that was killed mid-write
+                    continue
+                # A task may appear more than once after --retry-failed; the last result wins
+                last_status[result["task_id"]] = result.get("status")
+    return {
+        task_id for task_id, status in last_status.items()
+        if status in FINAL_STATUSES and not (retry_failed and status in RETRYABLE_STATUSES)
+    }
+
+
+def load_callable(path: str) -> Callable:
+    """Import ``package.module:attribute``."""
+    module, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+# -- worker process ----------------------------------------------------------
+
+
+def _task_metrics(instrumentation, thread_id: str) -> Dict[str, Any]:
+    summary = instrumentation.summary(thread_id=thread_id)
+    model = summary["model"]
+    return {
+        "model_calls": model["calls"],
+        "model_ms": model["duration_ms"]["total"],
+        "input_tokens": model["input_tokens"],
+        "output_tokens": model["output_tokens"],
+        "cached_tokens": model["cached_tokens"],
+        "tool_calls": {name: tool["calls"] for name, tool in summary["tools"].items()},
+        "tool_ms": round(sum(tool["duration_ms"]["total"] for tool in summary["tools"].values()), 3),
+    }
+
+
+async def _run_task(runner, instrumentation, checkpointer, task: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    from runner.async_agent_runner import SessionResult
+
+    thread_id = task["task_id"]
+    started = time.perf_counter()
+    try:
+        session = await asyncio.wait_for(runner.run(task["question"], session_id=thread_id), timeout)
+    except asyncio.TimeoutError:
+        session = SessionResult(session_id=thread_id, question=task["question"], error=f"timed out after {timeout}s")
+        status = "timeout"
+    else:
+        status = "error" if session.error else "interrupted" if session.interrupts else "ok"
+
+    answer = getattr(session.final_message, "content", None)
+    result = {
+        "task_id": task["task_id"],
+        "title": task.get("title"),
+        "status": status,
+        "answer": answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False, default=str),
+        "steps": session.steps,
+        "interrupts": [str(i) for i in session.interrupts],
+        "error": session.error,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "metrics": _task_metrics(instrumentation, thread_id),
+        "worker": os.getpid(),
+    }
+    # Sessions are isolated and never resumed, so their checkpoints can go
+    checkpointer.delete_thread(thread_id)
+    return result
+
+
+def _worker_main(conn, model_factory: str, recursion_limit: int, timeout: float):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from middleware.instrumentation_middleware import InstrumentationMiddleware
+    from runner.async_agent_runner import AsyncAgentRunner, build_async_coding_agent
+
+    # Built once per worker: HTTP connection pool, tool schemas and the compiled graph are reused by every task
+    instrumentation = InstrumentationMiddleware(history=2000)
+    checkpointer = InMemorySaver()
+    agent = build_async_coding_agent(
+        load_callable(model_factory)(), checkpointer=checkpointer, instrumentation=instrumentation
+    )
+    runner = AsyncAgentRunner(agent, max_concurrency=1, recursion_limit=recursion_limit)
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            conn.send(loop.run_until_complete(_run_task(runner, instrumentation, checkpointer, task, timeout)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        from models.model_factory import aclose
+
+        # The async HTTP connections of the shared models can only be closed on this loop
+        loop.run_until_complete(aclose())
+        loop.close()
+
+
+# -- parent process ----------------------------------------------------------
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Any
+    task: Optional[Dict[str, Any]] = None
+    deadline: float = 0.0
+    completed: int = 0
+
+
+class BatchRunner:
+    """Run tasks in a pool of worker processes with per-task timeouts, appending results to a JSONL file."""
+
+    def __init__(
+        self,
+        output_path: str,
+        workers: int = os.cpu_count() or 1,
+        timeout: float = 600.0,
+        kill_grace: float = 30.0,
+        recursion_limit: int = 50,
+        max_tasks_per_worker: int = 200,
+        model_factory: str = DEFAULT_MODEL_FACTORY,
+    ):
+        """
+        Args:
+            output_path: JSONL file results are appended to.
+            workers: Number of worker processes.
+            timeout: Seconds a task may run before it is cancelled.
+            kill_grace: Extra seconds before a worker that ignores the cancellation is killed.
+            recursion_limit: LangGraph recursion limit per session.
+            max_tasks_per_worker: Tasks after which a worker is replaced, to bound memory growth.
+            model_factory: ``module:callable`` returning the chat model, called once per worker.
+        """
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("workers must be a positive integer")
+        self.output_path = output_path
+        self.workers = workers
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.recursion_limit = recursion_limit
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.model_factory = model_factory
+        self._context = multiprocessing.get_context()
+
+    def _spawn(self) -> _Worker:
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child, self.model_factory, self.recursion_limit, self.timeout),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        return _Worker(process=process, conn=parent)
+
+    @staticmethod
+    def _stop(worker: _Worker, kill: bool = False):
+        if kill:
+            worker.process.kill()
+        else:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        worker.process.join(5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+
+    def run(self, tasks: List[Dict[str, Any]], on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Counter:
+        """Run ``tasks`` and return the number of results per status."""
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pending = deque(tasks)
+        statuses: Counter = Counter()
+        pool = [self._spawn() for _ in range(min(self.workers, len(pending)))]
+
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            def emit(result):
+                out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                statuses[result["status"]] += 1
+                if on_result is not None:
+                    on_result(result)
+
+            try:
+                while pending or any(w.task is not None for w in pool):
+                    for worker in pool:
+                        if worker.task is None and pending:
+                            worker.task = pending.popleft()
+                            worker.deadline = time.monotonic() + self.timeout + self.kill_grace
+                            worker.conn.send(worker.task)
+
+                    busy = [w for w in pool if w.task is not None]
+                    next_deadline = min(w.deadline for w in busy)
+                    ready = wait([w.conn for w in busy], timeout=max(0.0, next_deadline - time.monotonic()))
+
+                    for i, worker in enumerate(pool):
+                        if worker.task is None:
+                            continue
+                        if worker.conn in ready:
+                            try:
+                                result = worker.conn.recv()
+                            except EOFError:
+                                # The worker process died (segfault, OOM kill, ...)
+                                result = self._failed(worker, "error", f"worker exited with code {worker.process.exitcode}")
+                                self._stop(worker, kill=True)
+                                pool[i] = self._spawn()
+                                emit(result)
+                                continue
+                            worker.task = None
+                            worker.completed += 1
+                            emit(result)
+                            if worker.completed >= self.max_tasks_per_worker and pending:
+                                self._stop(worker)
+                                pool[i] = self._spawn()
+                        elif time.monotonic() >= worker.deadline:
+                            result = self._failed(
+                                worker, "timeout", f"killed after {self.timeout + self.kill_grace}s without a response"
+                            )
+                            self._stop(worker, kill=True)
+                            pool[i] = self._spawn()
+                            emit(result)
+            finally:
+                for worker in pool:
+                    self._stop(worker, kill=worker.task is not None)
+        return statuses
+
+    def _failed(self, worker: _Worker, status: str, error: str) -> Dict[str, Any]:
+        task = worker.task
+        return {
+            "task_id": task["task_id"],
+            "title": task.get("title"),
+            "status": status,
+            "answer": None,
+            "steps": 0,
+            "interrupts": [],
+            "error": error,
+            "elapsed_s": round(self.timeout + self.kill_grace - (worker.deadline - time.monotonic()), 3),
+            "metrics": {},
+            "worker": worker.process.pid,
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", help="JSONL task file")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds per task")
+    parser.add_argument("--recursion-limit", type=int, default=50)
+    parser.add_argument("--max-tasks-per-worker", type=int, default=200)
+    parser.add_argument("--model-factory", default=DEFAULT_MODEL_FACTORY, help="module:callable returning the chat model")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run tasks whose last result is error/timeout")
+    parser.add_argument("--no-resume", action="store_true", help="run every task even if it already has a result")
+    parser.add_argument("--limit", type=int, default=None, help="run at most this many tasks")
+    args = parser.parse_args(argv)
+
+    done = set() if args.no_resume else finished_task_ids(args.output, retry_failed=args.retry_failed)
+    tasks = [task for task in read_tasks(args.tasks) if task["task_id"] not in done]
+    if args.limit is not None:
+        tasks = tasks[:args.limit]
+    print(f"{len(tasks)} tasks to run, {len(done)} already finished", flush=True)
+    if not tasks:
+        return
+
+    started = time.perf_counter()
+
+    def progress(result):
+        print(f"[{result['status']}] {result['task_id']} {result['elapsed_s']}s", flush=True)
+
+    statuses = BatchRunner(
+        args.output,
+        workers=args.workers,
+        timeout=args.timeout,
+        recursion_limit=args.recursion_limit,
+        max_tasks_per_worker=args.max_tasks_per_worker,
+        model_factory=args.model_factory,
+    ).run(tasks, on_result=progress)
+    elapsed = time.perf_counter() - started
+    print(f"{sum(statuses.values())} tasks in {elapsed:.1f}s ({sum(statuses.values()) / elapsed * 60:.1f}/min): "
+          + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Agent-loop overhead suite for the weather and coding agent configurations.
+
+Runs the real graphs (create_agent + middleware + our tools) against
+ScriptedChatModel, a zero-latency scripted model, in a scratch directory. So
+the numbers are the framework and tool overhead only, and the suite runs
+offline. Reported per configuration:
+  ms/step:      wall time per agent step (one model turn plus its tool calls), at each session length
+  KB/step:      memory still allocated after a session, per step (tracemalloc)
+  sessions/s:   throughput of short sessions through one compiled graph
+
+For CI, ``--save`` writes the results as JSON and ``--baseline`` compares a run
+against such a file: the suite exits with status 1 when ms/step or KB/step
+regresses by more than ``--tolerance``.
+
+Usage:
+    python runner/bench_agent_overhead.py --steps 10 100 --sessions 20
+    python runner/bench_agent_overhead.py --save bench_baseline.json
+    python runner/bench_agent_overhead.py --baseline bench_baseline.json --tolerance 0.5
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from models.scripted_model import ScriptedChatModel
+from panda_coding_agent import build_coding_agent, build_weather_agent
+from streaming.delta_stream import CallbackSink, stream_deltas
+
+SAMPLE_SOURCE = "VALUE = 0\n\n\ndef hello_world():\n    return VALUE\n" + "# padding line\n" * 200
+
+
+def weather_script(workdir: str, steps: int) -> List[Any]:
+    """get_city, then get_weather + read_file in parallel, then write_file, repeated."""
+    cities = os.path.join(workdir, "city.json")
+    cycle = [
+        {"name": "get_city", "args": {"city": "杭州"}},
+        [
+            {"name": "get_weather", "args": {"city": "杭州"}},
+            {"name": "read_file", "args": {"file_path": cities}},
+        ],
+        {"name": "write_file", "args": {"file_path": os.path.join(workdir, "weather.json"), "content": "{}"}},
+    ]
+    return [cycle[i % len(cycle)] for i in range(steps)]
+
+
+def coding_script(workdir: str, steps: int) -> List[Any]:
+    """read_file + custom_grep in parallel, then edit_file, then sequential_thinking, repeated."""
+    source = os.path.join(workdir, "sample.py")
+    script = []
+    for i in range(steps):
+        phase = i % 3
+        if phase == 0:
+            script.append([
+                {"name": "read_file", "args": {"file_path": source}},
+                {"name": "custom_grep", "args": {"pattern": "VALUE", "path": workdir, "output_mode": "content"}},
+            ])
+        elif phase == 1:
+            k = i // 3
+            script.append({"name": "edit_file", "args": {
+                "file_path": source,
+                "edits": [{"old_string": f"VALUE = {k}", "new_string": f"VALUE = {k + 1}"}],
+            }})
+        else:
+            script.append({"name": "sequential_thinking", "args": {
+                "thought": f"Step {i}: VALUE should now be {i // 3 + 1}; check the callers next.",
+                "thought_number": i // 3 + 1, "total_thoughts": steps // 3 + 1, "next_thought_needed": True,
+            }})
+    return script
+
+
+def _prepare(workdir: str):
+    with open(os.path.join(workdir, "city.json"), "w", encoding="utf-8") as f:
+        json.dump({"cities": ["杭州", "北京", "上海"]}, f, ensure_ascii=False)
+    with open(os.path.join(workdir, "sample.py"), "w", encoding="utf-8") as f:
+        f.write(SAMPLE_SOURCE)
+
+
+CONFIGS: Dict[str, Dict[str, Callable]] = {
+    "weather": {"build": build_weather_agent, "script": weather_script},
+    "coding": {"build": build_coding_agent, "script": coding_script},
+}
+
+
+def _run_session(agent, thread_id: str, steps: int):
+    # The tools print progress lines; keep them out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stream_deltas(
+            agent,
+            {"messages": "开始"},
+            CallbackSink(lambda event, payload: None),
+            config={"configurable": {"thread_id": thread_id}, "recursion_limit": 4 * steps + 10},
+        )
+
+
+def _agent(name: str, workdir: str, steps: int):
+    config = CONFIGS[name]
+    return config["build"](ScriptedChatModel(script=config["script"](workdir, steps)), checkpointer=InMemorySaver())
+
+
+def bench_config(name: str, step_counts: List[int], sessions: int, workdir: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"ms_per_step": {}, "kb_per_step": {}}
+    short = 5
+
+    # Warm-up: first-call imports, schema generation, tool pools
+    _prepare(workdir)
+    _run_session(_agent(name, workdir, short), "warmup", short)
+
+    for steps in step_counts:
+        agent = _agent(name, workdir, steps)
+        _prepare(workdir)
+        started = time.perf_counter()
+        _run_session(agent, "timed", steps)
+        result["ms_per_step"][steps] = round((time.perf_counter() - started) * 1000 / steps, 3)
+
+        _prepare(workdir)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        _run_session(agent, "traced", steps)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        result["kb_per_step"][steps] = round((after - before) / 1024 / steps, 2)
+
+    agent = _agent(name, workdir, short)
+    started = time.perf_counter()
+    for i in range(sessions):
+        _prepare(workdir)
+        _run_session(agent, f"session-{i}", short)
+    result["sessions_per_sec"] = round(sessions / (time.perf_counter() - started), 2)
+    return result
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of ms/step and KB/step against ``baseline``."""
+    regressions = []
+    for name, result in results.items():
+        for metric in ("ms_per_step", "kb_per_step"):
+            for steps, value in result[metric].items():
+                reference = baseline.get(name, {}).get(metric, {}).get(str(steps))
+                if reference and value > reference * (1 + tolerance):
+                    regressions.append(f"{name} {metric}@{steps}: {value} > {reference} (+{value / reference - 1:.0%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--sessions", type=int, default=20, help="short sessions for the throughput measurement")
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name in args.configs:
+                results[name] = bench_config(name, args.steps, args.sessions, workdir)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'config':<10} {'steps':>6} {'ms/step':>9} {'KB/step':>9} {'sessions/s':>11}")
+    for name, result in results.items():
+        for steps in args.steps:
+            print(f"{name:<10} {steps:>6} {result['ms_per_step'][steps]:>9.2f} "
+                  f"{result['kb_per_step'][steps]:>9.2f} {result['sessions_per_sec']:>11.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
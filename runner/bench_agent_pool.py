@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for AgentPool: time from request arrival to the first model call under bursty load.
+
+Requests arrive in bursts of ``--burst`` at once, each served on its own
+thread. "cold" builds the coding agent per request, as exeCodingAgent does;
+"pool" checks a pre-built graph out of a warm AgentPool. The model is
+ScriptedChatModel, so only the agent-side setup is measured; the connection
+prewarm hook needs a real endpoint and is not part of these numbers.
+
+Usage:
+    python runner/bench_agent_pool.py --bursts 5 --burst 16 --pool-size 16
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from models.scripted_model import ScriptedChatModel
+from panda_coding_agent import build_coding_agent
+from runner.agent_pool import AgentPool
+
+
+class _FirstCallModel(ScriptedChatModel):
+    """Records when the first model call of each request happens, keyed by the request text."""
+
+    first_call: Dict[str, float] = {}
+
+    def reply(self, messages):
+        request = next(m.content for m in messages if isinstance(m, HumanMessage))
+        self.first_call.setdefault(request, time.perf_counter())
+        return super().reply(messages)
+
+
+def _serve(get_agent, release, request: str, arrived: float, samples: List[float], model: _FirstCallModel):
+    agent = get_agent()
+    try:
+        agent.invoke({"messages": request}, {"configurable": {"thread_id": request}})
+    finally:
+        release(agent)
+    samples.append((model.first_call[request] - arrived) * 1000)
+
+
+def bench(mode: str, bursts: int, burst: int, pool_size: int, gap: float) -> List[float]:
+    model = _FirstCallModel(script=[], first_call={})
+    checkpointer = InMemorySaver()
+
+    def build():
+        return build_coding_agent(model, checkpointer=checkpointer)
+
+    if mode == "pool":
+        pool = AgentPool(build, size=pool_size).start(wait=True)
+        get_agent, release = pool.checkout, pool.checkin
+    else:
+        get_agent, release = build, lambda agent: None
+
+    samples: List[float] = []
+    with ThreadPoolExecutor(max_workers=burst) as executor:
+        for b in range(bursts):
+            arrived = time.perf_counter()
+            futures = [
+                executor.submit(_serve, get_agent, release, f"{mode}-{b}-{i}", arrived, samples, model)
+                for i in range(burst)
+            ]
+            for future in futures:
+                future.result()
+            time.sleep(gap)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=16, help="requests arriving at once")
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--gap", type=float, default=0.2, help="seconds between bursts")
+    args = parser.parse_args(argv)
+
+    results = {}
+    # The tools print progress lines, from many threads at once; keep them out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Imports and first-use costs are process-wide; pay them before either mode is timed
+        bench("cold", 1, 1, 1, 0)
+        for mode in ("cold", "pool"):
+            results[mode] = sorted(bench(mode, args.bursts, args.burst, args.pool_size, args.gap))
+
+    print(f"bursts={args.bursts} burst={args.burst} pool_size={args.pool_size}")
+    print(f"{'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for mode, samples in results.items():
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        print(f"{mode:<6} {statistics.median(samples):>8.1f} {p95:>8.1f} {samples[-1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark for AsyncAgentRunner: sessions/sec against a local fake model.
+
+Each session is one model turn that calls read_file, followed by a final
+answer. The fake model sleeps asynchronously to stand in for network latency,
+so the numbers show how well the runner overlaps sessions on one event loop.
+
+Usage:
+    python runner/bench_async_runner.py --sessions 500 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.scripted_model import ScriptedChatModel
+from runner.async_agent_runner import AsyncAgentRunner, build_async_coding_agent
+
+
+async def bench(sessions: int, concurrency: int, latency: float, file_path: str) -> float:
+    model = ScriptedChatModel(script=[{"name": "read_file", "args": {"file_path": file_path}}], latency=latency)
+    agent = build_async_coding_agent(model)
+    runner = AsyncAgentRunner(agent, max_concurrency=concurrency)
+    started = time.perf_counter()
+    results = await runner.run_many(f"task {i}" for i in range(sessions))
+    elapsed = time.perf_counter() - started
+    errors = [r.error for r in results if r.error]
+    if errors:
+        raise RuntimeError(f"{len(errors)} sessions failed, first error: {errors[0]}")
+    return sessions / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency per call, seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100, 500])
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write("def hello_world():\n    return True\n")
+    try:
+        print(f"sessions={args.sessions} model_latency={args.latency * 1000:.0f}ms")
+        print(f"{'concurrency':>12} {'sessions/sec':>14}")
+        for concurrency in args.concurrency:
+            rate = asyncio.run(bench(args.sessions, concurrency, args.latency, f.name))
+            print(f"{concurrency:>12} {rate:>14.1f}")
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
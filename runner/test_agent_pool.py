@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Test script for AgentPool."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.scripted_model import ScriptedChatModel
+from runner.agent_pool import AgentPool
+from runner.async_agent_runner import AsyncAgentRunner, build_async_coding_agent
+
+
+def test_warm_checkout_build_on_demand_and_wait():
+    built = []
+    prewarmed = threading.Event()
+    pool = AgentPool(lambda: built.append(object()) or built[-1], size=2, max_size=3, prewarm=prewarmed.set)
+    pool.start()
+    assert pool.wait_ready(5) and prewarmed.is_set()
+    assert pool.stats()["idle"] == 2
+
+    a, b = pool.checkout(), pool.checkout()
+    c = pool.checkout()
+    assert len({id(a), id(b), id(c)}) == 3 and len(built) == 3
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.05)
+
+    threading.Timer(0.05, pool.checkin, [b]).start()
+    assert pool.checkout(timeout=5) is b
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["built"]) == (3, 1, 3) and stats["waits"] >= 2
+
+
+def test_failed_prewarm_is_recorded_not_raised():
+    def fail():
+        raise OSError("unreachable")
+
+    pool = AgentPool(object, size=1, prewarm=fail).start(wait=True)
+    assert pool.stats()["prewarm_error"] == "OSError: unreachable"
+    with pool.session() as agent:
+        assert pool.stats()["in_use"] == 1
+    assert pool.try_checkout() is agent
+
+
+def test_async_runner_checks_graphs_out_of_the_pool():
+    model = ScriptedChatModel(script=[])
+    pool = AgentPool(lambda: build_async_coding_agent(model), size=2).start(wait=True)
+    runner = AsyncAgentRunner(pool, max_concurrency=4)
+    results = asyncio.run(runner.run_many(f"task {i}" for i in range(8)))
+    assert all(r.error is None and r.final_message.content == "done" for r in results)
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["built"] <= 4 and stats["hits"] + stats["misses"] == 8
+
+
+def test_async_waiters_do_not_hold_executor_threads(tmp_path):
+    # More sessions than graphs, and fewer executor threads than waiting sessions: waiting in
+    # acheckout must leave the threads to the tool calls of the sessions holding graphs
+    (tmp_path / "notes.txt").write_text("hello\n")
+    model = ScriptedChatModel(script=[{"name": "read_file", "args": {"file_path": str(tmp_path / "notes.txt")}}])
+    pool = AgentPool(lambda: build_async_coding_agent(model), size=1, max_size=2).start(wait=True)
+    runner = AsyncAgentRunner(pool, max_concurrency=50)
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=3))
+        return await asyncio.wait_for(runner.run_many(f"task {i}" for i in range(20)), 60)
+
+    results = asyncio.run(main())
+    assert all(r.error is None and r.final_message.content == "done" for r in results)
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["built"] == 2 and stats["waits"] > 0
+
+
+def test_cancelled_and_timed_out_waiters_take_no_graph():
+    pool = AgentPool(object, size=1, max_size=1).start(wait=True)
+
+    async def main():
+        agent = await pool.acheckout()
+        with pytest.raises(TimeoutError):
+            await pool.acheckout(timeout=0.05)
+        cancelled = asyncio.ensure_future(pool.acheckout())
+        waiting = asyncio.ensure_future(pool.acheckout(timeout=5))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        # Returned from another thread, as a sync session would
+        threading.Timer(0.02, pool.checkin, [agent]).start()
+        assert await waiting is agent
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        pool.checkin(agent)
+
+    asyncio.run(main())
+    assert pool.stats()["idle"] == 1 and not pool._async_waiters
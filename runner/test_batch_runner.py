@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test script for the batch runner."""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from runner.batch_runner import BatchRunner, finished_task_ids, main, read_tasks
+
+
+class _ScriptedModel(BaseChatModel):
+    """Answers at once; "hang" blocks the worker's event loop so only a kill can stop it."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        question = messages[-1].content
+        if "hang" in question:
+            time.sleep(60)
+        if "boom" in question:
+            raise RuntimeError("boom")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"answer: {question}"))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._generate(messages, stop)
+
+
+def scripted_model():
+    return _ScriptedModel()
+
+
+def _write_tasks(directory, bodies):
+    path = os.path.join(directory, "tasks.jsonl")
+    with open(path, "w") as f:
+        for i, body in enumerate(bodies, 1):
+            f.write(json.dumps({"request_id": f"t-{i}", "title": f"task {i}", "body": body}) + "\n")
+    return path
+
+
+def _results(path):
+    with open(path) as f:
+        return {r["task_id"]: r for r in map(json.loads, f)}
+
+
+def test_statuses_timeouts_and_resume():
+    with tempfile.TemporaryDirectory() as directory:
+        tasks = _write_tasks(directory, ["ok", "boom", "hang", "ok again"])
+        output = os.path.join(directory, "out", "results.jsonl")
+
+        runner = BatchRunner(
+            output, workers=2, timeout=1, kill_grace=1, model_factory="runner.test_batch_runner:scripted_model",
+        )
+        statuses = runner.run(list(read_tasks(tasks)))
+        assert statuses == {"ok": 2, "error": 1, "timeout": 1}
+
+        results = _results(output)
+        assert results["t-1"]["answer"] == "answer: task 1\n\nok"
+        assert results["t-1"]["metrics"]["model_calls"] == 1
+        assert "boom" in results["t-2"]["error"]
+        assert results["t-3"]["status"] == "timeout"
+
+        # Resuming skips everything; --retry-failed only re-runs the error and the timeout
+        assert finished_task_ids(output) == {"t-1", "t-2", "t-3", "t-4"}
+        assert finished_task_ids(output, retry_failed=True) == {"t-1", "t-4"}
+        main([tasks, "-o", output, "--workers", "1"])
+        assert len(open(output).readlines()) == 4
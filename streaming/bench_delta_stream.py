@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Per-step stream overhead: ``stream_mode="values"`` vs delta streaming.
+
+A scripted model keeps calling a cheap tool until the session reaches the
+requested number of steps, so almost all of the measured time is the agent
+loop plus stream handling. Both modes feed a no-op consumer.
+
+Usage:
+    python streaming/bench_delta_stream.py --steps 10 100 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.agents import create_agent
+
+from models.scripted_model import ScriptedChatModel
+from streaming.delta_stream import CallbackSink, stream_deltas
+
+PAYLOAD = "x" * 2048
+
+
+def lookup(key: str) -> str:
+    """Return a fixed payload for a key."""
+    return PAYLOAD
+
+
+def _run_values(agent, config):
+    for step in agent.stream({"messages": "go"}, config=config, stream_mode="values"):
+        step["messages"][-1]
+
+
+def _run_deltas(agent, config):
+    stream_deltas(agent, {"messages": "go"}, CallbackSink(lambda event, payload: None), config=config)
+
+
+def bench(steps: int, runner) -> float:
+    agent = create_agent(model=ScriptedChatModel.looping({"name": "lookup", "args": {"key": "k"}}, steps), tools=[lookup])
+    config = {"recursion_limit": 2 * steps + 10}
+    started = time.perf_counter()
+    runner(agent, config)
+    return (time.perf_counter() - started) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    print(f"{'steps':>8} {'values ms/step':>16} {'deltas ms/step':>16}")
+    for steps in args.steps:
+        values = bench(steps, _run_values)
+        deltas = bench(steps, _run_deltas)
+        print(f"{steps:>8} {values * 1000:>16.2f} {deltas * 1000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
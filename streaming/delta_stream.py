@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Incremental streaming for agent runs.
+
+``stream_mode="values"`` re-emits the whole message list on every step, so
+the cost of consuming a session grows quadratically with its length. The
+helpers here stream ``"updates"`` instead (plus ``"messages"`` for token
+deltas) and hand each new message or token to a pluggable sink.
+
+Middleware can rewrite messages already in the history (context compaction
+replaces old tool results with stubs under the same id); such rewrites show up
+in the updates too, and are not emitted again.
+"""
+
+import json
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, TextIO
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+
+
+class StreamSink:
+    """Receives new messages, token deltas and interrupts. Subclasses override what they need."""
+
+    def on_message(self, message: BaseMessage, node: Optional[str] = None):
+        pass
+
+    def on_token(self, chunk: AIMessageChunk, metadata: Dict[str, Any]):
+        pass
+
+    def on_interrupt(self, interrupt: Any):
+        pass
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(StreamSink):
+    """Pretty-print messages to the console, optionally streaming model tokens as they arrive."""
+
+    def __init__(self, show_tokens: bool = False, stream: TextIO = None):
+        self.show_tokens = show_tokens
+        self.stream = stream or sys.stdout
+        self._streamed = False
+
+    def on_message(self, message: BaseMessage, node: Optional[str] = None):
+        if isinstance(message, AIMessage) and self._streamed:
+            # Content already went out token by token, only the tool calls are left
+            self.stream.write("\n")
+            for call in message.tool_calls:
+                self.stream.write(f"-> {call['name']}({json.dumps(call['args'], ensure_ascii=False)})\n")
+            self._streamed = False
+            return
+        self.stream.write(message.pretty_repr() + "\n")
+
+    def on_token(self, chunk: AIMessageChunk, metadata: Dict[str, Any]):
+        if self.show_tokens and isinstance(chunk.content, str) and chunk.content:
+            self.stream.write(chunk.content)
+            self.stream.flush()
+            self._streamed = True
+
+    def on_interrupt(self, interrupt: Any):
+        self.stream.write(f'step["__interrupt__"]: {interrupt}\n')
+
+
+class JsonlSink(StreamSink):
+    """Append one JSON record per event to a file."""
+
+    def __init__(self, path: str, include_tokens: bool = False):
+        self.path = path
+        self.include_tokens = include_tokens
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _write(self, record: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def on_message(self, message: BaseMessage, node: Optional[str] = None):
+        self._write({"event": "message", "node": node, "message": message.model_dump()})
+
+    def on_token(self, chunk: AIMessageChunk, metadata: Dict[str, Any]):
+        if self.include_tokens:
+            self._write({"event": "token", "node": metadata.get("langgraph_node"), "content": chunk.content})
+
+    def on_interrupt(self, interrupt: Any):
+        self._write({"event": "interrupt", "value": getattr(interrupt, "value", interrupt)})
+
+    def close(self):
+        self._file.close()
+
+
+class CallbackSink(StreamSink):
+    """Forward every event to ``callback(event, payload)``; event is "message", "token" or "interrupt"."""
+
+    def __init__(self, callback: Callable[[str, Any], None]):
+        self.callback = callback
+
+    def on_message(self, message: BaseMessage, node: Optional[str] = None):
+        self.callback("message", message)
+
+    def on_token(self, chunk: AIMessageChunk, metadata: Dict[str, Any]):
+        self.callback("token", chunk)
+
+    def on_interrupt(self, interrupt: Any):
+        self.callback("interrupt", interrupt)
+
+
+def _stream_modes(tokens: bool):
+    return ["updates", "messages"] if tokens else ["updates"]
+
+
+def _input_messages(inputs: Dict[str, Any]) -> List[BaseMessage]:
+    messages = inputs.get("messages") if isinstance(inputs, dict) else None
+    if isinstance(messages, str):
+        return [HumanMessage(content=messages)]
+    if isinstance(messages, BaseMessage):
+        return [messages]
+    return [m for m in messages or [] if isinstance(m, BaseMessage)]
+
+
+def _dispatch(mode: str, data: Any, sink: StreamSink, interrupts: List[Any], seen: Set[str]):
+    if mode == "messages":
+        chunk, metadata = data
+        if isinstance(chunk, AIMessageChunk):
+            sink.on_token(chunk, metadata)
+        return
+    # "updates": {node_name: state_delta} with only what the node wrote
+    for node, update in data.items():
+        if node == "__interrupt__":
+            for interrupt in update:
+                interrupts.append(interrupt)
+                sink.on_interrupt(interrupt)
+            continue
+        if not isinstance(update, dict):
+            continue
+        messages = update.get("messages") or []
+        if isinstance(messages, BaseMessage):
+            messages = [messages]
+        for message in messages:
+            if message.id is not None:
+                if message.id in seen:
+                    # An earlier message rewritten in place (e.g. a compaction stub), or removed
+                    continue
+                seen.add(message.id)
+            sink.on_message(message, node)
+
+
+def stream_deltas(agent, inputs: Dict[str, Any], sink: StreamSink, config: Optional[Dict[str, Any]] = None,
+                  tokens: bool = False, seen: Optional[Set[str]] = None) -> List[Any]:
+    """
+    Run ``agent`` and emit only new messages (and token deltas when ``tokens`` is set) to ``sink``.
+
+    Args:
+        seen: Ids of the messages already emitted. Pass the same set to every call of
+            one session (e.g. when resuming after an interrupt), so that rewrites of
+            messages from an earlier call are not emitted either.
+
+    Returns:
+        The interrupts raised during the run, empty if it completed.
+    """
+    interrupts = []
+    seen = set() if seen is None else seen
+    for message in _input_messages(inputs):
+        sink.on_message(message, None)
+    for mode, data in agent.stream(inputs, config=config, stream_mode=_stream_modes(tokens)):
+        _dispatch(mode, data, sink, interrupts, seen)
+    return interrupts
+
+
+async def astream_deltas(agent, inputs: Dict[str, Any], sink: StreamSink, config: Optional[Dict[str, Any]] = None,
+                         tokens: bool = False, seen: Optional[Set[str]] = None) -> List[Any]:
+    """Async version of :func:`stream_deltas`."""
+    interrupts = []
+    seen = set() if seen is None else seen
+    for message in _input_messages(inputs):
+        sink.on_message(message, None)
+    async for mode, data in agent.astream(inputs, config=config, stream_mode=_stream_modes(tokens)):
+        _dispatch(mode, data, sink, interrupts, seen)
+    return interrupts
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test script for incremental streaming."""
+
+import io
+from typing import Annotated, TypedDict
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from middleware.context_compaction_middleware import ContextCompactionMiddleware
+from streaming.delta_stream import CallbackSink, ConsoleSink, _dispatch, stream_deltas
+
+
+class _Agent:
+    """Replays canned (mode, data) events and records the stream modes asked for."""
+
+    def __init__(self, *runs):
+        self.runs = list(runs)
+        self.modes = []
+
+    def stream(self, inputs, config=None, stream_mode=None):
+        self.modes.append(stream_mode)
+        yield from self.runs.pop(0)
+
+
+def _recorder():
+    events = []
+    return events, CallbackSink(lambda event, payload: events.append((event, payload)))
+
+
+def test_dispatch_routes_tokens_updates_and_interrupts():
+    events, sink = _recorder()
+    interrupts, seen = [], set()
+    chunk = AIMessageChunk(content="he")
+    _dispatch("messages", (chunk, {"langgraph_node": "model"}), sink, interrupts, seen)
+    # Only model chunks are tokens; tool results come through the updates
+    _dispatch("messages", (ToolMessage(content="x", tool_call_id="c"), {}), sink, interrupts, seen)
+    reply = AIMessage(content="hello", id="ai_1")
+    _dispatch("updates", {"model": {"messages": [reply]}, "other": None}, sink, interrupts, seen)
+    _dispatch("updates", {"__interrupt__": ("approve?",)}, sink, interrupts, seen)
+    assert events == [("token", chunk), ("message", reply), ("interrupt", "approve?")]
+    assert interrupts == ["approve?"] and seen == {"ai_1"}
+
+
+def test_token_deltas_are_requested_only_when_asked_for():
+    agent = _Agent([], [])
+    stream_deltas(agent, {"messages": "hi"}, CallbackSink(lambda event, payload: None))
+    stream_deltas(agent, None, CallbackSink(lambda event, payload: None), tokens=True)
+    assert agent.modes == [["updates"], ["updates", "messages"]]
+
+
+class _State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def test_compaction_stubs_are_not_emitted_again():
+    compaction = ContextCompactionMiddleware(max_tokens=500, keep_recent=0, min_tokens=10)
+
+    def tools(state):
+        call = {"name": "read_file", "args": {"file_path": "a.py"}, "id": "call_1"}
+        return {"messages": [AIMessage(content="", tool_calls=[call]),
+                             ToolMessage(content="x = 1\n" * 400, tool_call_id="call_1", name="read_file")]}
+
+    graph = StateGraph(_State)
+    graph.add_node("tools", tools)
+    graph.add_node("compact", lambda state: compaction.before_model(state, None))
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", "compact")
+    graph.add_edge("compact", END)
+
+    events, sink = _recorder()
+    seen = set()
+    stream_deltas(graph.compile(), {"messages": "read a.py"}, sink, seen=seen)
+    messages = [payload for event, payload in events]
+    assert [type(m) for m in messages] == [HumanMessage, AIMessage, ToolMessage]
+    # The stub replaced the result under the same id; only the original went out
+    assert compaction.compacted_messages == 1 and messages[2].content.startswith("x = 1")
+
+    # A later call of the same session (a resume) skips rewrites of what it already emitted
+    stub = ToolMessage(content="[compacted]", tool_call_id="call_1", id=messages[2].id)
+    new = AIMessage(content="done", id="ai_2")
+    events.clear()
+    stream_deltas(_Agent([("updates", {"compact": {"messages": [stub]}}), ("updates", {"model": {"messages": new}})]),
+                  None, sink, seen=seen)
+    assert events == [("message", new)]
+
+
+def test_console_sink_does_not_repeat_streamed_content():
+    out = io.StringIO()
+    sink = ConsoleSink(show_tokens=True, stream=out)
+    call = {"name": "read_file", "args": {"file_path": "a.py"}, "id": "call_1"}
+    agent = _Agent([
+        ("messages", (AIMessageChunk(content="Reading "), {})),
+        ("messages", (AIMessageChunk(content="a.py"), {})),
+        ("updates", {"model": {"messages": [AIMessage(content="Reading a.py", tool_calls=[call], id="ai_1")]}}),
+    ])
+    stream_deltas(agent, None, sink, tokens=True)
+    assert out.getvalue() == 'Reading a.py\n-> read_file({"file_path": "a.py"})\n'
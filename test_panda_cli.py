@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Test script for the CLI entry point and its import cost."""
+
+import os
+import subprocess
+import sys
+
+from bench_panda_cli import FORBIDDEN, ROOT
+from panda_cli import main
+
+
+def test_importing_the_cli_and_agent_module_stays_light():
+    code = (
+        "import sys, panda_cli, panda_coding_agent; "
+        f"print(sorted({{m.split('.')[0] for m in sys.modules}} & {set(FORBIDDEN)!r}))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_read_subcommand(capsys):
+    main(["read", os.path.join(ROOT, "panda_cli.py"), "--offset", "1", "--limit", "1"])
+    assert "#!/usr/bin/env python3\n\n[showing lines 1-1 of" in capsys.readouterr().out
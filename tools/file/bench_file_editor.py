@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Output tokens of edit_file versus full write_file rewrites.
+
+Builds a sample task set from the repository's own Python files: for each file,
+a few typical small changes (change one line, insert a line, rename a symbol
+used in several places). For each task it counts the tokens of the tool-call
+arguments the model has to generate:
+  write_file: the whole new file
+  edit_file:  the search/replace hunks (smallest unique old_string) or a unified diff
+and checks that applying the edit really produces the new file.
+
+Usage:
+    python tools/file/bench_file_editor.py --files 20
+"""
+
+import argparse
+import difflib
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.messages import AIMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from tools.file.file_editor import edit_text_file
+
+
+def count_tokens(text: str) -> int:
+    # Same approximation the compaction middleware budgets with
+    return count_tokens_approximately([AIMessage(content=text)])
+
+
+def _unique_hunk(text: str, lines, index: int, new_lines) -> dict:
+    """Grow the window around ``lines[index]`` until it is unique in the file."""
+    for radius in range(0, len(lines)):
+        start, end = max(0, index - radius), min(len(lines), index + radius + 1)
+        old = "\n".join(lines[start:end])
+        if old.strip() and text.count(old) == 1:
+            new = "\n".join(lines[start:index] + new_lines + lines[index + 1:end])
+            return {"old_string": old, "new_string": new}
+    raise ValueError("no unique window")
+
+
+def make_tasks(text: str, rng: random.Random):
+    """Yield (description, new_text, edits) for a few small changes to ``text``."""
+    lines = text.split("\n")
+    code = [i for i, line in enumerate(lines) if line.strip() and not line.strip().startswith("#")]
+    if len(code) < 10:
+        return
+
+    i = rng.choice(code)
+    changed = lines[i] + "  # reviewed"
+    new_lines = lines[:i] + [changed] + lines[i + 1:]
+    yield "change one line", "\n".join(new_lines), [_unique_hunk(text, lines, i, [changed])]
+
+    i = rng.choice(code)
+    indent = lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+    inserted = [lines[i], f"{indent}assert True  # added check"]
+    new_lines = lines[:i] + inserted + lines[i + 1:]
+    yield "insert a line", "\n".join(new_lines), [_unique_hunk(text, lines, i, inserted)]
+
+    names = [n for n in ("result", "message", "path", "config", "state") if text.count(n) >= 2]
+    if names:
+        name = rng.choice(names)
+        yield "rename a symbol", text.replace(name, name + "_"), [
+            {"old_string": name, "new_string": name + "_", "replace_all": True}
+        ]
+
+
+def run(files: int, seed: int):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    paths = sorted(
+        p for p in glob.glob(os.path.join(root, "**", "*.py"), recursive=True)
+        if "test_" not in os.path.basename(p)
+    )
+    rng = random.Random(seed)
+    rng.shuffle(paths)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths[:files]:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            rel = os.path.relpath(path, root)
+            for description, new_text, edits in make_tasks(text, rng):
+                target = os.path.join(tmp, "task.py")
+                with open(target, "w", encoding="utf-8") as f:
+                    f.write(text)
+                edit_text_file(target, edits=edits)
+                with open(target, encoding="utf-8") as f:
+                    assert f.read() == new_text, f"{rel}: {description} produced a different file"
+
+                diff = "\n".join(difflib.unified_diff(
+                    text.split("\n"), new_text.split("\n"), n=1, lineterm=""
+                ))
+                rows.append((
+                    rel,
+                    description,
+                    count_tokens(json.dumps({"file_path": rel, "content": new_text}, ensure_ascii=False)),
+                    count_tokens(json.dumps({"file_path": rel, "edits": edits}, ensure_ascii=False)),
+                    count_tokens(json.dumps({"file_path": rel, "diff": diff}, ensure_ascii=False)),
+                ))
+
+    print(f"{'task':<55} {'write_file':>10} {'edits':>7} {'diff':>7}")
+    for rel, description, full, edits, diff in rows:
+        print(f"{rel + ': ' + description:<55} {full:>10} {edits:>7} {diff:>7}")
+    full = sum(r[2] for r in rows)
+    edits = sum(r[3] for r in rows)
+    diff = sum(r[4] for r in rows)
+    print(f"\n{len(rows)} tasks, output tokens: write_file={full} edits={edits} diff={diff}")
+    print(f"saved with edits: {full - edits} tokens ({(full - edits) / full:.1%}), "
+          f"with diff: {full - diff} tokens ({(full - diff) / full:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.files, args.seed)
+
+
+if __name__ == "__main__":
+    main()
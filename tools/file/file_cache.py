@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Process-wide cache of file contents for the agent's file tools.
+
+A session keeps re-reading the same handful of files. Instead of opening,
+reading and re-indexing them every time, the content is kept in memory and
+validated with a single ``stat``: an entry is only served while the file's
+mtime, size and inode are unchanged. Writes made through the agent's own
+tools invalidate the entry explicitly, so even a rewrite within the same
+mtime tick is never served stale. Memory is capped; least recently used
+entries are evicted first.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Files larger than this are not cached (the reader memory-maps them instead)
+MAX_ENTRY_BYTES = 1 << 20
+BINARY_SNIFF_BYTES = 8192
+
+
+class CachedFile:
+    """Content of one file version, with the line index and decoded text built on first use."""
+
+    __slots__ = ("path", "version", "data", "binary", "memory", "_index", "_text")
+
+    def __init__(self, path: str, version: Tuple[int, int, int], data: bytes):
+        self.path = path
+        self.version = version
+        self.data = data
+        self.binary = b"\x00" in data[:BINARY_SNIFF_BYTES]
+        # Reserved up front for the raw bytes, the decoded text and one 8-byte offset per line
+        self.memory = 2 * len(data) + 8 * (data.count(b"\n") + 2)
+        self._index = None
+        self._text = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            from tools.file.file_reader import LineIndex
+
+            self._index = LineIndex(self.data)
+        return self._index
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.data.decode("utf-8", errors="replace")
+        return self._text
+
+
+def _version(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileContentCache:
+    """LRU cache of file contents keyed on path and validated by (mtime, size, inode)."""
+
+    def __init__(self, max_bytes: int = 64 << 20, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        """
+        Args:
+            max_bytes: Memory cap for all entries together.
+            max_entry_bytes: Files larger than this bypass the cache.
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        # Bumped on every write made through the agent's tools, cached or not
+        self.generation = 0
+        # (generation, path) of the most recent writes, for indexes that update per file
+        self._written: "deque[Tuple[int, str]]" = deque(maxlen=4096)
+
+    def get(self, path: str) -> Optional[CachedFile]:
+        """Current content of ``path``, or None when the file is too large to cache.
+
+        Raises:
+            OSError: The file cannot be read (e.g. FileNotFoundError).
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        if stat.st_size > self.max_entry_bytes:
+            return None
+        version = _version(stat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        with open(key, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        entry = CachedFile(key, _version(stat), data)
+        if len(data) > self.max_entry_bytes:
+            # Grew between stat and read
+            return entry
+        with self._lock:
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CachedFile):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.memory
+        self._entries[key] = entry
+        self._bytes += entry.memory
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.memory
+            self.evictions += 1
+
+    def invalidate(self, path: str):
+        """Drop the entry for ``path``; called after the agent writes the file."""
+        key = os.path.abspath(path)
+        with self._lock:
+            self.generation += 1
+            self._written.append((self.generation, key))
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.memory
+                self.invalidations += 1
+
+    def written_since(self, generation: int) -> Optional[List[str]]:
+        """Absolute paths written after ``generation``, or None when that far back is no longer known."""
+        with self._lock:
+            if generation >= self.generation:
+                return []
+            if not self._written or self._written[0][0] > generation + 1:
+                return None
+            return list(dict.fromkeys(path for gen, path in self._written if gen > generation))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared by read_file, write_file and edit_file in this process
+file_cache = FileContentCache()
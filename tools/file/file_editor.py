@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+In-place file edits for the agent's edit_file tool.
+
+Changing one line through ``write_file`` makes the model regenerate and send
+the whole file. An edit only carries the changed region: either exact
+search/replace hunks or a unified diff. Every hunk has to match exactly one
+place in the file, so an ambiguous edit fails instead of changing the wrong
+occurrence. All hunks are applied in memory and the file is replaced
+atomically (temp file + rename), so a failed edit never leaves a partial file.
+"""
+
+import difflib
+import os
+import re
+import tempfile
+from typing import List, Optional, Sequence, Tuple
+
+from typing_extensions import TypedDict
+
+from tools.file.file_cache import file_cache
+
+# Diff lines shown in the summary returned to the model
+SUMMARY_MAX_LINES = 40
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """Raised when an edit cannot be applied; the file is left untouched."""
+
+
+class EditHunk(TypedDict, total=False):
+    """One search/replace edit."""
+
+    old_string: str
+    new_string: str
+    replace_all: bool
+
+
+def apply_search_replace(text: str, hunks: Sequence[EditHunk]) -> str:
+    """Apply search/replace hunks in order. Each ``old_string`` must occur exactly once unless ``replace_all``."""
+    for number, hunk in enumerate(hunks, 1):
+        old = hunk.get("old_string", "")
+        new = hunk.get("new_string", "")
+        if not old:
+            raise PatchError(f"edit {number}: old_string is empty")
+        if old == new:
+            raise PatchError(f"edit {number}: old_string and new_string are identical")
+        count = text.count(old)
+        if count == 0:
+            raise PatchError(f"edit {number}: old_string not found")
+        if count > 1 and not hunk.get("replace_all"):
+            raise PatchError(
+                f"edit {number}: old_string matches {count} places; "
+                f"add surrounding lines to make it unique or set replace_all"
+            )
+        text = text.replace(old, new) if hunk.get("replace_all") else text.replace(old, new, 1)
+    return text
+
+
+def _split_lines(text: str) -> List[str]:
+    """Lines without their ``\\n``/``\\r\\n``; unlike ``str.splitlines``, form feeds and other separators stay."""
+    if not text:
+        return []
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    return [line[:-1] if line.endswith("\r") else line for line in lines]
+
+
+def _parse_unified_diff(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    """Return (old_start, old_lines, new_lines) per hunk; the file header is skipped.
+
+    Raises:
+        PatchError: No hunks, or the hunks of more than one file.
+    """
+    hunks = []
+    current = None
+    # Lines of the current hunk still expected from its @@ header, (old, new)
+    remaining = (0, 0)
+    # File headers seen, and whether the last one is still waiting for its first @@
+    files, in_header = 0, False
+    lines = _split_lines(diff)
+    for index, line in enumerate(lines):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            remaining = (int(header.group(2) or 1), int(header.group(4) or 1))
+            in_header = False
+            continue
+        if (current is None or remaining == (0, 0)) and (line.startswith("diff ") or (
+                line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "))):
+            # A file header; up to its first @@, every line is a header line
+            if not in_header:
+                files += 1
+                if files > 1:
+                    # Its hunks would be applied to the one file being edited
+                    raise PatchError("diff changes more than one file; pass the hunks of this file only")
+                in_header = True
+            current = None
+            continue
+        if current is None:
+            # The rest of the file header
+            continue
+        if line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        if line.startswith("-"):
+            current[1].append(line[1:])
+            remaining = (max(remaining[0] - 1, 0), remaining[1])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            remaining = (remaining[0], max(remaining[1] - 1, 0))
+        else:
+            # Context line; some generators drop the leading space of empty lines
+            context = line[1:] if line.startswith(" ") else line
+            current[1].append(context)
+            current[2].append(context)
+            remaining = (max(remaining[0] - 1, 0), max(remaining[1] - 1, 0))
+    if not hunks:
+        raise PatchError("diff contains no @@ hunks")
+    return hunks
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """Apply a unified diff to ``text``.
+
+    A hunk is applied at its stated line when the old lines match there.
+    Otherwise (the model often gets line numbers wrong) it is located by its
+    content, which then has to be unique in the file.
+    """
+    lines = _split_lines(text)
+    newline = "\r\n" if "\r\n" in text else "\n"
+    trailing_newline = text.endswith("\n")
+    # Hunks are applied bottom-up so earlier line numbers stay valid
+    for number, (start, old, new) in sorted(
+        enumerate(_parse_unified_diff(diff), 1), key=lambda item: item[1][0], reverse=True
+    ):
+        position = max(start - 1, 0) if old else min(start, len(lines))
+        if lines[position:position + len(old)] != old:
+            matches = [
+                i for i in range(len(lines) - len(old) + 1)
+                if lines[i:i + len(old)] == old
+            ] if old else []
+            if not matches:
+                raise PatchError(f"hunk {number} (@@ -{start}): context not found")
+            if len(matches) > 1:
+                raise PatchError(f"hunk {number} (@@ -{start}): context matches {len(matches)} places")
+            position = matches[0]
+        lines[position:position + len(old)] = new
+    return newline.join(lines) + (newline if trailing_newline and lines else "")
+
+
+def atomic_write(path: str, text: str):
+    """Replace ``path`` with ``text`` via a temp file in the same directory and a rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".panda-edit-", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+        file_cache.invalidate(path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def diff_summary(path: str, old: str, new: str, max_lines: int = SUMMARY_MAX_LINES) -> str:
+    """A compact unified diff (1 line of context) with +/- line counts."""
+    diff = list(difflib.unified_diff(
+        old.splitlines(), new.splitlines(), fromfile=path, tofile=path, n=1, lineterm=""
+    ))[2:]
+    added = sum(1 for line in diff if line.startswith("+"))
+    removed = sum(1 for line in diff if line.startswith("-"))
+    header = f"Edited {path}: +{added} -{removed} lines"
+    if len(diff) > max_lines:
+        diff = diff[:max_lines] + [f"... {len(diff) - max_lines} more diff lines"]
+    return "\n".join([header, *diff])
+
+
+def edit_text_file(path: str, edits: Optional[Sequence[EditHunk]] = None, diff: Optional[str] = None) -> str:
+    """Apply search/replace ``edits`` or a unified ``diff`` to ``path`` and return the diff summary."""
+    if bool(edits) == bool(diff):
+        raise PatchError("pass either edits or diff")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        old = f.read()
+    new = apply_search_replace(old, edits) if edits else apply_unified_diff(old, diff)
+    if new == old:
+        raise PatchError("edit did not change the file")
+    atomic_write(path, new)
+    return diff_summary(path, old, new)
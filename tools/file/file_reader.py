@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Ranged file reading for the agent's read_file tool.
+
+Small files are served from the process-wide content cache
+(tools/file/file_cache.py), so re-reading an unchanged file costs one
+``stat``. Large files are memory-mapped and served
+through a line-offset index (built once per file version and cached), so
+reading lines 500000-500100 of a multi-megabyte log costs the same as
+reading the first 100. Binary files are detected from their first block and
+refused before anything else is read.
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from tools.file.file_cache import BINARY_SNIFF_BYTES, MAX_ENTRY_BYTES, FileContentCache, file_cache
+
+# Files above this size are memory-mapped instead of read whole (and are not kept in the content cache)
+MMAP_THRESHOLD = MAX_ENTRY_BYTES
+# Lines returned when the caller gives no range and the file is long
+DEFAULT_LINE_LIMIT = 2000
+
+
+class BinaryFileError(ValueError):
+    """Raised when a text read is requested for a binary file."""
+
+
+def is_binary(path: str) -> bool:
+    """A file is treated as binary if its first block contains a NUL byte."""
+    with open(path, "rb") as f:
+        return b"\x00" in f.read(BINARY_SNIFF_BYTES)
+
+
+class LineIndex:
+    """Byte offset of the start of every line of a file."""
+
+    def __init__(self, data):
+        offsets = array("Q", [0])
+        find = data.find
+        position = find(b"\n")
+        while position != -1:
+            offsets.append(position + 1)
+            position = find(b"\n", position + 1)
+        size = len(data)
+        if offsets[-1] != size:
+            # The last line has no trailing newline
+            offsets.append(size)
+        self.offsets = offsets
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def span(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """Byte range of lines [start_line, end_line), 0-based and clamped to the file."""
+        start_line = max(0, min(start_line, self.line_count))
+        end_line = max(start_line, min(end_line, self.line_count))
+        return self.offsets[start_line], self.offsets[end_line]
+
+
+class FileReader:
+    """Serve line or byte ranges of text files, caching line indexes of large files."""
+
+    def __init__(self, max_indexes: int = 64, mmap_threshold: int = MMAP_THRESHOLD,
+                 cache: Optional[FileContentCache] = file_cache):
+        """
+        Args:
+            max_indexes: Number of line indexes of memory-mapped files kept.
+            mmap_threshold: Files above this size are memory-mapped.
+            cache: Content cache for smaller files; None reads them from disk every time.
+        """
+        self.max_indexes = max_indexes
+        self.mmap_threshold = mmap_threshold
+        self.cache = cache
+        self._indexes: "OrderedDict[Tuple[str, int, int], LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, path: str, stat: os.stat_result, data) -> LineIndex:
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = LineIndex(data)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def read(
+        self,
+        path: str,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        byte_start: Optional[int] = None,
+        byte_end: Optional[int] = None,
+    ) -> Tuple[str, int, int, int]:
+        """
+        Read part of a text file.
+
+        Args:
+            path: File to read.
+            offset: 1-based line number to start from.
+            limit: Maximum number of lines to return.
+            byte_start: Start of a byte range (inclusive); takes precedence over lines.
+            byte_end: End of a byte range (exclusive).
+
+        Returns:
+            (text, first_line, last_line, total_lines). For byte ranges the line
+            numbers are 0 because they are not computed.
+
+        Raises:
+            BinaryFileError: The file looks binary.
+        """
+        cached = self.cache.get(path) if self.cache is not None else None
+        if cached is not None and cached.version[1] <= self.mmap_threshold:
+            if cached.binary:
+                raise BinaryFileError(f"{path} is a binary file")
+            data = cached.data
+            if byte_start is not None or byte_end is not None:
+                start = max(0, byte_start or 0)
+                end = len(data) if byte_end is None else min(byte_end, len(data))
+                return data[start:end].decode("utf-8", errors="replace"), 0, 0, 0
+            if not data:
+                return "", 0, 0, 0
+            return self._slice(data, cached.index, offset, limit)
+
+        if is_binary(path):
+            raise BinaryFileError(f"{path} is a binary file")
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                return "", 0, 0, 0
+            if byte_start is not None or byte_end is not None:
+                start = max(0, byte_start or 0)
+                end = stat.st_size if byte_end is None else min(byte_end, stat.st_size)
+                f.seek(start)
+                return f.read(max(0, end - start)).decode("utf-8", errors="replace"), 0, 0, 0
+
+            if stat.st_size <= self.mmap_threshold:
+                data = f.read()
+                return self._slice(data, LineIndex(data), offset, limit)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self._slice(data, self._index(path, stat, data), offset, limit)
+
+    @staticmethod
+    def _slice(data, index: LineIndex, offset: Optional[int], limit: Optional[int]):
+        first = max(1, offset or 1)
+        last = index.line_count if limit is None else min(index.line_count, first - 1 + max(0, limit))
+        start, end = index.span(first - 1, last)
+        return data[start:end].decode("utf-8", errors="replace"), first, last, index.line_count
+
+
+_default_reader = FileReader()
+
+
+def read_text(path: str, offset: Optional[int] = None, limit: Optional[int] = None,
+              byte_start: Optional[int] = None, byte_end: Optional[int] = None):
+    """Module-level shortcut for :meth:`FileReader.read` on a shared reader."""
+    return _default_reader.read(path, offset, limit, byte_start, byte_end)
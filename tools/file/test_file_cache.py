@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Test script for FileContentCache."""
+
+import os
+import tempfile
+
+from tools.file.file_cache import FileContentCache
+from tools.file.file_editor import atomic_write
+from tools.file.file_reader import FileReader
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_hits_until_the_file_changes():
+    cache = FileContentCache()
+    reader = FileReader(cache=cache)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.py")
+        _write(path, "one\ntwo\n")
+        assert reader.read(path)[0] == "one\ntwo\n"
+        assert reader.read(path, offset=2)[0] == "two\n"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        _write(path, "one\ntwo\nthree\n")
+        assert reader.read(path)[0] == "one\ntwo\nthree\n"
+        assert cache.misses == 2
+
+        # A same-size rewrite within the same mtime tick is caught by the explicit invalidation
+        stat = os.stat(path)
+        _write(path, "ONE\ntwo\nthree\n")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        cache.invalidate(path)
+        assert reader.read(path)[0].startswith("ONE")
+        assert cache.stats()["invalidations"] == 1
+
+
+def test_lru_eviction_respects_the_memory_cap():
+    cache = FileContentCache(max_bytes=10_000)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"{i}.txt") for i in range(5)]
+        for path in paths:
+            _write(path, "x" * 2000)
+        for path in paths:
+            cache.get(path)
+        stats = cache.stats()
+        assert stats["bytes"] <= 10_000 and stats["evictions"] >= 3
+        # The most recently used file is still cached
+        cache.get(paths[-1])
+        assert cache.hits == 1
+
+
+def test_atomic_write_invalidates_the_shared_cache():
+    from tools.file.file_cache import file_cache
+    from tools.file.file_reader import read_text
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.py")
+        _write(path, "before\n")
+        assert read_text(path)[0] == "before\n"
+        atomic_write(path, "after!\n")
+        assert read_text(path)[0] == "after!\n"
+        assert file_cache.stats()["invalidations"] >= 1
+
+
+def test_written_since_lists_recent_writes():
+    cache = FileContentCache()
+    start = cache.generation
+    cache.invalidate("a.py")
+    cache.invalidate("b.py")
+    cache.invalidate("a.py")
+    assert cache.written_since(start) == [os.path.abspath("a.py"), os.path.abspath("b.py")]
+    assert cache.written_since(cache.generation) == []
+    cache._written.clear()
+    cache.invalidate("c.py")
+    # Writes older than the retained history are unknown
+    assert cache.written_since(start) is None
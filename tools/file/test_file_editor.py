@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Test script for the edit_file helpers."""
+
+import os
+import tempfile
+
+import pytest
+
+from tools.file.file_editor import (
+    PatchError,
+    _parse_unified_diff,
+    apply_search_replace,
+    apply_unified_diff,
+    edit_text_file,
+)
+
+SOURCE = "def f():\n    return 1\n\n\ndef g():\n    return 1\n"
+
+
+def test_search_replace_requires_a_unique_match():
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_search_replace(SOURCE, [{"old_string": "return 1", "new_string": "return 2"}])
+
+    edited = apply_search_replace(SOURCE, [{"old_string": "def g():\n    return 1", "new_string": "def g():\n    return 2"}])
+    assert edited.endswith("return 2\n") and edited.count("return 1") == 1
+    assert apply_search_replace(SOURCE, [{"old_string": "1", "new_string": "2", "replace_all": True}]).count("2") == 2
+
+
+def test_unified_diff_with_wrong_line_numbers_is_located_by_context():
+    diff = "--- a.py\n+++ a.py\n@@ -40,2 +40,2 @@\n def g():\n-    return 1\n+    return 3\n"
+    assert apply_unified_diff(SOURCE, diff) == SOURCE.replace("def g():\n    return 1", "def g():\n    return 3")
+
+    with pytest.raises(PatchError, match="context matches 2 places"):
+        apply_unified_diff(SOURCE, "@@ -40,1 +40,1 @@\n-    return 1\n+    return 3\n")
+
+
+def test_unified_diff_lines_that_look_like_file_headers():
+    source = "a = 1\n-- b\n++ c\n\x0cd = 2\n"
+    # A removed "-- b" line and an added "++ c" line, inside the hunk
+    diff = "--- a.py\n+++ a.py\n@@ -1,3 +1,3 @@\n a = 1\n--- b\n+++ b\n ++ c\n"
+    assert apply_unified_diff(source, diff) == "a = 1\n++ b\n++ c\n\x0cd = 2\n"
+    # A git header before the first hunk is one file header
+    diff = "diff --git a/a.py b/a.py\nindex 1..2\n--- a/a.py\n+++ b/a.py\n@@ -4 +4 @@\n-\x0cd = 2\n+\x0cd = 4\n"
+    assert _parse_unified_diff(diff) == [(4, ["\x0cd = 2"], ["\x0cd = 4"])]
+
+
+def test_unified_diff_of_several_files_is_rejected():
+    # The hunks of b.py would otherwise be applied to the file being edited
+    diff = ("--- a.py\n+++ a.py\n@@ -1 +1 @@\n-a = 1\n+a = 3\n"
+            "diff --git a/b.py b/b.py\n--- b.py\n+++ b.py\n@@ -4 +4 @@\n-\x0cd = 2\n+\x0cd = 4\n")
+    with pytest.raises(PatchError, match="more than one file"):
+        apply_unified_diff("a = 1\n-- b\n++ c\n\x0cd = 2\n", diff)
+    with pytest.raises(PatchError, match="more than one file"):
+        _parse_unified_diff("--- a.py\n+++ a.py\n@@ -1 +1 @@\n-a\n+b\n--- b.py\n+++ b.py\n@@ -1 +1 @@\n-a\n+b\n")
+
+
+def test_failed_edit_leaves_the_file_untouched():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.py")
+        with open(path, "w") as f:
+            f.write(SOURCE)
+
+        with pytest.raises(PatchError):
+            edit_text_file(path, edits=[
+                {"old_string": "def f():", "new_string": "def h():"},
+                {"old_string": "missing", "new_string": "x"},
+            ])
+        with open(path) as f:
+            assert f.read() == SOURCE
+
+        summary = edit_text_file(path, edits=[{"old_string": "def f():", "new_string": "def h():"}])
+        assert summary.startswith(f"Edited {path}: +1 -1 lines")
+        assert os.listdir(directory) == ["a.py"]
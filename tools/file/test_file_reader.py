@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Test script for FileReader."""
+
+import os
+import tempfile
+
+import pytest
+
+from tools.file.file_reader import BinaryFileError, FileReader
+
+
+def _write(directory, name, data: bytes):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.mark.parametrize("mmap_threshold", [1 << 20, 0])
+def test_line_ranges_match_between_read_and_mmap(mmap_threshold):
+    reader = FileReader(mmap_threshold=mmap_threshold)
+    with tempfile.TemporaryDirectory() as directory:
+        path = _write(directory, "log.txt", "".join(f"line {i}\n" for i in range(1, 101)).encode() + b"tail")
+
+        assert reader.read(path, offset=10, limit=2) == ("line 10\nline 11\n", 10, 11, 101)
+        assert reader.read(path, offset=100)[0] == "line 100\ntail"
+        assert reader.read(path, offset=500, limit=5)[0] == ""
+        assert reader.read(path, byte_start=0, byte_end=7)[0] == "line 1\n"
+
+
+def test_binary_files_are_refused():
+    with tempfile.TemporaryDirectory() as directory:
+        path = _write(directory, "image.png", b"\x89PNG\x00\x00")
+        with pytest.raises(BinaryFileError):
+            FileReader().read(path)
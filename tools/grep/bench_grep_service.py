@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of custom_grep: one process pair per call versus the shared search service.
+
+Runs a set of typical agent searches over a directory (this repository by default):
+  spawn:       what custom_grep did per call, ``rg --version`` then ``rg``. When
+               ripgrep is not installed, ``grep --version`` then ``grep -rlE`` stand in.
+  cold:        a new GrepService with an empty file cache (first call of a session)
+  warm:        the shared service on later calls (file list and contents reused)
+  search only: the regexes run over contents already in memory, the lower bound
+
+Then a broad pattern with head_limit=20 over a generated tree of --tree-files
+files, buffering every hit and cutting afterwards (as custom_grep did) versus
+streaming with the global limit. Reports latency and peak memory (tracemalloc).
+
+Last, a search followed by reading every hit back from its file: parsing the
+text output and reading the line through read_file, versus match records
+sliced from a memory-mapped file.
+
+Usage:
+    python tools/grep/bench_grep_service.py --path . --runs 20 --tree-files 3000
+"""
+
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from tools.file.file_cache import file_cache
+from tools.file.file_reader import read_text
+from tools.grep.grep_records import MappedFile
+from tools.grep.grep_service import GrepService, _read_text
+
+QUERIES = [
+    ("def build_", {}),
+    ("import os", {"output_mode": "count"}),
+    (r"class \w+Middleware", {"output_mode": "content", "n": True}),
+    ("TODO|FIXME", {}),
+    ("thread_id", {"output_mode": "content", "type": "py", "head_limit": 20}),
+]
+
+
+def timed(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def spawn_call(path: str):
+    rg = shutil.which("rg")
+    if rg:
+        def call(pattern, options):
+            subprocess.run([rg, "--version"], capture_output=True, text=True)
+            subprocess.run([rg, pattern, path, "--files-with-matches"], capture_output=True, text=True)
+        return "rg --version + rg", call
+
+    def call(pattern, options):
+        subprocess.run(["grep", "--version"], capture_output=True, text=True)
+        subprocess.run(["grep", "-rlE", "--exclude-dir=.*", pattern, path], capture_output=True, text=True)
+    return "grep --version + grep -rlE (rg not installed)", call
+
+
+def make_tree(root: str, files: int):
+    line = "    value = compute(element, offset) + reference_table[index]  # generated\n"
+    for i in range(files):
+        directory = os.path.join(root, f"pkg{i % 50}", f"mod{i % 7}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.py"), "w") as f:
+            f.write(f"def function_{i}():\n" + line * 300)
+
+
+def bench_head_limit(files: int, runs: int):
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, files)
+        # tracemalloc slows the buffered run well past the default timeout
+        service = GrepService(engine="python", timeout=3600)
+        service.search("x", root)
+        file_cache.clear()
+        print(f"\nbroad pattern 'e', content, head_limit=20, {files} files (file list warm)")
+        print(f"{'':48} {'p50 ms':>8} {'peak MB':>8} {'lines':>7}")
+
+        def buffered():
+            output = service.search("e", root, output_mode="content")
+            return output, "\n".join(output.split("\n")[:20])
+
+        def streamed():
+            output = service.search("e", root, output_mode="content", head_limit=20)
+            return output, output
+
+        for name, fn in (("buffer all, cut to 20 (before)", buffered), ("streaming, global limit", streamed)):
+            tracemalloc.start()
+            full, _ = fn()
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            samples = timed(fn, runs)
+            print(f"{name:48} {statistics.median(samples):8.2f} {peak:8.1f} {full.count(chr(10)) + 1:7}")
+
+
+def bench_follow_up(path: str, runs: int, pattern: str = r"def \w+"):
+    service = GrepService(engine="python")
+    regex = re.compile(pattern)
+    print(f"\n{pattern!r} then each hit read back from its file, {path}")
+    print(f"{'':48} {'p50 ms':>8} {'hits':>7}")
+
+    def text_output():
+        hits = []
+        for line in service.search(pattern, path, output_mode="content", n=True).split("\n"):
+            name, number, _ = line.split(":", 2)
+            text = read_text(name, int(number), 1)[0].rstrip("\n")
+            hits.extend(m.group() for m in regex.finditer(text))
+        return hits
+
+    def records():
+        hits, mapped = [], None
+        for match in service.matches(pattern, path):
+            if mapped is None or mapped.path != match.path:
+                if mapped is not None:
+                    mapped.close()
+                mapped = MappedFile(match.path)
+            hits.extend(bytes(mapped.slice(start, end)).decode() for start, end in match.spans)
+        if mapped is not None:
+            mapped.close()
+        return hits
+
+    assert text_output() == records()
+    for name, fn in (("text output, parse + read_file (before)", text_output),
+                     ("match records, mmap slices", records)):
+        print(f"{name:48} {statistics.median(timed(fn, runs)):8.2f} {len(fn()):7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=".")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--tree-files", type=int, default=3000)
+    args = parser.parse_args()
+
+    label, spawn = spawn_call(args.path)
+    service = GrepService(engine="python")
+    index = service.index(args.path)
+    texts = [t for t in (_read_text(os.path.join(index.root, rel)) for rel in index.files) if t is not None]
+    print(f"{args.path}: {len(index.files)} files, {sum(map(len, texts)) / 1e6:.1f} MB of text, "
+          f"{len(QUERIES)} queries x {args.runs} runs")
+
+    def cold(pattern, options):
+        file_cache.clear()
+        GrepService(engine="python").search(pattern, args.path, **options)
+
+    compiled = {pattern: re.compile(pattern, re.MULTILINE) for pattern, _ in QUERIES}
+
+    def search_only(pattern, options):
+        regex = compiled[pattern]
+        for text in texts:
+            regex.search(text)
+
+    rows = [
+        (f"spawn: {label}", spawn),
+        ("service, cold", cold),
+        ("service, warm", lambda pattern, options: service.search(pattern, args.path, **options)),
+        ("search only", search_only),
+    ]
+    print(f"{'':48} {'p50 ms':>8} {'mean ms':>8}")
+    for name, fn in rows:
+        samples = [s for pattern, options in QUERIES for s in timed(lambda: fn(pattern, options), args.runs)]
+        print(f"{name:48} {statistics.median(samples):8.2f} {statistics.mean(samples):8.2f}")
+    print(f"service stats: {service.stats()}")
+    bench_head_limit(args.tree_files, max(3, args.runs // 4))
+    bench_follow_up(args.path, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+The in-process grep engine, serial and across worker processes, against ripgrep.
+
+Searches a generated tree of --tree-files files (or --path) with a few typical
+patterns, each engine with a warm file list:
+  rg:           ``rg`` as custom_grep runs it, when installed
+  grep -rE:     GNU grep, as a reference point when ripgrep is not installed
+  python:       the in-process engine in this process (workers=1), content cache cleared
+  python warm:  the same, contents already in the cache (repeated searches of a tree that fits)
+  python xN:    the search spread over N worker processes, which read from disk
+Checks that every engine finds the same files.
+
+Usage:
+    python tools/grep/bench_parallel_grep.py --tree-files 20000 --workers 2,4
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from tools.file.file_cache import file_cache
+from tools.grep.grep_service import GrepService, ripgrep_path
+
+QUERIES = [
+    ("literal", "def handler_1234", {}),
+    ("regex", r"value_[0-9]+7\(", {}),
+    ("ignore case", "RETURN RESULT_9", {"i": True}),
+    ("content, context", r"raise \w+Error", {"output_mode": "content", "n": True, "C": 1}),
+]
+
+
+def make_tree(root: str, files: int, seed: int = 3):
+    rng = random.Random(seed)
+    for k in range(files):
+        directory = os.path.join(root, f"pkg{k % 50}", f"sub{(k // 50) % 40}")
+        os.makedirs(directory, exist_ok=True)
+        lines = [f"def handler_{k}(value):"]
+        for j in range(rng.randint(20, 60)):
+            lines.append(f"    value_{rng.randint(0, 99999)}(value, {j})")
+            if rng.random() < 0.01:
+                lines.append("    raise ValueError('bad value')")
+        lines.append(f"    return result_{k % 100}")
+        with open(os.path.join(directory, f"module_{k}.py"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def timed(fn, runs: int, cold: bool = True):
+    samples, result = [], None
+    fn()
+    for _ in range(runs):
+        if cold:
+            file_cache.clear()
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def files_of(output: str):
+    """Files with a hit; context lines (``path-N-``) and separators are skipped."""
+    return {head for head in (line.split(":", 1)[0] for line in output.splitlines()) if head.endswith(".py")}
+
+
+def command(tool: str, pattern: str, root: str, options: dict):
+    if tool == "rg":
+        cmd = [ripgrep_path(), pattern, root]
+    else:
+        cmd = ["grep", "-rE", pattern, root, "--exclude-dir=.*"]
+    if options.get("output_mode", "files_with_matches") == "files_with_matches":
+        cmd.append("-l")
+    if options.get("i"):
+        cmd.append("-i")
+    if options.get("n"):
+        cmd.append("-n")
+    if options.get("C"):
+        cmd.extend(["-C", str(options["C"])])
+    return lambda: subprocess.run(cmd, capture_output=True, text=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=None, help="search this directory instead of a generated tree")
+    parser.add_argument("--tree-files", type=int, default=20000)
+    parser.add_argument("--workers", default="2,4")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    root = args.path or tempfile.mkdtemp()
+    try:
+        if args.path is None:
+            make_tree(root, args.tree_files)
+        serial = GrepService(engine="python", workers=1, timeout=3600)
+        engines = [("rg" if ripgrep_path() else "grep -rE", None), ("python", serial), ("python warm", serial)]
+        for count in (int(w) for w in args.workers.split(",")):
+            engines.append((f"python x{count}", GrepService(engine="python", workers=count, parallel_min_files=1,
+                                                            timeout=3600)))
+        files = len(serial.index(root).files)
+        for _, service in engines[1:]:
+            service.index(root)
+            # Starts the worker processes, which is paid once per process
+            service.search("warm up", root)
+        print(f"{root}: {files} files, {os.cpu_count()} CPUs, {args.runs} runs, p50 ms")
+        print(f"  {'query':18}" + "".join(f"{name:>14}" for name, _ in engines))
+
+        for name, pattern, options in QUERIES:
+            row, found = [], []
+            for engine, service in engines:
+                if service is None:
+                    fn = command("rg" if engine == "rg" else "grep", pattern, root, options)
+                else:
+                    fn = lambda service=service: service.search(pattern, root, **options)
+                elapsed, output = timed(fn, args.runs, cold=engine != "python warm")
+                row.append(elapsed)
+                found.append(files_of(output))
+            assert all(f == found[0] for f in found), (name, [len(f) for f in found])
+            print(f"  {name:18}" + "".join(f"{ms:14.1f}" for ms in row) + f"   ({len(found[0])} files)")
+        for _, service in engines[2:]:
+            service.close()
+    finally:
+        if args.path is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+custom_grep latency with and without the trigram index, on generated trees.
+
+For each size, a tree of small Python-like files is generated (one unique
+function name per file, identifiers drawn from a shared vocabulary). Then:
+  - the index is built (time and size on disk);
+  - a set of queries runs through GrepService, unindexed (file list warm)
+    and indexed, checking that both return the same output;
+  - the index is refreshed with nothing changed, and after touching 10 files.
+
+Usage:
+    python tools/grep/bench_trigram_index.py --sizes 10000,100000,1000000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from tools.file.file_cache import file_cache
+from tools.grep.grep_service import GrepService
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "vu", "ze", "bar", "dex", "fin", "gor", "hul"]
+
+
+def vocabulary(rng: random.Random, size: int):
+    return ["".join(rng.choice(SYLLABLES) for _ in range(3)) + f"_{i}" for i in range(size)]
+
+
+def make_tree(root: str, files: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = vocabulary(rng, 20000)
+    for i in range(files):
+        directory = os.path.join(root, f"pkg{i % 100}", f"sub{(i // 100) % 100}")
+        if i < 10000:
+            os.makedirs(directory, exist_ok=True)
+        picks = rng.sample(words, 8)
+        body = "\n".join(f"    {picks[j]} = {picks[j + 1]}({j}, value)" for j in range(0, 8, 2))
+        with open(os.path.join(directory, f"module_{i}.py"), "w") as f:
+            f.write(f"import os\n\n\ndef handler_{i}(value):\n{body}\n    return {picks[0]}\n")
+    return words
+
+
+def queries(files: int, words):
+    return [
+        ("one file", f"def handler_{files // 2}\\(", {}),
+        ("rare word", words[123], {"output_mode": "content", "n": True}),
+        ("alternation", f"({words[5]}|{words[6]})\\(", {}),
+        ("ignore case", words[77].upper(), {"i": True}),
+        ("no literal (full scan)", r"\w+_1\d{4}\(9", {}),
+    ]
+
+
+def timed(fn, runs: int):
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, names in os.walk(path) for f in names)
+
+
+def bench(files: int, runs: int, workdir: str):
+    root = tempfile.mkdtemp(dir=workdir)
+    try:
+        start = time.perf_counter()
+        words = make_tree(root, files)
+        print(f"\n{files} files generated in {time.perf_counter() - start:.1f} s")
+
+        plain = GrepService(engine="python", use_index=False, timeout=3600)
+        start = time.perf_counter()
+        plain.index(root)
+        print(f"  file list walk: {time.perf_counter() - start:.2f} s")
+
+        indexed = GrepService(engine="python", timeout=3600)
+        index = indexed.trigram_index(root, create=True)
+        start = time.perf_counter()
+        index.build()
+        build_s = time.perf_counter() - start
+        stats = index.stats()
+        print(f"  index build: {build_s:.1f} s, {stats['trigrams']} trigrams, "
+              f"{directory_size(index.directory) / 1e6:.1f} MB on disk")
+
+        print(f"  {'query':26} {'unindexed ms':>13} {'indexed ms':>11} {'speedup':>8} {'lines':>6}")
+        for name, pattern, options in queries(files, words):
+            file_cache.clear()
+            unindexed_ms, expected = timed(lambda: plain.search(pattern, root, **options), runs)
+            file_cache.clear()
+            indexed_ms, output = timed(lambda: indexed.search(pattern, root, **options), runs)
+            assert output == expected, (name, output[:200], expected[:200])
+            print(f"  {name:26} {unindexed_ms:13.1f} {indexed_ms:11.1f} {unindexed_ms / indexed_ms:7.1f}x "
+                  f"{len(output.splitlines()):6}")
+
+        start = time.perf_counter()
+        index.refresh()
+        print(f"  refresh, nothing changed: {time.perf_counter() - start:.2f} s")
+        for i in range(0, files, max(1, files // 10))[:10]:
+            path = os.path.join(root, f"pkg{i % 100}", f"sub{(i // 100) % 100}", f"module_{i}.py")
+            with open(path, "a") as f:
+                f.write(f"touched_{i} = True\n")
+        start = time.perf_counter()
+        changes = index.refresh()
+        print(f"  refresh, 10 files touched: {time.perf_counter() - start:.2f} s {changes}")
+        assert indexed.search("touched_0 = True", root) == plain.search("touched_0 = True", root)
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workdir", default=None, help="where the trees are generated (default: temp dir)")
+    args = parser.parse_args()
+    for size in (int(s) for s in args.sizes.split(",")):
+        bench(size, args.runs if size < 1000000 else 1, args.workdir)
+
+
+if __name__ == "__main__":
+    main()
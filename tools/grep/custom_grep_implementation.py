@@ -6,28 +6,24 @@ This implementation provides a Python interface to ripgrep functionality
 with all the features described in the original documentation.
 """
 
-import subprocess
 import os
 import tempfile
-import shutil
-from typing import Optional, List
+from typing import Optional
+
+from tools.grep.grep_service import GrepService, grep_service
 
 
 class CustomGrep:
     """A powerful search tool built on ripgrep for searching file contents with regex patterns."""
     
-    def __init__(self):
-        """Initialize the CustomGrep tool."""
-        self._check_ripgrep()
-    
-    def _check_ripgrep(self):
-        """Check if ripgrep is available in the system."""
-        try:
-            result = subprocess.run(["rg", "--version"], capture_output=True, text=True)
-            if result.returncode != 0:
-                raise RuntimeError("ripgrep (rg) command not available")
-        except FileNotFoundError:
-            raise RuntimeError("ripgrep (rg) command not found. Please install ripgrep.")
+    def __init__(self, service: Optional[GrepService] = None):
+        """Initialize the CustomGrep tool.
+
+        Args:
+            service: Search backend; the process-wide grep_service by default, which
+                    checks for ripgrep once and keeps file lists between calls.
+        """
+        self.service = service or grep_service
     
     def search(
         self,
@@ -44,12 +40,14 @@ class CustomGrep:
         head_limit: Optional[int] = None,
         multiline: bool = False
     ) -> str:
-        """
+        r"""
         Search for patterns in files using ripgrep.
 
         Args:
             pattern: The regular expression pattern to search for in file contents.
                     Uses ripgrep syntax - literal braces need escaping (e.g., `interface\{\}` for `interface{}`).
+                    Without ripgrep installed, the pattern runs in-process with Python `re`: POSIX classes
+                    such as `[[:digit:]]` are translated, Unicode classes (`\p{L}`) are rejected.
             path: File or directory to search in. Defaults to current working directory if not specified.
             glob: Glob pattern to filter files (e.g., "*.js", "*.{ts,tsx}").
             output_mode: Output mode - "content" shows matching lines with optional context,
@@ -62,6 +60,7 @@ class CustomGrep:
             i: Enable case insensitive search.
             type: File type to search (e.g., "js", "py", "rust", "go", "java").
                  More efficient than glob for standard file types.
+                 Any type ripgrep knows; without ripgrep, only common ones (py, js, ts, go, rust, java, c, cpp, ...).
             head_limit: Limit output to first N lines/entries. Works across all output modes.
             multiline: Enable multiline mode where patterns can span lines and . matches newlines.
                       Default is False (single-line matching only).
@@ -74,94 +73,29 @@ class CustomGrep:
         if output_mode not in ["content", "files_with_matches", "count"]:
             raise ValueError(f"Invalid output_mode: {output_mode}. Must be one of: content, files_with_matches, count")
         
-        # Build ripgrep command
-        cmd = ["rg"]
-        
-        # Add output mode specific flags
-        if output_mode == "files_with_matches":
-            cmd.append("--files-with-matches")
-        elif output_mode == "count":
-            cmd.append("--count")
-        # For "content" mode, we don't need special flags
-        
-        # Add pattern
-        cmd.append(pattern)
-        
-        # Add path
-        cmd.append(path)
-        
-        # Add file filtering options
-        if glob:
-            cmd.extend(["--glob", glob])
-        
-        if type:
-            cmd.extend(["--type", type])
-        
-        # Add context options (only for content mode)
+        # Validate numeric options (only used in content mode)
         if output_mode == "content":
-            if B is not None:
-                if not isinstance(B, int) or B < 0:
-                    raise ValueError("B must be a non-negative integer")
-                cmd.extend(["--before-context", str(B)])
-            
-            if A is not None:
-                if not isinstance(A, int) or A < 0:
-                    raise ValueError("A must be a non-negative integer")
-                cmd.extend(["--after-context", str(A)])
-            
-            if C is not None:
-                if not isinstance(C, int) or C < 0:
-                    raise ValueError("C must be a non-negative integer")
-                cmd.extend(["--context", str(C)])
-            
-            if n:
-                cmd.append("--line-number")
-        
-        # Add case sensitivity option
-        if i:
-            cmd.append("--ignore-case")
-        
-        # Add multiline mode
-        if multiline:
-            cmd.append("--multiline")
-        
-        # Add head limit
-        if head_limit is not None:
-            if not isinstance(head_limit, int) or head_limit <= 0:
-                raise ValueError("head_limit must be a positive integer")
-            cmd.extend(["--max-count", str(head_limit)])
-        
-        try:
-            # Execute ripgrep command
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode == 0:
-                # Success - found matches
-                output = result.stdout.strip()
-                
-                # Apply additional head limit processing if needed
-                if head_limit is not None and output_mode in ["content", "files_with_matches"]:
-                    lines = output.split('\n')
-                    if len(lines) > head_limit:
-                        output = '\n'.join(lines[:head_limit])
-                
-                return output
-                
-            elif result.returncode == 1:
-                # No matches found (ripgrep returns 1 when no matches)
-                return ""
-                
-            else:
-                # Error occurred
-                error_msg = result.stderr.strip()
-                if not error_msg:
-                    error_msg = f"ripgrep failed with return code {result.returncode}"
-                return f"Error: {error_msg}"
-                
-        except subprocess.TimeoutExpired:
-            return "Error: Search timeout exceeded (60 seconds)"
-        except Exception as e:
-            return f"Error: {str(e)}"
+            for name, value in (("B", B), ("A", A), ("C", C)):
+                if value is not None and (not isinstance(value, int) or value < 0):
+                    raise ValueError(f"{name} must be a non-negative integer")
+        
+        if head_limit is not None and (not isinstance(head_limit, int) or head_limit <= 0):
+            raise ValueError("head_limit must be a positive integer")
+        
+        return self.service.search(
+            pattern=pattern,
+            path=path,
+            glob=glob,
+            output_mode=output_mode,
+            B=B,
+            A=A,
+            C=C,
+            n=n,
+            i=i,
+            type=type,
+            head_limit=head_limit,
+            multiline=multiline
+        )
 
 
 # Convenience function that matches the original interface
@@ -3,14 +3,16 @@
 A powerful search tool built on ripgrep for searching file contents with regex patterns.
 
 This tool provides a Python interface to ripgrep functionality with various options
-for file searching, filtering, and output formatting.
+for file searching, filtering, and output formatting. Searches go through the
+process-wide grep_service, which runs ripgrep whenever it is installed (with
+the candidate files of the trigram index when that narrows the search) and
+otherwise searches in-process with Python ``re``.
 """
 
-import subprocess
-import json
 import os
-import re
-from typing import List, Optional, Dict, Any
+from typing import Optional
+
+from tools.grep.grep_service import grep_service
 
 
 def custom_grep(
@@ -27,12 +29,14 @@ def custom_grep(
     head_limit: Optional[int] = None,
     multiline: bool = False
 ) -> str:
-    """
+    r"""
     A powerful search tool built on ripgrep for searching file contents with regex patterns.
 
     Args:
         pattern: The regular expression pattern to search for in file contents.
                 Uses ripgrep syntax - literal braces need escaping (e.g., `interface\{\}` for `interface{}`).
+                Without ripgrep installed, the pattern runs in-process with Python `re`: POSIX classes
+                such as `[[:digit:]]` are translated, Unicode classes (`\p{L}`) are rejected.
         path: File or directory to search in. Defaults to current working directory if not specified.
         glob: Glob pattern to filter files (e.g., "*.js", "*.{ts,tsx}").
         output_mode: Output mode - "content" shows matching lines with optional context,
@@ -45,6 +49,7 @@ def custom_grep(
         i: Enable case insensitive search.
         type: File type to search (e.g., "js", "py", "rust", "go", "java").
              More efficient than glob for standard file types.
+             Any type ripgrep knows; without ripgrep, only common ones (py, js, ts, go, rust, java, c, cpp, ...).
         head_limit: Limit output to first N lines/entries. Works across all output modes.
         multiline: Enable multiline mode where patterns can span lines and . matches newlines.
                   Default is False (single-line matching only).
@@ -52,86 +57,20 @@ def custom_grep(
     Returns:
         Search results as a string, formatted according to the output_mode.
     """
-    
-    # Build ripgrep command
-    cmd = ["rg", pattern]
-    
-    # Add basic options
-    if output_mode == "files_with_matches":
-        cmd.append("--files-with-matches")
-    elif output_mode == "count":
-        cmd.append("--count")
-    elif output_mode == "content":
-        # Default content output, no special flag needed
-        pass
-    
-    # Add search path
-    cmd.append(path)
-    
-    # Add file filtering options
-    if glob:
-        cmd.extend(["--glob", glob])
-    
-    if type:
-        cmd.extend(["--type", type])
-    
-    # Add context options (only for content mode)
-    if output_mode == "content":
-        if B is not None:
-            cmd.extend(["--before-context", str(B)])
-        
-        if A is not None:
-            cmd.extend(["--after-context", str(A)])
-        
-        if C is not None:
-            cmd.extend(["--context", str(C)])
-        
-        if n:
-            cmd.append("--line-number")
-    
-    # Add case sensitivity
-    if i:
-        cmd.append("--ignore-case")
-    
-    # Add multiline mode
-    if multiline:
-        cmd.append("--multiline")
-    
-    # Add head limit
-    if head_limit is not None:
-        cmd.extend(["--max-count", str(head_limit)])
-    
-    try:
-        # Execute ripgrep command
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            # Success - found matches
-            output = result.stdout.strip()
-            
-            # Apply head limit to output if not already done by ripgrep
-            if head_limit is not None and output_mode in ["content", "files_with_matches"]:
-                lines = output.split('\n')
-                if len(lines) > head_limit:
-                    output = '\n'.join(lines[:head_limit])
-            
-            return output
-        elif result.returncode == 1:
-            # No matches found
-            return ""
-        else:
-            # Error occurred
-            error_msg = result.stderr.strip()
-            if not error_msg:
-                error_msg = f"ripgrep failed with return code {result.returncode}"
-            return f"Error: {error_msg}"
-            
-    except subprocess.TimeoutExpired:
-        return "Error: Search timeout exceeded (30 seconds)"
-    except FileNotFoundError:
-        return "Error: ripgrep (rg) command not found. Please install ripgrep."
-    except Exception as e:
-        return f"Error: {str(e)}"
+    return grep_service.search(
+        pattern=pattern,
+        path=path,
+        glob=glob,
+        output_mode=output_mode,
+        B=B,
+        A=A,
+        C=C,
+        n=n,
+        i=i,
+        type=type,
+        head_limit=head_limit,
+        multiline=multiline
+    )
 
 
 def test_custom_grep():
@@ -3,11 +3,15 @@
 Example usage of the custom_grep implementation.
 """
 import shutil
+import sys
 
-from custom_grep_implementation import custom_grep
 import os
 import tempfile
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from tools.grep.custom_grep_implementation import custom_grep
+
 
 def create_example_files():
     """Create example files for demonstration."""
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Structured grep results: one compact record per match, with byte offsets.
+
+The text output of custom_grep has to be parsed again by whoever consumes it
+(``path:N:line``), and the line has to be located again in the file to do
+anything with it. A :class:`Match` carries where the hit is instead: the path,
+the line number, the byte offset and length of the line, and the byte spans of
+every submatch, all relative to the start of the file. A follow-up tool can
+slice the file at those offsets without re-reading or re-searching it;
+:class:`MappedFile` does this without copying, over a memory map.
+
+Records come from ripgrep's ``--json`` output (:func:`parse_rg_json`) or from
+the in-process engine (:func:`line_matches`, :func:`multiline_matches`); both
+give the same records.
+"""
+
+import base64
+import bisect
+import json
+import mmap
+import os
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class Match(NamedTuple):
+    """One matching line (several, for a multiline match)."""
+
+    path: str
+    # 1-based number of the first line
+    line_number: int
+    # Byte offset of the start of the line in the file
+    offset: int
+    # Byte length of the line(s), without the final line terminator
+    length: int
+    # (start, end) byte offsets of each submatch in the file
+    spans: Tuple[Tuple[int, int], ...]
+
+
+def parse_rg_json(lines: Iterable[str]) -> Iterator[Match]:
+    """Match records from the output lines of ``rg --json``; other message types are skipped."""
+    for line in lines:
+        # Only "match" messages are decoded; "begin", "end", "context" and "summary" are skipped unparsed
+        if not line.startswith('{"type":"match"'):
+            continue
+        data = json.loads(line)["data"]
+        path = data["path"]
+        if "text" in path:
+            path = path["text"]
+        else:
+            path = os.fsdecode(base64.b64decode(path["bytes"]))
+        lines = data["lines"]
+        raw = lines["text"].encode("utf-8") if "text" in lines else base64.b64decode(lines["bytes"])
+        offset = data["absolute_offset"]
+        yield Match(path, data["line_number"], offset, len(raw) - raw.endswith(b"\n"),
+                    tuple((offset + s["start"], offset + s["end"]) for s in data["submatches"]))
+
+
+def _byte_spans(line: str, regex) -> Tuple[Tuple[int, int], ...]:
+    """Byte spans of the matches of ``regex`` in ``line``, relative to its start."""
+    spans = tuple(m.span() for m in regex.finditer(line))
+    if line.isascii():
+        return spans
+
+    def size(position: int) -> int:
+        return len(line[:position].encode("utf-8", errors="surrogateescape"))
+
+    return tuple((size(start), size(end)) for start, end in spans)
+
+
+class _ByteOffsets:
+    """Byte offset of character positions of a text, for positions visited in increasing order."""
+
+    __slots__ = ("text", "ascii", "chars", "bytes")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.ascii = text.isascii()
+        self.chars = 0
+        self.bytes = 0
+
+    def __call__(self, position: int) -> int:
+        if self.ascii:
+            return position
+        self.bytes += len(self.text[self.chars:position].encode("utf-8", errors="surrogateescape"))
+        self.chars = position
+        return self.bytes
+
+
+def line_matches(display: str, data: bytes, offsets: Sequence[int], lines: Iterable[int], regex) -> Iterator[Match]:
+    """
+    Records for the matching ``lines`` (0-based, in order) of a file.
+
+    Args:
+        display: Path written in the records.
+        data: Content of the file.
+        offsets: Byte offset of the start of every line, then the file size
+            (``tools.file.file_reader.LineIndex.offsets``).
+        lines: Indexes of the matching lines.
+        regex: The compiled pattern, searched again in each line for the submatch spans.
+    """
+    for index in lines:
+        start, end = offsets[index], offsets[index + 1]
+        if end > start and data[end - 1] == 0x0A:
+            end -= 1
+        line = data[start:end].decode("utf-8", errors="surrogateescape")
+        yield Match(display, index + 1, start, end - start,
+                    tuple((start + s, start + e) for s, e in _byte_spans(line, regex)))
+
+
+def multiline_matches(display: str, data: bytes, text: str, offsets: Sequence[int], regex,
+                      max_count: Optional[int] = None) -> Iterator[Match]:
+    """
+    Records for a multiline search, as ripgrep reports it: matches that share a
+    line are reported together, on the lines they cover.
+
+    ``text`` is ``data`` decoded with ``errors="surrogateescape"``, so that
+    character positions map back to exact byte offsets.
+    """
+    position = _ByteOffsets(text)
+    no_last_line = not data or data.endswith(b"\n")
+    first = last = None
+    spans: List[Tuple[int, int]] = []
+    count = 0
+    for m in regex.finditer(text):
+        start, end = position(m.start()), position(m.end())
+        if start == len(data) and no_last_line:
+            break
+        line = bisect.bisect_right(offsets, start) - 1
+        end_line = bisect.bisect_right(offsets, max(start, end - 1)) - 1
+        if first is not None and line > last:
+            yield _multiline_record(display, data, offsets, first, last, spans)
+            count += 1
+            if max_count is not None and count >= max_count:
+                return
+            first, spans = None, []
+        if first is None:
+            first, last = line, end_line
+        else:
+            last = max(last, end_line)
+        spans.append((start, end))
+    if first is not None:
+        yield _multiline_record(display, data, offsets, first, last, spans)
+
+
+def _multiline_record(display, data, offsets, first, last, spans) -> Match:
+    start, end = offsets[first], offsets[min(last + 1, len(offsets) - 1)]
+    if end > start and data[end - 1] == 0x0A:
+        end -= 1
+    return Match(display, first + 1, start, end - start, tuple(spans))
+
+
+class MappedFile:
+    """
+    A file mapped read-only in memory, sliced at match offsets without copying.
+
+    Usage::
+
+        with MappedFile(match.path) as f:
+            line = f.line(match)          # memoryview of the matching line
+            hit = f.slice(*match.spans[0])
+
+    The views are only valid while the file is open. Release them (or let them
+    go out of scope) before closing it; closing raises BufferError otherwise.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be mapped
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def slice(self, start: int, end: int) -> memoryview:
+        return self.view[start:end]
+
+    def line(self, match: Match) -> memoryview:
+        return self.view[match.offset:match.offset + match.length]
+
+    def spans(self, match: Match) -> List[memoryview]:
+        return [self.view[start:end] for start, end in match.spans]
+
+    def close(self):
+        self.view.release()
+        if self._map is not None:
+            self._map.close()
+
+    def __enter__(self) -> "MappedFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
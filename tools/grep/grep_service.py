@@ -0,0 +1,972 @@
+#!/usr/bin/env python3
+r"""
+Process-wide search backend for the custom_grep tool.
+
+Before, every custom_grep call started two processes: ``rg --version`` to check
+that ripgrep is installed, then ``rg`` for the search. This service is created
+once per process and:
+
+  - checks for ripgrep once (:func:`ripgrep_path`), and searches with ``rg``
+    whenever it is installed, so patterns always have ripgrep's syntax and
+    every ``--type`` it knows is accepted;
+  - without ripgrep, searches in-process with ``re`` (see below), reading
+    contents through the shared file cache, so unchanged files are not read
+    again between calls. It keeps the file list of every searched directory
+    and checks it is still current with one ``stat`` per directory, instead of
+    walking the tree again. Hidden files, symlinks and files matched by
+    ``.gitignore``/``.ignore`` are left out, as ripgrep does. On machines
+    with ``PARALLEL_MIN_CPUS`` CPUs or more, trees of ``parallel_min_files``
+    files and more are matched in chunks by a pool of worker processes;
+  - when the searched directory (or an enclosing one) has a trigram index
+    (``panda_cli.py index``), only searches the files that contain the
+    pattern's literals, passing them to ``rg`` as arguments when there are no
+    more than ``RG_MAX_FILE_ARGS``. See tools/grep/trigram_index.py.
+
+Results are streamed (:meth:`GrepService.stream`): ``head_limit`` is a global
+limit on output lines, and the search stops, killing ``rg`` if it runs, as soon
+as it is reached. Memory is bounded by the lines actually returned.
+
+:meth:`GrepService.matches` returns the same hits as structured records (path,
+line number, byte offsets of the line and submatches), built from ``rg
+--json`` or by the in-process engine; see tools/grep/grep_records.py.
+
+The in-process engine writes the same output as ripgrep (``path:line``,
+``path:N:line``, ``-`` for context lines, ``--`` between groups), sorted by
+path. It runs patterns with Python ``re``, after translating the ripgrep
+constructs ``re`` lacks or reads differently (:func:`_translate`): POSIX
+classes such as ``[[:digit:]]`` and ``\z``. Unicode classes (``\p{L}``) are
+rejected with an error rather than searched wrongly, and ``--type`` only
+accepts the types of ``FILE_TYPES``.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tools.file.file_cache import CachedFile, file_cache
+from tools.file.file_reader import LineIndex
+from tools.grep.grep_records import Match, line_matches, multiline_matches, parse_rg_json
+from tools.grep.trigram_index import TrigramIndex, index_root, literal_query
+
+OUTPUT_MODES = ("content", "files_with_matches", "count")
+IGNORE_FILES = (".gitignore", ".ignore")
+BINARY_SNIFF_BYTES = 8192
+# Trigram candidates passed to rg as arguments; beyond this, rg walks the tree itself
+RG_MAX_FILE_ARGS = 1000
+# Worker processes read every file from disk and send their output back: about 14 us per file against
+# 10 us for a serial search over cached contents (bench_parallel_grep.py, 5000 files, 1 CPU). Split over
+# fewer CPUs than this, that gains little over the cache and takes the CPUs the agent runs on
+PARALLEL_MIN_CPUS = 4
+
+# Subset of ``rg --type-list``, the types the in-process engine knows
+FILE_TYPES: Dict[str, Tuple[str, ...]] = {
+    "c": ("*.c", "*.h"),
+    "cpp": ("*.cpp", "*.cc", "*.cxx", "*.c++", "*.hpp", "*.hh", "*.hxx", "*.h", "*.inl"),
+    "cs": ("*.cs",),
+    "css": ("*.css", "*.scss", "*.sass", "*.less"),
+    "go": ("*.go",),
+    "html": ("*.html", "*.htm", "*.xhtml"),
+    "java": ("*.java",),
+    "js": ("*.js", "*.jsx", "*.mjs", "*.cjs", "*.vue"),
+    "json": ("*.json",),
+    "kotlin": ("*.kt", "*.kts"),
+    "markdown": ("*.md", "*.markdown", "*.mdx"),
+    "md": ("*.md", "*.markdown", "*.mdx"),
+    "php": ("*.php",),
+    "py": ("*.py", "*.pyi"),
+    "ruby": ("*.rb", "*.gemspec", "Gemfile", "Rakefile"),
+    "rust": ("*.rs",),
+    "sh": ("*.sh", "*.bash", "*.zsh", ".bashrc", ".zshrc"),
+    "sql": ("*.sql",),
+    "swift": ("*.swift",),
+    "toml": ("*.toml", "Cargo.lock"),
+    "ts": ("*.ts", "*.tsx", "*.cts", "*.mts"),
+    "txt": ("*.txt",),
+    "xml": ("*.xml", "*.xsd", "*.xsl"),
+    "yaml": ("*.yaml", "*.yml"),
+}
+
+
+class GrepError(Exception):
+    """A search that cannot run or did not finish; custom_grep reports it as ``Error: ...``."""
+
+
+@lru_cache(maxsize=1)
+def ripgrep_path() -> Optional[str]:
+    """Path of a working ``rg`` executable, or None; checked once per process."""
+    path = shutil.which("rg")
+    if path is None:
+        return None
+    try:
+        result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return path if result.returncode == 0 else None
+
+
+# ``[[:name:]]`` classes of ripgrep, as the body of a Python character class
+POSIX_CLASSES: Dict[str, str] = {
+    "alnum": "0-9A-Za-z",
+    "alpha": "A-Za-z",
+    "ascii": "\\x00-\\x7F",
+    "blank": "\\t ",
+    "cntrl": "\\x00-\\x1F\\x7F",
+    "digit": "0-9",
+    "graph": "!-~",
+    "lower": "a-z",
+    "print": " -~",
+    "punct": "!-/:-@\\[-`{-~",
+    "space": "\\t\\n\\v\\f\\r ",
+    "upper": "A-Z",
+    "word": "0-9A-Za-z_",
+    "xdigit": "0-9A-Fa-f",
+}
+_POSIX_CLASS = re.compile(r"\[:(\^?)([a-z]+):\]")
+
+
+def _translate(pattern: str) -> str:
+    r"""
+    A ripgrep (Rust regex) pattern in Python ``re`` syntax, for the constructs
+    where the two differ: ``[[:digit:]]`` classes and ``\z``.
+
+    Raises:
+        GrepError: For ``\p{..}``/``\P{..}`` Unicode classes, which ``re`` cannot run.
+    """
+    if "[:" not in pattern and "\\" not in pattern:
+        return pattern
+    out: List[str] = []
+    # Index of the first character of the current class body, -1 outside a class
+    body = -1
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            escape = pattern[i + 1:i + 2]
+            if escape in ("p", "P"):
+                raise GrepError(f"regex parse error: Unicode class \\{escape} needs ripgrep, which is not installed")
+            out.append("\\Z" if escape == "z" and body < 0 else pattern[i:i + 2])
+            i += 2
+            continue
+        if body >= 0:
+            m = _POSIX_CLASS.match(pattern, i)
+            if m is not None:
+                if m.group(2) not in POSIX_CLASSES:
+                    raise GrepError(f"regex parse error: unrecognized POSIX class [:{m.group(2)}:]")
+                if m.group(1):
+                    raise GrepError(f"regex parse error: negated POSIX class [:^{m.group(2)}:] needs ripgrep, "
+                                    "which is not installed")
+                out.append(POSIX_CLASSES[m.group(2)])
+                i = m.end()
+                continue
+            if c == "]" and i > body:
+                body = -1
+        elif c == "[":
+            body = i + 1
+            if pattern.startswith("^", body):
+                out.append("[^")
+                i = body = body + 1
+                continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def _expand_braces(pattern: str) -> List[str]:
+    """``*.{ts,tsx}`` -> ``["*.ts", "*.tsx"]``."""
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if match is None:
+        return [pattern]
+    head, tail = pattern[:match.start()], pattern[match.end():]
+    return [p for option in match.group(1).split(",") for p in _expand_braces(head + option + tail)]
+
+
+def _glob_regex(glob: str) -> str:
+    """Translate one gitignore-style glob (no braces) to a regex over a ``/``-separated path."""
+    out, i = [], 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+            continue
+        if c == "*":
+            out.append(".*" if glob.startswith("**", i) else "[^/]*")
+            i += 2 if glob.startswith("**", i) else 1
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = glob.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:end]
+                out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class GlobRule:
+    """One gitignore-style pattern, relative to the directory ``base``."""
+
+    __slots__ = ("base", "regex", "negate", "dir_only")
+
+    def __init__(self, line: str, base: str = ""):
+        self.negate = line.startswith("!")
+        if self.negate:
+            line = line[1:]
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        body = "|".join(_glob_regex(p) for p in _expand_braces(line))
+        self.base = base
+        # A pattern without a slash matches the name at any depth
+        self.regex = re.compile(("" if anchored else "(?:.*/)?") + f"(?:{body})$")
+
+    def matches(self, rel: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel.startswith(self.base + "/"):
+                return False
+            rel = rel[len(self.base) + 1:]
+        return self.regex.match(rel) is not None
+
+
+def _ignored(rules: List[GlobRule], rel: str, is_dir: bool) -> bool:
+    ignored = False
+    for rule in rules:
+        if rule.negate == ignored and rule.matches(rel, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+def _read_rules(path: str, base: str) -> List[GlobRule]:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = [line.rstrip("\n").rstrip() for line in f]
+    except OSError:
+        return []
+    return [GlobRule(line, base) for line in lines if line and not line.startswith("#")]
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class FileIndex:
+    """Searchable files under one directory, and the directory mtimes that tell whether the list is current."""
+
+    __slots__ = ("root", "files", "paths", "stamps")
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: List[str] = []
+        # Every directory walked and every ignore file read -> mtime at build time
+        self.stamps: Dict[str, Optional[int]] = {}
+        self._build()
+        self.paths = [os.path.join(root, rel) for rel in self.files]
+
+    def current(self) -> bool:
+        return all(_mtime(path) == mtime for path, mtime in self.stamps.items())
+
+    def _build(self):
+        # ripgrep reads .gitignore only inside a repository, including those of the enclosing directories
+        top = self.root
+        while not os.path.exists(os.path.join(top, ".git")) and os.path.dirname(top) != top:
+            top = os.path.dirname(top)
+        in_git = os.path.exists(os.path.join(top, ".git"))
+        names = IGNORE_FILES if in_git else (".ignore",)
+        prefix = os.path.relpath(self.root, top).replace(os.sep, "/") if in_git else "."
+        prefix = "" if prefix == "." else prefix
+
+        rules: List[GlobRule] = []
+        directory = top if in_git else self.root
+        for part in [""] + (prefix.split("/") if prefix else []):
+            directory = os.path.join(directory, part) if part else directory
+            if directory == self.root:
+                break
+            base = os.path.relpath(directory, top).replace(os.sep, "/")
+            rules.extend(self._rules(directory, "" if base == "." else base, names))
+
+        stack: List[Tuple[str, str, List[GlobRule]]] = [(self.root, "", rules)]
+        while stack:
+            directory, rel_dir, rules = stack.pop()
+            self.stamps[directory] = _mtime(directory)
+            own = self._rules(directory, f"{prefix}/{rel_dir}".strip("/"), names)
+            if own:
+                rules = rules + own
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name, reverse=True)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    # Symlinks are not followed, as ripgrep does without --follow: a link to
+                    # an enclosing directory would list the same files again, or loop
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file(follow_symlinks=False)
+                except OSError:
+                    continue
+                if rules and _ignored(rules, f"{prefix}/{rel}" if prefix else rel, is_dir):
+                    continue
+                if is_dir:
+                    stack.append((entry.path, rel, rules))
+                elif is_file:
+                    self.files.append(rel)
+        self.files.sort()
+
+    def _rules(self, directory: str, base: str, names) -> List[GlobRule]:
+        rules = []
+        for name in names:
+            path = os.path.join(directory, name)
+            self.stamps[path] = _mtime(path)
+            rules.extend(_read_rules(path, base))
+        return rules
+
+
+class GrepService:
+    """custom_grep backend: ripgrep when it is installed, in-process search over cached file lists otherwise."""
+
+    def __init__(self, engine: str = "auto", max_indexes: int = 32, timeout: float = 30,
+                 use_index: bool = True, workers: Optional[int] = None, parallel_min_files: int = 5000):
+        """
+        Args:
+            engine: "auto" (ripgrep when installed, in-process otherwise), "python"
+                (always in-process) or "rg" (always spawn ripgrep).
+            max_indexes: Directory file lists kept, least recently used dropped first.
+            timeout: Seconds before a search is abandoned.
+            use_index: Narrow searches with a trigram index when one exists on disk.
+            workers: Processes matching files in parallel for in-process searches; one per CPU by
+                default with ``PARALLEL_MIN_CPUS`` CPUs or more, none (serial search) below.
+            parallel_min_files: In-process searches over fewer files run in this process, where the
+                file contents are cached.
+        """
+        if engine not in ("auto", "python", "rg"):
+            raise ValueError(f"Invalid engine: {engine}. Must be one of: auto, python, rg")
+        self.engine = engine
+        self.max_indexes = max_indexes
+        self.timeout = timeout
+        self.use_index = use_index
+        if workers is None:
+            cpus = os.cpu_count() or 1
+            workers = cpus if cpus >= PARALLEL_MIN_CPUS else 1
+        self.workers = workers
+        self.parallel_min_files = parallel_min_files
+        self._workers = None
+        self._indexes: "OrderedDict[str, FileIndex]" = OrderedDict()
+        self._trigrams: Dict[str, TrigramIndex] = {}
+        self._lock = threading.Lock()
+        self.counts = {"python": 0, "rg": 0, "index_hits": 0, "index_builds": 0, "trigram": 0, "parallel": 0,
+                       "index_errors": 0}
+
+    def index(self, root: str) -> FileIndex:
+        """File list of the directory ``root``, rebuilt only when a directory or ignore file changed."""
+        root = os.path.abspath(root)
+        with self._lock:
+            index = self._indexes.get(root)
+        if index is not None and index.current():
+            with self._lock:
+                self._indexes.move_to_end(root)
+                self.counts["index_hits"] += 1
+            return index
+        index = FileIndex(root)
+        with self._lock:
+            self.counts["index_builds"] += 1
+            self._indexes[root] = index
+            self._indexes.move_to_end(root)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def trigram_index(self, path: str, create: bool = False) -> Optional[TrigramIndex]:
+        """The trigram index covering ``path``; with ``create``, a new one rooted at ``path`` if none does."""
+        root = index_root(path)
+        if root is None:
+            if not create:
+                return None
+            root = os.path.abspath(path)
+        with self._lock:
+            index = self._trigrams.get(root)
+            if index is None:
+                index = self._trigrams[root] = TrigramIndex(root)
+        return index
+
+    def search(
+        self,
+        pattern: str,
+        path: str = ".",
+        glob: Optional[str] = None,
+        output_mode: str = "files_with_matches",
+        B: Optional[int] = None,
+        A: Optional[int] = None,
+        C: Optional[int] = None,
+        n: bool = False,
+        i: bool = False,
+        type: Optional[str] = None,
+        head_limit: Optional[int] = None,
+        multiline: bool = False,
+    ) -> str:
+        """Run one custom_grep search; same arguments and output as the tool, errors as ``Error: ...``."""
+        lines = self.stream(pattern, path, glob, output_mode, B, A, C, n, i, type, head_limit, multiline)
+        try:
+            return "\n".join(islice(lines, head_limit))
+        except GrepError as e:
+            return f"Error: {e}"
+        finally:
+            # Stops the search (and kills rg) once the first head_limit lines are taken
+            lines.close()
+
+    def stream(
+        self,
+        pattern: str,
+        path: str = ".",
+        glob: Optional[str] = None,
+        output_mode: str = "files_with_matches",
+        B: Optional[int] = None,
+        A: Optional[int] = None,
+        C: Optional[int] = None,
+        n: bool = False,
+        i: bool = False,
+        type: Optional[str] = None,
+        head_limit: Optional[int] = None,
+        multiline: bool = False,
+    ) -> Iterator[str]:
+        """
+        Output lines of a search as they are found. ``head_limit`` only bounds the
+        work done per file; the caller stops after as many lines as it needs and
+        closes the generator, which ends the search.
+
+        Raises:
+            GrepError: Invalid arguments, a bad pattern, a timeout or a ripgrep failure.
+        """
+        if output_mode not in OUTPUT_MODES:
+            raise GrepError(f"Invalid output_mode: {output_mode}. Must be one of: {', '.join(OUTPUT_MODES)}")
+        self._check(path, type, head_limit)
+        engine, targets, with_name = self._plan(pattern, path, glob, type, i)
+        if engine == "rg":
+            yield from self._stream_rg(pattern, path, glob, output_mode, B, A, C, n, i, type, head_limit, multiline,
+                                       targets)
+        else:
+            yield from self._stream_python(pattern, targets, with_name, output_mode, B, A, C, n, i,
+                                           head_limit, multiline)
+
+    def matches(
+        self,
+        pattern: str,
+        path: str = ".",
+        glob: Optional[str] = None,
+        i: bool = False,
+        type: Optional[str] = None,
+        head_limit: Optional[int] = None,
+        multiline: bool = False,
+    ) -> Iterator[Match]:
+        """
+        Structured results: one :class:`~tools.grep.grep_records.Match` per
+        matching line, with the byte offsets of the line and of each submatch.
+        ripgrep runs with ``--json``; the in-process engine gives the same records.
+        At most ``head_limit`` records are returned; as with :meth:`stream`, the
+        search also ends when the generator is closed.
+
+        Raises:
+            GrepError: Invalid arguments, a bad pattern, a timeout or a ripgrep failure.
+        """
+        self._check(path, type, head_limit)
+        engine, targets, _ = self._plan(pattern, path, glob, type, i)
+        if engine == "rg" and targets == []:
+            return
+        if engine == "rg":
+            cmd = self._rg_command(pattern, path, glob, i, type, multiline, targets) + ["--json"]
+            if head_limit is not None:
+                cmd.extend(["--max-count", str(head_limit)])
+            records = parse_rg_json(self._run_rg(cmd))
+        else:
+            records = self._matches_python(pattern, targets, i, head_limit, multiline)
+        try:
+            yield from islice(records, head_limit)
+        finally:
+            records.close()
+
+    def _check(self, path: str, type: Optional[str], head_limit: Optional[int]):
+        if head_limit is not None and (not isinstance(head_limit, int) or head_limit <= 0):
+            raise GrepError("head_limit must be a positive integer")
+        if type is not None and type not in FILE_TYPES and self._engine() == "python":
+            raise GrepError(f"unrecognized file type: {type} (without ripgrep, the types are: "
+                            f"{', '.join(sorted(FILE_TYPES))})")
+        if not os.path.exists(path):
+            raise GrepError(f"{path}: No such file or directory")
+
+    def _engine(self) -> str:
+        if self.engine == "auto":
+            return "rg" if ripgrep_path() is not None else "python"
+        return self.engine
+
+    def _plan(self, pattern: str, path: str, glob: Optional[str], type: Optional[str],
+              i: bool) -> Tuple[str, Optional[List[Tuple[str, str]]], bool]:
+        """
+        (engine, files to search, whether paths are written) for one search. For
+        ripgrep, the files are None when it searches ``path`` itself.
+        """
+        engine = self._engine()
+        targets = None
+        if self.engine != "rg" and self.use_index and os.path.isdir(path):
+            targets = self._indexed_targets(pattern, path, glob, type, i)
+            if engine == "rg" and targets is not None and len(targets) > RG_MAX_FILE_ARGS:
+                targets = None
+        with self._lock:
+            self.counts[engine] += 1
+            if targets is not None:
+                self.counts["trigram"] += 1
+        if engine == "rg" or targets is not None:
+            return engine, targets, True
+        index = self.index(path) if os.path.isdir(path) else None
+        return engine, self._targets(path, index, glob, type), index is not None
+
+    def _rg_command(self, pattern, path, glob, i, type, multiline, targets=None) -> List[str]:
+        rg = ripgrep_path()
+        if rg is None:
+            raise GrepError("ripgrep (rg) command not found. Please install ripgrep.")
+        cmd = [rg, pattern]
+        if targets is not None:
+            # Already filtered by glob and type; a single file is still written with its path
+            cmd.append("--with-filename")
+            cmd.extend(display for display, _ in targets)
+            glob = type = None
+        else:
+            cmd.append(path)
+        if glob:
+            cmd.extend(["--glob", glob])
+        if type:
+            cmd.extend(["--type", type])
+        if i:
+            cmd.append("--ignore-case")
+        if multiline:
+            cmd.append("--multiline")
+        return cmd
+
+    def _stream_rg(self, pattern, path, glob, output_mode, B, A, C, n, i, type, head_limit, multiline,
+                   targets=None) -> Iterator[str]:
+        if targets == []:
+            return
+        cmd = self._rg_command(pattern, path, glob, i, type, multiline, targets)
+        if output_mode == "files_with_matches":
+            cmd.append("--files-with-matches")
+        elif output_mode == "count":
+            cmd.append("--count")
+        if output_mode == "content":
+            if B is not None:
+                cmd.extend(["--before-context", str(B)])
+            if A is not None:
+                cmd.extend(["--after-context", str(A)])
+            if C is not None:
+                cmd.extend(["--context", str(C)])
+            if n:
+                cmd.append("--line-number")
+            # No file can contribute more lines than that; in count mode it would cap the counts
+            if head_limit is not None:
+                cmd.extend(["--max-count", str(head_limit)])
+        for line in self._run_rg(cmd):
+            yield line.rstrip("\n")
+
+    def _run_rg(self, cmd: List[str]) -> Iterator[str]:
+        """Output lines of ripgrep; it is killed when the generator is closed or the timeout expires."""
+        # stderr goes to a file: a full stderr pipe would block rg while we read stdout
+        with tempfile.TemporaryFile() as errors:
+            try:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors,
+                                           encoding="utf-8", errors="replace")
+            except OSError as e:
+                raise GrepError(str(e))
+            timed_out = threading.Event()
+
+            def expire():
+                timed_out.set()
+                process.kill()
+
+            timer = threading.Timer(self.timeout, expire)
+            timer.start()
+            try:
+                yield from process.stdout
+                returncode = process.wait()
+            finally:
+                timer.cancel()
+                if process.poll() is None:
+                    process.kill()
+                process.wait()
+                process.stdout.close()
+            if timed_out.is_set():
+                raise GrepError(f"Search timeout exceeded ({self.timeout:g} seconds)")
+            if returncode > 1:
+                errors.seek(0)
+                message = errors.read().decode("utf-8", errors="replace").strip()
+                raise GrepError(message or f"ripgrep failed with return code {returncode}")
+
+    def _indexed_targets(self, pattern: str, path: str, glob: Optional[str], type: Optional[str],
+                         i: bool) -> Optional[List[Tuple[str, str]]]:
+        """Targets narrowed by the trigram index, or None without an index or usable literals."""
+        trigram = self.trigram_index(path)
+        if trigram is None or (type is not None and type not in FILE_TYPES):
+            return None
+        try:
+            query = literal_query(_translate(pattern), i)
+        except GrepError:
+            return None
+        if query is None:
+            return None
+        files = self.index(path)
+        under = os.path.relpath(os.path.abspath(path), trigram.root).replace(os.sep, "/")
+        try:
+            # Every file is checked against its indexed mtime: edits made outside the agent are never missed
+            trigram.sync(under, files.files, files.paths)
+            candidates = trigram.candidates(query, under)
+        except OSError:
+            # E.g. another process's rebuild removed the generation being updated: search without the
+            # index, which is mapped again from its current generation next time
+            trigram.close()
+            with self._lock:
+                self.counts["index_errors"] += 1
+            return None
+        if candidates is None:
+            return None
+        skip = 0 if under == "." else len(under) + 1
+        head = path if path.endswith(os.sep) else path + os.sep
+        filters = self._filters(glob, type)
+        return [(head + rel[skip:], os.path.join(trigram.root, rel)) for rel in candidates
+                if not filters or all(self._allowed(rules, rel[skip:]) for rules in filters)]
+
+    @staticmethod
+    def _filters(glob: Optional[str], type: Optional[str]) -> List[List[GlobRule]]:
+        filters = []
+        if type is not None:
+            filters.append([GlobRule(g) for g in FILE_TYPES[type]])
+        if glob:
+            filters.append([GlobRule(glob)])
+        return filters
+
+    def files(self, path: str, glob: Optional[str] = None, type: Optional[str] = None) -> List[str]:
+        """Absolute paths of the files a search of the directory ``path`` reads, from its cached file list."""
+        # A type only ripgrep knows does not narrow the list
+        filters = self._filters(glob, type if type in FILE_TYPES else None)
+        index = self.index(path)
+        return [abspath for rel, abspath in zip(index.files, index.paths)
+                if not filters or all(self._allowed(rules, rel) for rules in filters)]
+
+    def _targets(self, path: str, index: Optional[FileIndex], glob: Optional[str],
+                 type: Optional[str]) -> List[Tuple[str, str]]:
+        """(display path, absolute path) of every file to search, sorted by path."""
+        if index is None:
+            return [(path, os.path.abspath(path))]
+        filters = self._filters(glob, type)
+        head = path if path.endswith(os.sep) else path + os.sep
+        return [(head + rel, abspath) for rel, abspath in zip(index.files, index.paths)
+                if not filters or all(self._allowed(rules, rel) for rules in filters)]
+
+    @staticmethod
+    def _allowed(rules: List[GlobRule], rel: str) -> bool:
+        # A whitelist when any rule is positive, like ``rg --glob``
+        allowed = all(rule.negate for rule in rules)
+        for rule in rules:
+            if rule.matches(rel, False):
+                allowed = not rule.negate
+        return allowed
+
+    def _stream_python(self, pattern, targets, with_name, output_mode, B, A, C, n, i, head_limit,
+                       multiline) -> Iterator[str]:
+        regex = _compile(pattern, i)
+        before = B if B is not None else (C or 0)
+        after = A if A is not None else (C or 0)
+        context = output_mode == "content" and (before or after)
+        options = (output_mode, before, after, n, with_name, multiline)
+        deadline = time.monotonic() + self.timeout
+
+        emitted = 0
+
+        def serial() -> Iterator[List[str]]:
+            for display, abspath in targets:
+                if time.monotonic() > deadline:
+                    raise GrepError(f"Search timeout exceeded ({self.timeout:g} seconds)")
+                text = _read_text(abspath)
+                if text is None:
+                    continue
+                # Lines beyond the global limit would never be read
+                limit = max(1, head_limit - emitted) if output_mode == "content" and head_limit is not None else None
+                yield _file_output(regex, display, text, *options, limit)
+
+        if self.workers > 1 and len(targets) >= self.parallel_min_files:
+            with self._lock:
+                self.counts["parallel"] += 1
+            outputs = self._parallel_outputs(pattern, i, targets, options, head_limit, deadline)
+        else:
+            outputs = serial()
+        try:
+            for lines in outputs:
+                if not lines:
+                    continue
+                if context and emitted:
+                    emitted += 1
+                    yield "--"
+                for line in lines:
+                    emitted += 1
+                    yield line
+        finally:
+            outputs.close()
+
+    def _parallel_outputs(self, pattern, i, targets, options, head_limit, deadline) -> Iterator[List[str]]:
+        """Output lines per file, with the files matched in chunks across the worker processes."""
+        from concurrent.futures import BrokenExecutor
+        from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+        pool = self._pool()
+        limit = head_limit if options[0] == "content" else None
+        size = max(64, -(-len(targets) // (4 * self.workers)))
+        chunks = (targets[start:start + size] for start in range(0, len(targets), size))
+        # A bounded window of chunks in flight: a search cut short by head_limit does not match the whole tree
+        pending = deque(pool.submit(_search_chunk, pattern, i, chunk, options, limit)
+                        for chunk in islice(chunks, 2 * self.workers))
+        try:
+            while pending:
+                try:
+                    outputs = pending.popleft().result(max(0.0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    raise GrepError(f"Search timeout exceeded ({self.timeout:g} seconds)")
+                except BrokenExecutor as e:
+                    with self._lock:
+                        self._workers = None
+                    raise GrepError(f"search worker failed: {e}")
+                pending.extend(pool.submit(_search_chunk, pattern, i, chunk, options, limit)
+                               for chunk in islice(chunks, 1))
+                yield from outputs
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _pool(self):
+        with self._lock:
+            if self._workers is None:
+                # Imported on first use, only large searches need them. Spawned, not forked: the agent runs threads
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._workers = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._workers
+
+    def _matches_python(self, pattern, targets, i, head_limit, multiline) -> Iterator[Match]:
+        regex = _compile(pattern, i)
+        deadline = time.monotonic() + self.timeout
+        emitted = 0
+        for display, abspath in targets:
+            if time.monotonic() > deadline:
+                raise GrepError(f"Search timeout exceeded ({self.timeout:g} seconds)")
+            found = _read_data(abspath)
+            if found is None:
+                continue
+            data, entry = found
+            text = entry.text if entry is not None else None
+            if text is None or "\ufffd" in text:
+                # Decoded losslessly, so that character positions map back to byte offsets
+                text = data.decode("utf-8", errors="surrogateescape")
+            if regex.search(text) is None:
+                continue
+            limit = None if head_limit is None else max(1, head_limit - emitted)
+            offsets = entry.index.offsets if entry is not None else LineIndex(data).offsets
+            if multiline:
+                records = multiline_matches(display, data, text, offsets, regex, limit)
+            else:
+                records = line_matches(display, data, offsets, _matching_lines(regex, text, False, limit), regex)
+            for record in records:
+                emitted += 1
+                yield record
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counts, "indexes": len(self._indexes)}
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def close(self):
+        """Stop the worker processes, if any were started."""
+        with self._lock:
+            workers, self._workers = self._workers, None
+        if workers is not None:
+            workers.shutdown(cancel_futures=True)
+
+
+def _compile(pattern: str, ignore_case: bool):
+    pattern = _translate(pattern)
+    try:
+        return re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    except re.error as e:
+        raise GrepError(f"regex parse error: {e}")
+
+
+def _read_data(path: str, cached: bool = True) -> Optional[Tuple[bytes, Optional[CachedFile]]]:
+    """Content of ``path`` and its cache entry (None if not cached), or None for unreadable and binary files."""
+    try:
+        entry = file_cache.get(path) if cached else None
+        if entry is not None:
+            return None if entry.binary else (entry.data, entry)
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if b"\x00" in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return data, None
+
+
+def _read_text(path: str, cached: bool = True) -> Optional[str]:
+    """Decoded content of ``path``, or None for unreadable and binary files."""
+    found = _read_data(path, cached)
+    if found is None:
+        return None
+    data, entry = found
+    return entry.text if entry is not None else data.decode("utf-8", errors="replace")
+
+
+def _file_output(regex, display: str, text: str, output_mode: str, before: int, after: int, n: bool,
+                 with_name: bool, multiline: bool, limit: Optional[int]) -> List[str]:
+    """Output lines of one file, empty without a match; ``--`` separators are only added between its own groups."""
+    if regex.search(text) is None:
+        return []
+    matched = _matching_lines(regex, text, multiline, 1 if output_mode == "files_with_matches" else limit)
+    if not matched:
+        return []
+    if output_mode == "files_with_matches":
+        return [display]
+    if output_mode == "count":
+        return [f"{display}:{len(matched)}" if with_name else str(len(matched))]
+    lines = _split_lines(text)
+    output: List[str] = []
+    for group in _groups(matched, before, after, len(lines)):
+        if output and (before or after):
+            output.append("--")
+        for index in group:
+            sep = ":" if index in matched else "-"
+            number = f"{index + 1}{sep}" if n else ""
+            output.append(f"{display}{sep}{number}{lines[index]}" if with_name else f"{number}{lines[index]}")
+    return output
+
+
+@lru_cache(maxsize=32)
+def _compiled(pattern: str, ignore_case: bool):
+    return _compile(pattern, ignore_case)
+
+
+def _search_chunk(pattern: str, ignore_case: bool, files: List[Tuple[str, str]], options: tuple,
+                  limit: Optional[int]) -> List[List[str]]:
+    """Worker process: the output lines of each file in ``files`` that has a hit."""
+    regex = _compiled(pattern, ignore_case)
+    outputs = []
+    for display, abspath in files:
+        # Read from disk: the parent's cache is the one the agent's writes invalidate
+        text = _read_text(abspath, cached=False)
+        if text is not None:
+            lines = _file_output(regex, display, text, *options, limit)
+            if lines:
+                outputs.append(lines)
+    return outputs
+
+
+def _split_lines(text: str) -> List[str]:
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    return lines
+
+
+def _matching_lines(regex, text: str, multiline: bool, max_count: Optional[int]) -> Dict[int, None]:
+    """Indexes of the matching lines, in order (a dict used as an ordered set)."""
+    matched: Dict[int, None] = {}
+    # A match at the very end of a text that ends with a newline (or is empty) is not on any line
+    no_last_line = not text or text.endswith("\n")
+    if multiline:
+        line, last = 0, 0
+        for m in regex.finditer(text):
+            start, end = m.span()
+            if start == len(text) and no_last_line:
+                break
+            line += text.count("\n", last, start)
+            last_line = line + text.count("\n", start, max(start, end - 1))
+            for index in range(line, last_line + 1):
+                matched[index] = None
+            line, last = last_line, max(start, end - 1)
+            if max_count is not None and len(matched) >= max_count:
+                break
+        return matched
+
+    # Jump from match to match over the whole text, then confirm each hit on its own line
+    pos, line, last = 0, 0, 0
+    while True:
+        m = regex.search(text, pos)
+        if m is None:
+            break
+        start, end = m.span()
+        if start == len(text) and no_last_line:
+            break
+        if text.find("\n", start, end) != -1:
+            # The pattern can match across a line break (e.g. \s), which a line-by-line search cannot
+            return _scan_lines(regex, _split_lines(text), max_count)
+        line += text.count("\n", last, start)
+        last = start
+        newline = text.find("\n", start)
+        line_end = len(text) if newline == -1 else newline
+        if regex.search(text, text.rfind("\n", 0, start) + 1, line_end) is not None:
+            matched[line] = None
+            if max_count is not None and len(matched) >= max_count:
+                break
+        if newline == -1:
+            break
+        pos = newline + 1
+    return matched
+
+
+def _scan_lines(regex, lines: List[str], max_count: Optional[int]) -> Dict[int, None]:
+    matched: Dict[int, None] = {}
+    for index, line in enumerate(lines):
+        if regex.search(line) is not None:
+            matched[index] = None
+            if max_count is not None and len(matched) >= max_count:
+                break
+    return matched
+
+
+def _groups(matched: Dict[int, None], before: int, after: int, total: int) -> List[range]:
+    """Line ranges to print: each match with its context, overlapping or adjacent ranges merged."""
+    groups: List[List[int]] = []
+    for index in matched:
+        start, end = max(0, index - before), min(total, index + after + 1)
+        if groups and start <= groups[-1][1]:
+            groups[-1][1] = max(groups[-1][1], end)
+        else:
+            groups.append([start, end])
+    return [range(start, end) for start, end in groups]
+
+
+# Shared by custom_grep calls in this process
+grep_service = GrepService(engine=os.environ.get("PANDA_GREP_ENGINE", "auto"),
+                           use_index=os.environ.get("PANDA_GREP_INDEX", "1") != "0",
+                           workers=int(os.environ.get("PANDA_GREP_WORKERS", 0)) or None)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Test script for structured grep results."""
+
+import json
+import sys
+
+import pytest
+
+from tools.grep import grep_service as grep_service_module
+from tools.grep.grep_records import Match, MappedFile, parse_rg_json
+from tools.grep.grep_service import GrepError, GrepService
+
+CONTENT = "import os\ndef héllo():\n    return 1\n"
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text(CONTENT, encoding="utf-8")
+    (tmp_path / "src" / "b.py").write_bytes(b"x = '\xff'\nreturn_value = 2")
+    return tmp_path
+
+
+def rg_json(root):
+    """What ``rg --json 'h.llo|return' root`` writes for the tree."""
+    a, b = f"{root}/src/a.py", f"{root}/src/b.py"
+    messages = [
+        {"type": "begin", "data": {"path": {"text": a}}},
+        {"type": "match", "data": {"path": {"text": a}, "lines": {"text": "def héllo():\n"}, "line_number": 2,
+                                   "absolute_offset": 10,
+                                   "submatches": [{"match": {"text": "héllo"}, "start": 4, "end": 10}]}},
+        {"type": "match", "data": {"path": {"text": a}, "lines": {"text": "    return 1\n"}, "line_number": 3,
+                                   "absolute_offset": 24,
+                                   "submatches": [{"match": {"text": "return"}, "start": 4, "end": 10}]}},
+        {"type": "end", "data": {"path": {"text": a}, "binary_offset": None, "stats": {}}},
+        {"type": "begin", "data": {"path": {"text": b}}},
+        {"type": "match", "data": {"path": {"text": b}, "lines": {"text": "return_value = 2"}, "line_number": 2,
+                                   "absolute_offset": 8,
+                                   "submatches": [{"match": {"text": "return"}, "start": 0, "end": 6}]}},
+        {"type": "end", "data": {"path": {"text": b}, "binary_offset": None, "stats": {}}},
+    ]
+    lines = [json.dumps(m, ensure_ascii=False, separators=(",", ":")) for m in messages]
+    return lines + ['{"data":{"elapsed_total":{"human":"0.001s"},"stats":{}},"type":"summary"}']
+
+
+def test_python_engine_records_match_ripgrep_json(tree):
+    root = str(tree)
+    expected = list(parse_rg_json(rg_json(root)))
+    assert expected[0] == Match(f"{root}/src/a.py", 2, 10, 13, ((14, 20),))
+    assert list(GrepService(engine="python").matches("h.llo|return", root)) == expected
+    assert list(GrepService(engine="python").matches("h.llo|return", root, head_limit=2)) == expected[:2]
+
+
+def test_ripgrep_json_is_requested_and_parsed(monkeypatch, tree, tmp_path_factory):
+    bin_dir = tmp_path_factory.mktemp("bin")
+    output = bin_dir / "rg.json"
+    output.write_text("\n".join(rg_json(str(tree))) + "\n", encoding="utf-8")
+    script = bin_dir / "rg"
+    script.write_text(f"#!{sys.executable}\nimport sys\nassert '--json' in sys.argv\n"
+                      f"sys.stdout.write(open({str(output)!r}, encoding='utf-8').read())\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(grep_service_module, "ripgrep_path", lambda: str(script))
+    records = list(GrepService(engine="rg").matches("h.llo|return", str(tree)))
+    assert records == list(GrepService(engine="python").matches("h.llo|return", str(tree)))
+
+
+def test_multiline_records_cover_every_line(tree):
+    root = str(tree)
+    (match,) = GrepService(engine="python").matches(r"héllo\(\):\n\s+return", root, multiline=True)
+    assert (match.line_number, match.offset, match.length) == (2, 10, 26)
+    with MappedFile(match.path) as f:
+        assert bytes(f.line(match)).decode() == "def héllo():\n    return 1"
+        assert [bytes(view) for view in f.spans(match)] == ["héllo():\n    return".encode()]
+
+
+def test_mapped_file_slices_at_offsets(tree):
+    lines = []
+    for match in GrepService(engine="python").matches("return", str(tree)):
+        with MappedFile(match.path) as f:
+            (hit,) = f.spans(match)
+            assert bytes(hit) == b"return"
+            lines.append(bytes(f.line(match)))
+            hit.release()
+    assert lines == [b"    return 1", b"return_value = 2"]
+    with pytest.raises(GrepError):
+        list(GrepService(engine="python").matches("(", str(tree)))
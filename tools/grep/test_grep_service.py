@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Test script for the custom_grep search service."""
+
+import os
+import sys
+import time
+
+import pytest
+
+from tools.grep import grep_service as grep_service_module
+from tools.grep.custom_grep_implementation import CustomGrep
+from tools.grep.grep_service import GrepService
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n!keep.log\n")
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "src" / "a.py").write_text("import os\ndef hello():\n    return 1\n\n\ndef bye():\n    pass\n")
+    (tmp_path / "src" / "sub" / "b.js").write_text("function hello() {}\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "x.py").write_text("def hello(): pass\n")
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "y.py").write_text("def hello(): pass\n")
+    (tmp_path / "x.log").write_text("hello\n")
+    (tmp_path / "keep.log").write_text("hello\n")
+    (tmp_path / "data.bin").write_bytes(b"hello\x00")
+    return tmp_path
+
+
+def test_output_modes_match_ripgrep_format(tree):
+    grep = GrepService(engine="python")
+    root = str(tree)
+    # Hidden, ignored and binary files are skipped; the negated rule keeps keep.log
+    assert grep.search("hello", root).split("\n") == [
+        f"{root}/keep.log", f"{root}/src/a.py", f"{root}/src/sub/b.js"]
+    assert grep.search("def", root, output_mode="count") == f"{root}/src/a.py:2"
+    assert grep.search("def", root, output_mode="content", n=True, C=1).split("\n") == [
+        f"{root}/src/a.py-1-import os",
+        f"{root}/src/a.py:2:def hello():",
+        f"{root}/src/a.py-3-    return 1",
+        "--",
+        f"{root}/src/a.py-5-",
+        f"{root}/src/a.py:6:def bye():",
+        f"{root}/src/a.py-7-    pass",
+    ]
+    # A single file is printed without its name
+    assert grep.search("def", f"{root}/src/a.py", output_mode="content", n=True) == "2:def hello():\n6:def bye():"
+    assert grep.search("hello", root, glob="*.{js,log}") == f"{root}/keep.log\n{root}/src/sub/b.js"
+    assert grep.search("HELLO", root, type="py", i=True) == f"{root}/src/a.py"
+    assert grep.search("os\\ndef", root, multiline=True, output_mode="content") == (
+        f"{root}/src/a.py:import os\n{root}/src/a.py:def hello():")
+    # \s can span a line break in the whole text, but a line-by-line search never does
+    assert grep.search(r"os\s+def", root) == ""
+    assert grep.search("def", root, output_mode="content", head_limit=1) == f"{root}/src/a.py:def hello():"
+
+
+def test_errors_are_returned_as_text(tree):
+    grep = GrepService(engine="python")
+    assert grep.search("(", str(tree)).startswith("Error: regex parse error")
+    assert grep.search("x", str(tree / "missing")).startswith("Error:")
+    assert grep.search("x", str(tree), type="nope").startswith("Error: unrecognized file type: nope (without ripgrep")
+    assert grep.search("x", str(tree), output_mode="lines").startswith("Error: Invalid output_mode")
+    with pytest.raises(ValueError):
+        CustomGrep(grep).search("x", str(tree), output_mode="content", B=-1)
+
+
+def test_file_list_is_reused_until_a_directory_changes(tree):
+    grep = GrepService(engine="python")
+    root = str(tree)
+    grep.search("hello", root)
+    grep.search("bye", root)
+    assert grep.stats()["index_builds"] == 1 and grep.stats()["index_hits"] == 1
+
+    new = tree / "src" / "sub" / "c.py"
+    new.write_text("def hello(): pass\n")
+    os.utime(tree / "src" / "sub", ns=(1, 1))
+    assert f"{root}/src/sub/c.py" in grep.search("hello", root)
+    assert grep.stats()["index_builds"] == 2
+
+    # Edited contents are seen without a rebuild: only the list of files is cached
+    new.write_text("def changed(): pass\n")
+    assert grep.search("changed", root) == f"{root}/src/sub/c.py"
+    assert grep.stats()["index_builds"] == 2
+
+
+def test_symlinks_are_not_followed(tree):
+    grep = GrepService(engine="python")
+    root = str(tree)
+    # A link back to an enclosing directory, and one to a file: neither is listed twice
+    os.symlink("..", tree / "src" / "sub" / "loop")
+    os.symlink("../a.py", tree / "src" / "sub" / "a_link.py")
+    assert grep.search("hello", root).split("\n") == [
+        f"{root}/keep.log", f"{root}/src/a.py", f"{root}/src/sub/b.js"]
+
+
+def test_ripgrep_is_probed_once(monkeypatch, tree):
+    calls = []
+    monkeypatch.setattr(grep_service_module.shutil, "which", lambda name: calls.append(name))
+    grep_service_module.ripgrep_path.cache_clear()
+    try:
+        grep = GrepService()
+        for _ in range(3):
+            assert grep.search("hello", str(tree)).endswith("b.js")
+        assert calls == ["rg"]
+        assert GrepService(engine="rg").search("hello", str(tree)).startswith("Error: ripgrep (rg) command not found")
+    finally:
+        grep_service_module.ripgrep_path.cache_clear()
+
+
+FAKE_RG = """\
+import os, sys, time
+pattern = sys.argv[1]
+if pattern == "fail":
+    sys.stderr.write("regex parse error\\n")
+    sys.exit(2)
+if pattern == "sleep":
+    time.sleep(30)
+with open(os.environ["FAKE_RG_PID"], "w") as f:
+    f.write(str(os.getpid()))
+i = 0
+while True:
+    i += 1
+    print(f"src/file{i}.py:{i}:match", flush=True)
+"""
+
+
+def test_ripgrep_syntax_without_ripgrep(tree):
+    grep = GrepService(engine="python")
+    root = str(tree)
+    (tree / "src" / "c.py").write_text("x = 42\ny = 'z'\n")
+    os.utime(tree / "src", ns=(1, 1))
+    assert grep.search("[[:digit:]]{2}", root, output_mode="content") == f"{root}/src/c.py:x = 42"
+    assert grep.search("= [^[:alpha:][:space:]]", root) == f"{root}/src/c.py"
+    assert grep.search("'z'\\z", f"{root}/src/c.py", multiline=True, output_mode="content") == ""
+    assert grep.search(r"\p{L}+", root).startswith("Error: regex parse error: Unicode class \\p needs ripgrep")
+    assert grep.search("[[:nope:]]", root).startswith("Error: regex parse error: unrecognized POSIX class")
+
+
+ECHO_RG = """\
+import sys
+print(" ".join(sys.argv[1:]))
+"""
+
+
+def test_ripgrep_runs_every_search_when_installed(monkeypatch, tree, tmp_path_factory):
+    script = tmp_path_factory.mktemp("bin") / "rg"
+    script.write_text(f"#!{sys.executable}\n{ECHO_RG}")
+    script.chmod(0o755)
+    monkeypatch.setattr(grep_service_module, "ripgrep_path", lambda: str(script))
+    grep = GrepService()
+    root = str(tree)
+    # Small trees too, with ripgrep's syntax and any type it knows
+    assert grep.search(r"\p{L}", root, type="elixir") == (
+        f"\\p{{L}} {root} --type elixir --files-with-matches")
+    assert grep.stats()["rg"] == 1 and grep.stats()["python"] == 0 and grep.stats()["index_builds"] == 0
+
+    # A trigram index narrows the files rg is given
+    grep.trigram_index(root, create=True).build()
+    assert grep.search("hello", root, type="py") == f"hello --with-filename {root}/src/a.py --files-with-matches"
+    assert grep.search("no_such_word", root) == ""
+    assert grep.stats()["trigram"] == 2 and grep.stats()["python"] == 0
+
+
+def test_index_errors_fall_back_to_a_plain_search(tree):
+    import shutil
+
+    root = str(tree)
+    grep = GrepService(engine="python")
+    index = grep.trigram_index(root, create=True)
+    index.build()
+    assert grep.search("hello", root, type="py") == f"{root}/src/a.py"
+    # Another process's rebuild removed the generation this one has mapped, and a file changed since
+    shutil.rmtree(index._folder)
+    time.sleep(0.01)
+    (tree / "src" / "a.py").write_text("def hello_again(): pass\n")
+    assert grep.search("hello", root, type="py") == f"{root}/src/a.py"
+    assert grep.stats()["index_errors"] == 1 and grep.stats()["trigram"] == 1
+
+
+def test_global_head_limit_stops_the_search(tree, tmp_path_factory):
+    grep = GrepService(engine="python")
+    root = str(tree)
+    (tree / "src" / "c.py").write_text("def one():\n    pass\ndef two():\n    pass\n")
+    os.utime(tree / "src", ns=(1, 1))
+    # The limit is on output lines across all files, not matches per file
+    assert grep.search("def", root, output_mode="content", head_limit=3).split("\n") == [
+        f"{root}/src/a.py:def hello():", f"{root}/src/a.py:def bye():", f"{root}/src/c.py:def one():"]
+    # Counts stay exact; only the number of entries is limited
+    assert grep.search("def", root, output_mode="count", head_limit=1) == f"{root}/src/a.py:2"
+
+    lines = grep.stream("def", root, output_mode="content")
+    assert next(lines) == f"{root}/src/a.py:def hello():"
+    lines.close()
+
+
+def test_ripgrep_is_killed_at_the_limit(monkeypatch, tmp_path):
+    script = tmp_path / "rg"
+    script.write_text(f"#!{sys.executable}\n{FAKE_RG}")
+    script.chmod(0o755)
+    pid_file = tmp_path / "pid"
+    monkeypatch.setenv("FAKE_RG_PID", str(pid_file))
+    monkeypatch.setattr(grep_service_module, "ripgrep_path", lambda: str(script))
+    grep = GrepService(engine="rg", timeout=5)
+
+    start = time.perf_counter()
+    output = grep.search("match", str(tmp_path), output_mode="content", head_limit=20)
+    assert output.split("\n")[-1] == "src/file20.py:20:match" and len(output.split("\n")) == 20
+    assert time.perf_counter() - start < 5
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+    assert grep.search("fail", str(tmp_path)) == "Error: regex parse error"
+    assert GrepService(engine="rg", timeout=0.3).search("sleep", str(tmp_path)) == (
+        "Error: Search timeout exceeded (0.3 seconds)")
+
+
+def test_searches_stay_serial_on_small_machines(monkeypatch):
+    monkeypatch.setattr(grep_service_module.os, "cpu_count", lambda: 2)
+    assert GrepService().workers == 1
+    monkeypatch.setattr(grep_service_module.os, "cpu_count", lambda: 8)
+    assert GrepService().workers == 8 and GrepService(workers=1).workers == 1
+
+
+def test_worker_processes_give_the_same_output(monkeypatch, tmp_path):
+    for k in range(300):
+        directory = tmp_path / f"pkg{k % 7}"
+        directory.mkdir(exist_ok=True)
+        suffix = "py" if k % 3 else "js"
+        body = "".join(f"line {j}\n" + ("def Handler_%d():\n    return %d\n" % (k, j) if (k + j) % 5 == 0 else "")
+                       for j in range(12))
+        (directory / f"m{k}.{suffix}").write_text(body)
+    root = str(tmp_path)
+    # No ripgrep: the full tree is searched in-process, here by two worker processes
+    monkeypatch.setattr(grep_service_module, "ripgrep_path", lambda: None)
+    serial = GrepService(engine="python", workers=1)
+    parallel = GrepService(workers=2, parallel_min_files=100)
+    cases = [
+        ("def handler", {"i": True}),
+        (r"return \d", {"output_mode": "count", "type": "py"}),
+        ("Handler_1", {"output_mode": "content", "n": True, "C": 1, "glob": "*.py"}),
+        (r"\(\):\n\s+return 3", {"output_mode": "content", "multiline": True}),
+        ("line", {"output_mode": "content", "head_limit": 150}),
+    ]
+    try:
+        for pattern, options in cases:
+            expected = serial.search(pattern, root, **options)
+            assert expected and parallel.search(pattern, root, **options) == expected, pattern
+        assert parallel.search("(", root).startswith("Error: regex parse error")
+    finally:
+        parallel.close()
+    stats = parallel.stats()
+    assert stats["parallel"] == len(cases) and stats["rg"] == 0
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Test script for the trigram index."""
+
+import os
+
+import pytest
+
+from tools.file.file_cache import file_cache
+from tools.grep.grep_service import GrepService
+from tools.grep.trigram_index import TrigramIndex, literal_query
+
+
+def test_literal_query():
+    assert literal_query(r"def build_\w+") == ("and", [b"def build_"])
+    assert literal_query("foo|barbaz") == ("and", [("or", [("and", [b"foo"]), ("and", [b"barbaz"])])])
+    assert literal_query(r"^from (langchain)\.") == ("and", [b"from langchain."])
+    assert literal_query(r"abc(def)?ghi") == ("and", [b"abc", b"ghi"])
+    # Nothing every match must contain
+    assert literal_query(r"\w+Er|x") is None
+    assert literal_query("ab.cd") is None
+    # Case-insensitive non-ASCII letters have more than one byte form
+    assert literal_query("héllo", ignore_case=True) == ("and", [b"llo"])
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for i in range(40):
+        directory = tmp_path / f"pkg{i % 4}"
+        directory.mkdir(exist_ok=True)
+        (directory / f"mod{i}.py").write_text(f"def function_{i}():\n    return value_{i * 7}\n")
+    (tmp_path / "pkg0" / "special.py").write_text("class ThreadRouter:\n    ſtate = 'Straße'\n")
+    return tmp_path
+
+
+def test_indexed_search_matches_a_full_scan(tree):
+    root = str(tree)
+    plain = GrepService(engine="python", use_index=False)
+    indexed = GrepService(engine="python")
+    assert indexed.trigram_index(root) is None
+    indexed.trigram_index(root, create=True).build()
+
+    cases = [
+        ("function_1\\d?\\(", {}), ("THREADROUTER", {"i": True}), ("STATE", {"i": True}), ("Straße", {}),
+        ("value_(14|21)$", {"output_mode": "content", "n": True}), (r"\w+_3\b", {}), ("missing_name", {}),
+    ]
+    for pattern, options in cases:
+        for path in (root, str(tree / "pkg1")):
+            assert indexed.search(pattern, path, **options) == plain.search(pattern, path, **options), pattern
+    # Every case but the one without a usable literal went through the index
+    assert indexed.stats()["trigram"] == 2 * (len(cases) - 1)
+
+    index = indexed.trigram_index(root)
+    # Candidates can include files that only share the trigrams (mod18 has "value_126"); the regex decides
+    assert index.candidates(literal_query("function_12")) == ["pkg0/mod12.py", "pkg2/mod18.py"]
+    assert index.candidates(literal_query("return"), under="pkg3") == [f"pkg3/mod{i}.py" for i in sorted(range(3, 40, 4), key=str)]
+
+
+def test_refresh_from_agent_writes_and_mtimes(tree):
+    root = str(tree)
+    grep = GrepService(engine="python")
+    index = grep.trigram_index(root, create=True)
+    index.build()
+
+    # Written through the agent's tools: re-indexed on the next search
+    target = tree / "pkg2" / "mod2.py"
+    target.write_text("def renamed_function():\n    pass\n")
+    file_cache.invalidate(str(target))
+    assert grep.search("renamed_function", root) == f"{root}/pkg2/mod2.py"
+    assert grep.search("function_2\\(", root) == ""
+    assert index.stats()["delta_files"] == 1
+
+    # Changed behind the agent's back (shell, editor, git checkout): seen by the next search
+    (tree / "pkg3" / "new.py").write_text("external_change = 1\n")
+    os.remove(tree / "pkg1" / "mod1.py")
+    assert grep.search("external_change", root) == f"{root}/pkg3/new.py"
+    with open(tree / "pkg0" / "mod0.py", "a") as f:
+        f.write("needle_token = 1\n")
+    assert grep.search("needle_token", root) == f"{root}/pkg0/mod0.py"
+    assert grep.search("needle_token", str(tree / "pkg0")) == f"{root}/pkg0/mod0.py"
+    assert "mod1.py" not in grep.search("def function_1", root)
+    assert index.stats()["files"] == 41
+
+    # Another process (a fresh object) sees the same state, and a large delta triggers a rebuild
+    other = TrigramIndex(root, max_delta=2)
+    assert other.candidates(literal_query("external_change")) == ["pkg3/new.py"]
+    for i in range(4, 8):
+        (tree / "pkg0" / f"extra{i}.py").write_text(f"extra_{i} = 1\n")
+    assert other.refresh() == {"changed": 4, "rebuilt": 1}
+    assert other.stats()["delta_files"] == 0 and other.candidates(literal_query("extra_5")) == ["pkg0/extra5.py"]
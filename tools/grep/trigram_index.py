@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+On-disk trigram index that narrows custom_grep to the files that can match.
+
+Without an index, a search reads every file under the root. With one, the
+literal parts of the pattern are turned into a query over trigrams (3-byte
+substrings): ``def build_\\w+`` needs a file containing "def", "ef ", ...
+"ld_". The index maps each trigram to the sorted ids of the files that contain
+it. Only the files that contain all trigrams of some alternative are searched,
+and the regex still decides what matches. A pattern with no literal of 3 or
+more characters (``\\w+Error|x``) cannot be narrowed; :func:`literal_query`
+returns None and the caller scans everything as before.
+
+Trigrams are taken from the ASCII-lowercased bytes, so one index serves both
+case-sensitive and ``-i`` searches. The non-ASCII letters that Python's
+IGNORECASE matches to ASCII letters (ſ, K, İ, ı) are folded too.
+
+Layout under ``<root>/.panda_cache/trigram/``:
+
+  current.json       name of the live generation, replaced atomically
+  <generation>/      paths.txt and path_offsets.bin, stats.bin (mtime, size, kind per file),
+                     keys.bin (sorted trigram keys), offsets.bin, postings.bin
+                     (uint32 file ids, read through mmap), delta.pickle
+
+The index is refreshed from file mtimes, before every query
+(:meth:`TrigramIndex.sync`): each searchable file under the searched
+directory is stat'ed and compared with the mtime and size it was indexed
+with, and the files that changed, appeared or disappeared are re-indexed into
+a small delta (new ids, the old ids marked dead). Changes made outside the
+agent (shell commands, ``git checkout``, editors) are therefore never missed.
+Files written through the agent's tools are re-indexed even when a rewrite
+left their mtime and size unchanged. Everything is rebuilt when the delta
+grows past ``max_delta``.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from tools.file.file_cache import file_cache
+
+INDEX_DIR = os.path.join(".panda_cache", "trigram")
+BINARY_SNIFF_BYTES = 8192
+# Files larger than this are not indexed, and are searched by every query
+MAX_FILE_BYTES = 8 << 20
+KIND_TEXT, KIND_BINARY, KIND_LARGE = 0, 1, 2
+# Rarest trigrams intersected per "and" node; more rarely narrows further
+MAX_TRIGRAMS = 8
+
+# Letters that IGNORECASE matches to an ASCII letter: ſ, K (Kelvin), İ, ı
+_FOLD = ((b"\xc5\xbf", b"s"), (b"\xe2\x84\xaa", b"k"), (b"\xc4\xb0", b"i"), (b"\xc4\xb1", b"i"))
+
+# Query: None matches every file; bytes is a literal; ("and"|"or", [queries])
+Query = Union[None, bytes, Tuple[str, List[Any]]]
+
+
+def _fold(data: bytes) -> bytes:
+    if not data.isascii():
+        for letter, ascii_letter in _FOLD:
+            data = data.replace(letter, ascii_letter)
+    return data.lower()
+
+
+def trigrams(data: bytes) -> Set[int]:
+    """Trigram keys of ``data`` after case folding."""
+    data = _fold(data)
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+# -- pattern -> query ------------------------------------------------------------------------
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+class _Extractor:
+    """Collect the literals every match must contain, as an and/or tree."""
+
+    def __init__(self, ignore_case: bool):
+        self.ignore_case = ignore_case
+        self.parts: List[Any] = []
+        self.literal: List[str] = []
+
+    def flush(self):
+        if len(self.literal) >= 3:
+            self.parts.append("".join(self.literal).encode("utf-8", "surrogatepass"))
+        self.literal = []
+
+    def result(self) -> Query:
+        self.flush()
+        return ("and", self.parts) if self.parts else None
+
+    def sequence(self, items):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                char = chr(av)
+                if self.ignore_case and not char.isascii():
+                    self.flush()
+                else:
+                    self.literal.append(char)
+            elif op is sre_constants.AT:
+                # Anchors match no characters: the literals on both sides stay adjacent
+                continue
+            elif op is sre_constants.SUBPATTERN:
+                _, add_flags, del_flags, sub = av
+                ignore_case = self.ignore_case
+                if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                    ignore_case = True
+                if del_flags & sre_constants.SRE_FLAG_IGNORECASE:
+                    ignore_case = False
+                if ignore_case == self.ignore_case:
+                    self.sequence(sub)
+                else:
+                    self.required(_query(sub, ignore_case))
+            elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+                self.sequence(av)
+            elif op is sre_constants.BRANCH:
+                alternatives = [_query(alternative, self.ignore_case) for alternative in av[1]]
+                self.required(None if any(a is None for a in alternatives) else ("or", alternatives))
+            elif op in _REPEATS:
+                low, _, sub = av
+                self.required(_query(sub, self.ignore_case) if low >= 1 else None)
+            else:
+                # Classes, wildcards, lookarounds, backreferences: no literal to rely on
+                self.flush()
+
+    def required(self, query: Query):
+        self.flush()
+        if query is not None:
+            self.parts.append(query)
+
+
+def _query(items, ignore_case: bool) -> Query:
+    extractor = _Extractor(ignore_case)
+    extractor.sequence(items)
+    return extractor.result()
+
+
+def literal_query(pattern: str, ignore_case: bool = False) -> Query:
+    """Literals any match of ``pattern`` must contain, or None when the pattern has none usable."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    ignore_case = ignore_case or bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+    return _query(parsed, ignore_case)
+
+
+# -- index -----------------------------------------------------------------------------------
+
+def index_root(path: str) -> Optional[str]:
+    """``path`` or the closest enclosing directory that has an index, if any."""
+    directory = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(directory, INDEX_DIR, "current.json")):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _write_array(path: str, values: array):
+    with open(path, "wb") as f:
+        values.tofile(f)
+
+
+def _read_array(path: str, typecode: str) -> array:
+    values = array(typecode)
+    with open(path, "rb") as f:
+        values.frombytes(f.read())
+    return values
+
+
+def _scan(path: str) -> Tuple[int, int, int, Optional[Set[int]]]:
+    """(mtime_ns, size, kind, trigrams) of one file; trigrams is None unless it is indexed text."""
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size > MAX_FILE_BYTES:
+            return stat.st_mtime_ns, stat.st_size, KIND_LARGE, None
+        data = f.read()
+    if b"\x00" in data[:BINARY_SNIFF_BYTES]:
+        return stat.st_mtime_ns, stat.st_size, KIND_BINARY, None
+    return stat.st_mtime_ns, stat.st_size, KIND_TEXT, trigrams(data)
+
+
+class TrigramIndex:
+    """Trigram index of the searchable files under ``root`` (see the module docstring)."""
+
+    def __init__(self, root: str, max_delta: Optional[int] = None):
+        """
+        Args:
+            root: Directory the index covers.
+            max_delta: Changed files kept in the delta before a full rebuild,
+                ``max(1000, 5% of the files)`` by default.
+        """
+        self.root = os.path.abspath(root)
+        self.directory = os.path.join(self.root, INDEX_DIR)
+        self.max_delta = max_delta
+        self._lock = threading.RLock()
+        self._generation: Optional[str] = None
+        self._pointer_mtime: Optional[int] = None
+        self._written_seen = file_cache.generation
+
+    # -- loading -----------------------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, "current.json"))
+
+    def _load(self):
+        """Map the live generation, again only when another process replaced it."""
+        pointer = os.path.join(self.directory, "current.json")
+        mtime = os.stat(pointer).st_mtime_ns
+        if self._generation is not None and mtime == self._pointer_mtime:
+            return
+        with open(pointer, encoding="utf-8") as f:
+            meta = json.load(f)
+        folder = os.path.join(self.directory, meta["generation"])
+        self._close()
+        self.meta = meta
+        self._folder = folder
+        self._keys = _read_array(os.path.join(folder, "keys.bin"), "I")
+        self._offsets = _read_array(os.path.join(folder, "offsets.bin"), "Q")
+        self._postings_file = open(os.path.join(folder, "postings.bin"), "rb")
+        size = os.fstat(self._postings_file.fileno()).st_size
+        self._postings = mmap.mmap(self._postings_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._stats = _read_array(os.path.join(folder, "stats.bin"), "q")
+        # Candidate paths are sliced out of paths.txt; the full list is only read to refresh
+        self._path_offsets = _read_array(os.path.join(folder, "path_offsets.bin"), "Q")
+        self._paths_file = open(os.path.join(folder, "paths.txt"), "rb")
+        size = os.fstat(self._paths_file.fileno()).st_size
+        self._paths_map = mmap.mmap(self._paths_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._paths: Optional[List[str]] = None
+        self._ids: Optional[Dict[str, int]] = None
+        delta_path = os.path.join(folder, "delta.pickle")
+        if os.path.exists(delta_path):
+            with open(delta_path, "rb") as f:
+                self._delta = pickle.load(f)
+        else:
+            self._delta = {"paths": [], "stats": [], "postings": {}, "dead": set(), "large": []}
+        self._generation = meta["generation"]
+        self._pointer_mtime = mtime
+
+    def _close(self):
+        if self._generation is None:
+            return
+        for mapped, file in ((self._postings, self._postings_file), (self._paths_map, self._paths_file)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+            file.close()
+        self._generation = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    @property
+    def base_count(self) -> int:
+        return len(self._stats) // 3
+
+    def paths(self) -> List[str]:
+        if self._paths is None:
+            text = bytes(self._paths_map).decode("utf-8", "surrogateescape")
+            self._paths = text.split("\n")[:-1]
+        return self._paths
+
+    def path_of(self, file_id: int) -> str:
+        base = self.base_count
+        if file_id >= base:
+            return self._delta["paths"][file_id - base]
+        start, end = self._path_offsets[file_id], self._path_offsets[file_id + 1]
+        return self._paths_map[start:end].decode("utf-8", "surrogateescape").rstrip("\n")
+
+    # -- building ----------------------------------------------------------------------------
+
+    def _walk(self) -> List[str]:
+        from tools.grep.grep_service import FileIndex
+
+        return FileIndex(self.root).files
+
+    def build(self) -> Dict[str, Any]:
+        """Index every searchable file under the root from scratch."""
+        start = time.perf_counter()
+        postings: Dict[int, array] = {}
+        paths: List[str] = []
+        stats = array("q")
+        large: List[int] = []
+        for rel in self._walk():
+            try:
+                mtime, size, kind, keys = _scan(os.path.join(self.root, rel))
+            except OSError:
+                continue
+            file_id = len(paths)
+            paths.append(rel)
+            stats.extend((mtime, size, kind))
+            if kind == KIND_LARGE:
+                large.append(file_id)
+            for key in keys or ():
+                ids = postings.get(key)
+                if ids is None:
+                    ids = postings[key] = array("I")
+                ids.append(file_id)
+        with self._lock:
+            self._publish(paths, stats, postings, large)
+        return {**self.stats(), "build_s": round(time.perf_counter() - start, 3)}
+
+    def _publish(self, paths: List[str], stats: array, postings: Dict[int, array], large: List[int]):
+        """Write a new generation and switch current.json to it."""
+        generation = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        folder = os.path.join(self.directory, generation)
+        os.makedirs(folder)
+        keys = array("I", sorted(postings))
+        offsets = array("Q", [0])
+        with open(os.path.join(folder, "postings.bin"), "wb") as f:
+            for key in keys:
+                ids = postings[key]
+                ids.tofile(f)
+                offsets.append(offsets[-1] + len(ids))
+        _write_array(os.path.join(folder, "keys.bin"), keys)
+        _write_array(os.path.join(folder, "offsets.bin"), offsets)
+        _write_array(os.path.join(folder, "stats.bin"), stats)
+        path_offsets = array("Q", [0])
+        with open(os.path.join(folder, "paths.txt"), "wb") as f:
+            for rel in paths:
+                line = rel.encode("utf-8", "surrogateescape") + b"\n"
+                f.write(line)
+                path_offsets.append(path_offsets[-1] + len(line))
+        _write_array(os.path.join(folder, "path_offsets.bin"), path_offsets)
+        meta = {"version": 1, "generation": generation, "root": self.root, "refreshed": time.time(), "large": large}
+        self._replace_pointer(meta)
+        previous = self._generation
+        self._pointer_mtime = None
+        self._load()
+        if previous is not None and previous != generation:
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+
+    def _replace_pointer(self, meta: Dict[str, Any]):
+        pointer = os.path.join(self.directory, "current.json")
+        tmp = f"{pointer}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, pointer)
+
+    # -- refreshing --------------------------------------------------------------------------
+
+    def _known(self) -> Dict[str, int]:
+        """Relative path -> live file id."""
+        if self._ids is None:
+            dead = self._delta["dead"]
+            ids = {rel: i for i, rel in enumerate(self.paths()) if i not in dead}
+            base = self.base_count
+            for offset, rel in enumerate(self._delta["paths"]):
+                if base + offset not in dead:
+                    ids[rel] = base + offset
+            self._ids = ids
+        return self._ids
+
+    def _stat_of(self, file_id: int) -> Tuple[int, int]:
+        base = self.base_count
+        if file_id < base:
+            return self._stats[3 * file_id], self._stats[3 * file_id + 1]
+        return tuple(self._delta["stats"][file_id - base][:2])
+
+    def refresh(self, paths: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Re-index the files whose mtime or size changed, and drop deleted ones.
+
+        Args:
+            paths: Only check these files (absolute or relative to the root); all files by default.
+        """
+        with self._lock:
+            if not self.exists():
+                self.build()
+                return {"changed": 0, "rebuilt": 1}
+            self._load()
+            known = self._known()
+            if paths is None:
+                current = set(self._walk())
+                candidates = current | set(known)
+            else:
+                candidates, current = set(), set()
+                for path in paths:
+                    rel = os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+                    if rel.startswith("../"):
+                        continue
+                    candidates.add(rel)
+                    if os.path.isfile(os.path.join(self.root, rel)):
+                        current.add(rel)
+            return self._update(candidates, current, full=paths is None)
+
+    def _update(self, candidates: Iterable[str], current: Set[str], full: bool = False) -> Dict[str, int]:
+        """Re-index the ``candidates`` whose stat changed; those not in ``current`` are dropped."""
+        known = self._known()
+        changed = []
+        for rel in candidates:
+            file_id = known.get(rel)
+            if rel not in current:
+                if file_id is not None:
+                    changed.append(rel)
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, rel))
+            except OSError:
+                if file_id is not None:
+                    changed.append(rel)
+                continue
+            if file_id is None or self._stat_of(file_id) != (stat.st_mtime_ns, stat.st_size):
+                changed.append(rel)
+
+        limit = self.max_delta if self.max_delta is not None else max(1000, self.base_count // 20)
+        if len(self._delta["paths"]) + len(changed) > limit:
+            self.build()
+            return {"changed": len(changed), "rebuilt": 1}
+        if changed:
+            self._apply(sorted(changed), current)
+        if full:
+            self.meta["refreshed"] = time.time()
+            self._save_delta()
+        return {"changed": len(changed), "rebuilt": 0}
+
+    def _apply(self, changed: List[str], current: Set[str]):
+        delta, known = self._delta, self._known()
+        base = self.base_count
+        for rel in changed:
+            old = known.pop(rel, None)
+            if old is not None:
+                delta["dead"].add(old)
+            if rel not in current:
+                continue
+            try:
+                mtime, size, kind, keys = _scan(os.path.join(self.root, rel))
+            except OSError:
+                continue
+            file_id = base + len(delta["paths"])
+            delta["paths"].append(rel)
+            delta["stats"].append((mtime, size, kind))
+            if kind == KIND_LARGE:
+                delta["large"].append(file_id)
+            for key in keys or ():
+                delta["postings"].setdefault(key, []).append(file_id)
+            known[rel] = file_id
+        self._save_delta()
+
+    def _save_delta(self):
+        path = os.path.join(self._folder, "delta.pickle")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self._delta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._replace_pointer(self.meta)
+        self._pointer_mtime = os.stat(os.path.join(self.directory, "current.json")).st_mtime_ns
+
+    def sync(self, under: str, files: Sequence[str], paths: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date for a search of the directory ``under`` (relative
+        to the root, "." for the root itself).
+
+        Args:
+            under: The searched directory.
+            files: Its searchable files now, relative to ``under`` (the caller's
+                current file list). Each is checked against the mtime and size it
+                was indexed with; indexed files under ``under`` that are not listed
+                are dropped.
+            paths: The same files as absolute paths, when the caller has them.
+        """
+        with self._lock:
+            self._load()
+            generation = file_cache.generation
+            if generation != self._written_seen:
+                # Agent writes are re-indexed even when the rewrite kept mtime and size
+                written = file_cache.written_since(self._written_seen)
+                self._written_seen = generation
+                if written is None:
+                    self.build()
+                    return {"changed": 0, "rebuilt": 1}
+                inside = [p for p in written if p.startswith(self.root + os.sep)]
+                if inside:
+                    self.refresh(inside)
+            prefix = under.strip("/") + "/" if under.strip("/.") else ""
+            if paths is None:
+                paths = [os.path.join(self.root, prefix + rel) for rel in files]
+            known = self._known()
+            changed, listed = [], 0
+            for rel, path in zip(files, paths):
+                rel = prefix + rel
+                file_id = known.get(rel)
+                if file_id is not None:
+                    listed += 1
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if file_id is None or self._stat_of(file_id) != (stat.st_mtime_ns, stat.st_size):
+                    changed.append(rel)
+            indexed = len(known) if not prefix else sum(1 for rel in known if rel.startswith(prefix))
+            if indexed != listed:
+                # Deleted, or no longer searchable (e.g. newly ignored)
+                current = {prefix + rel for rel in files}
+                changed.extend(rel for rel in known if rel.startswith(prefix) and rel not in current)
+            if not changed:
+                return {"changed": 0, "rebuilt": 0}
+            return self._update(changed, {prefix + rel for rel in files})
+
+    # -- querying ----------------------------------------------------------------------------
+
+    def _span(self, key: int) -> Tuple[int, int]:
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return self._offsets[position], self._offsets[position + 1]
+        return 0, 0
+
+    def _count(self, key: int) -> int:
+        start, end = self._span(key)
+        return end - start + len(self._delta["postings"].get(key, ()))
+
+    def _postings_of(self, key: int) -> array:
+        ids = array("I")
+        start, end = self._span(key)
+        if end > start:
+            ids.frombytes(self._postings[start * 4:end * 4])
+        extra = self._delta["postings"].get(key)
+        if extra:
+            ids.extend(extra)
+        return ids
+
+    def _evaluate(self, query: Query) -> Optional[Set[int]]:
+        """Ids of the files that can match ``query``; None when it does not narrow anything."""
+        if query is None:
+            return None
+        if isinstance(query, bytes):
+            query = ("and", [query])
+        kind, parts = query
+        if kind == "or":
+            result: Set[int] = set()
+            for part in parts:
+                ids = self._evaluate(part)
+                if ids is None:
+                    return None
+                result |= ids
+            return result
+
+        keys: Set[int] = set()
+        for part in parts:
+            if isinstance(part, bytes):
+                keys |= trigrams(part)
+        result: Optional[Set[int]] = None
+        for key in sorted(keys, key=self._count)[:MAX_TRIGRAMS]:
+            ids = self._postings_of(key)
+            if result is None:
+                result = set(ids)
+            elif len(result) * 16 < len(ids):
+                result = {i for i in result if _contains(ids, i)}
+            else:
+                result.intersection_update(ids)
+            if not result:
+                return result
+        for part in parts:
+            if not isinstance(part, bytes):
+                ids = self._evaluate(part)
+                if ids is not None:
+                    result = ids if result is None else result & ids
+        return result
+
+    def candidates(self, query: Query, under: str = "") -> Optional[List[str]]:
+        """
+        Relative paths (sorted) of the files under ``under`` that can match ``query``,
+        or None when the query does not narrow the search.
+        """
+        with self._lock:
+            self._load()
+            ids = self._evaluate(query)
+            if ids is None:
+                return None
+            ids.difference_update(self._delta["dead"])
+            # Large files are not indexed, so any of them can match
+            ids.update(i for i in self.meta.get("large", []) + self._delta["large"] if i not in self._delta["dead"])
+            paths = [self.path_of(i) for i in ids]
+        prefix = under.strip("/") + "/" if under.strip("/.") else ""
+        return sorted(p for p in paths if p.startswith(prefix))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            size = sum(os.path.getsize(os.path.join(self._folder, name)) for name in os.listdir(self._folder))
+            return {
+                "files": self.base_count + len(self._delta["paths"]) - len(self._delta["dead"]),
+                "trigrams": len(self._keys),
+                "delta_files": len(self._delta["paths"]),
+                "bytes": size,
+                "age_s": round(time.time() - self.meta.get("refreshed", 0), 1),
+            }
+
+
+def _contains(ids: array, value: int) -> bool:
+    position = bisect.bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Test script for the sequential_thinking thought store."""
+
+import pytest
+
+from tools.thinking.thought_store import ThoughtGraph, ThoughtStore
+
+
+def _numbers(graph):
+    return [(t.branch_id, t.number) for t in graph.path()]
+
+
+def test_branch_switch_prunes_the_abandoned_thoughts():
+    graph = ThoughtGraph()
+    for n in range(1, 6):
+        graph.add(f"main thought {n}", n, 8, True)
+    # Branching from 3 abandons main's 4 and 5
+    graph.add("try the cache instead", 4, 8, True, branch_from_thought=3, branch_id="cache")
+    graph.add("cache works", 5, 8, True, branch_id="cache")
+    assert _numbers(graph) == [("main", 1), ("main", 2), ("main", 3), ("cache", 4), ("cache", 5)]
+    assert graph.pruned == {"main": 2}
+    assert graph.status(5, None) == "pruned" and graph.status(5, "cache") == "active"
+
+    # A sibling branch from 2 prunes the whole "cache" branch and main's 3
+    graph.add("rethink from 2", 3, 8, False, branch_from_thought=2, branch_id="alt")
+    assert _numbers(graph) == [("main", 1), ("main", 2), ("alt", 3)]
+    assert graph.pruned == {"main": 3, "cache": 2}
+
+    state = graph.render()
+    assert state.startswith("thought 3/8 on branch alt (from thought 2), next_thought_needed=False")
+    assert "alt/3. rethink from 2" in state and "cache works" not in state
+
+
+def test_revisions_and_condensed_render():
+    graph = ThoughtGraph(digest_chars=20, max_path=3)
+    graph.add("first line of a long thought\nsecond line", 1, 3, True)
+    graph.add("two", 2, 3, True)
+    graph.add("one is wrong", 3, 3, True, is_revision=True, revises_thought=1)
+    graph.add("four", 4, 5, False, needs_more_thoughts=True)
+    state = graph.render()
+    assert "  ... 1 earlier thoughts" in state
+    assert "(revises 1) one is wrong" in state and "thought 4/5" in state
+    assert graph.next_thought_needed is True
+    assert graph.find(1).text == "" and graph.status(1, None) == "revised"
+
+    graph = ThoughtGraph(digest_chars=20)
+    graph.add("first line of a long thought\nsecond line", 1, 3, True)
+    assert "1. first line of a lon…" in graph.render()
+    with pytest.raises(ValueError):
+        graph.add("x", 2, 3, True, is_revision=True, revises_thought=7)
+    with pytest.raises(ValueError):
+        graph.add("x", 2, 3, True, branch_from_thought=9, branch_id="b")
+
+
+def test_rejected_thoughts_change_nothing():
+    graph = ThoughtGraph()
+    for n in range(1, 4):
+        graph.add(f"thought {n}", n, 5, True)
+    graph.add("fork", 3, 5, True, branch_from_thought=2, branch_id="b")
+    before = (_numbers(graph), graph.active, dict(graph.pruned), graph.render())
+    for kwargs in ({"is_revision": True, "revises_thought": 9},
+                   # Thought 3 would be replaced by this one, so it cannot be its revision target
+                   {"is_revision": True, "revises_thought": 3, "branch_id": "b"},
+                   {"is_revision": True, "revises_thought": 3, "branch_from_thought": 1, "branch_id": "c"}):
+        with pytest.raises(ValueError):
+            graph.add("x", 3 if kwargs.get("branch_id") else 2, 5, True, **kwargs)
+        assert (_numbers(graph), graph.active, dict(graph.pruned), graph.render()) == before
+    assert set(graph.branches) == {"main", "b"}
+
+    # Revising a thought of the parent branch from a new branch still works
+    graph.add("2 was wrong", 3, 5, True, is_revision=True, revises_thought=1, branch_from_thought=2, branch_id="c")
+    assert _numbers(graph) == [("main", 1), ("main", 2), ("c", 3)] and graph.find(1).revised_by == 3
+
+
+def test_store_is_per_session_and_bounded():
+    store = ThoughtStore(max_sessions=2)
+    store.get("a").add("a1", 1, 1, False)
+    store.get("b")
+    store.get("c")
+    assert store.peek("a") is None and store.peek("b") is not None
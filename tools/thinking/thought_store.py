@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Per-session state for the ``sequential_thinking`` tool.
+
+Each call records one thought: its number, an optional revision target and an
+optional branch (``branch_id`` forked at ``branch_from_thought``). The thoughts
+form a tree, and the latest thought picks the active path through it. Only
+that path is kept: when the model switches branch, the thoughts off the path
+are pruned and only counted. Revised thoughts drop their text. What goes back
+to the model is a condensed view of the active path, with one short digest per
+thought, not the full text of every thought so far.
+
+State lives in memory, one ThoughtGraph per thread_id, and the least recently
+used sessions are evicted.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+MAIN_BRANCH = "main"
+
+
+class Thought:
+    __slots__ = ("number", "branch_id", "text", "revises", "revised_by")
+
+    def __init__(self, number: int, branch_id: str, text: str, revises: Optional[int] = None):
+        self.number = number
+        self.branch_id = branch_id
+        self.text = text
+        self.revises = revises
+        self.revised_by: Optional[int] = None
+
+
+def digest(text: str, max_chars: int) -> str:
+    """First line of ``text``, cut to ``max_chars``."""
+    line = text.strip().split("\n", 1)[0]
+    return line if len(line) <= max_chars else line[:max_chars - 1] + "…"
+
+
+class ThoughtGraph:
+    """The thoughts of one session: branches, their fork points, and the active path."""
+
+    def __init__(self, digest_chars: int = 160, max_path: int = 30):
+        """
+        Args:
+            digest_chars: Length of the digest shown for each thought on the active path.
+            max_path: Thoughts listed in the condensed state; older ones are only counted.
+        """
+        self.digest_chars = digest_chars
+        self.max_path = max_path
+        self.branches: Dict[str, List[Thought]] = {MAIN_BRANCH: []}
+        # branch id -> (parent branch id, number of the thought it forks from)
+        self.forks: Dict[str, Tuple[str, int]] = {}
+        self.active = MAIN_BRANCH
+        self.total_thoughts = 0
+        self.next_thought_needed = True
+        self.pruned: Dict[str, int] = {}
+
+    def path(self) -> List[Thought]:
+        """Thoughts on the active path, oldest first."""
+        chain = [self.active]
+        while chain[-1] in self.forks:
+            chain.append(self.forks[chain[-1]][0])
+        thoughts: List[Thought] = []
+        for branch in reversed(chain):
+            thoughts.extend(self.branches[branch])
+        return thoughts
+
+    def find(self, number: int) -> Optional[Thought]:
+        """The thought with this number on the active path."""
+        for thought in reversed(self.path()):
+            if thought.number == number:
+                return thought
+        return None
+
+    def add(self, thought: str, thought_number: int, total_thoughts: int, next_thought_needed: bool,
+            is_revision: bool = False, revises_thought: Optional[int] = None,
+            branch_from_thought: Optional[int] = None, branch_id: Optional[str] = None,
+            needs_more_thoughts: bool = False) -> Thought:
+        """
+        Record a thought and make its branch the active one.
+
+        Raises:
+            ValueError: The fork or revision target is not on the path; nothing was changed.
+        """
+        branch = branch_id or MAIN_BRANCH
+        fork_point = None
+        if branch not in self.branches:
+            parent = self.active
+            fork = branch_from_thought if branch_from_thought is not None else thought_number - 1
+            if self.find(fork) is None and fork > 0:
+                raise ValueError(f"branch_from_thought {fork} is not on the current path")
+            # The new branch hangs off the deepest branch of the path that holds the fork thought
+            while parent != MAIN_BRANCH and not any(t.number <= fork for t in self.branches[parent]):
+                parent = self.forks[parent][0]
+            fork_point = (parent, fork)
+        revises = revises_thought if is_revision else None
+        target = None
+        if revises is not None:
+            # Looked up on the path this thought will be on, before anything is pruned
+            target = next((t for t in self._path_to(branch, fork_point, thought_number) if t.number == revises), None)
+            if target is None:
+                raise ValueError(f"revises_thought {revises} is not on the current path")
+
+        if fork_point is not None:
+            self.branches[branch] = []
+            self.forks[branch] = fork_point
+        self.active = branch
+        self._prune()
+        thoughts = self.branches[branch]
+        # Re-sending a number on the same branch replaces it and abandons what followed
+        while thoughts and thoughts[-1].number >= thought_number:
+            self._count_pruned(branch, 1)
+            thoughts.pop()
+        if target is not None:
+            target.revised_by = thought_number
+            target.text = ""
+        record = Thought(thought_number, branch, thought, revises)
+        thoughts.append(record)
+        self.total_thoughts = max(total_thoughts, thought_number)
+        self.next_thought_needed = bool(next_thought_needed or needs_more_thoughts)
+        return record
+
+    def _path_to(self, branch: str, fork_point: Optional[Tuple[str, int]], thought_number: int) -> List[Thought]:
+        """The thoughts that precede ``thought_number`` on ``branch`` once it is active, without pruning."""
+        limits = {branch: thought_number - 1}
+        while True:
+            parent, fork = fork_point if fork_point is not None else self.forks.get(branch, (None, 0))
+            fork_point = None
+            if parent is None:
+                break
+            limits[parent] = min(limits.get(parent, fork), fork)
+            branch = parent
+        return [t for name, limit in limits.items() for t in self.branches.get(name, []) if t.number <= limit]
+
+    def _prune(self):
+        """Drop every thought that is not on the active path."""
+        keep: Dict[str, int] = {self.active: 1 << 62}
+        branch = self.active
+        while branch in self.forks:
+            parent, fork = self.forks[branch]
+            keep[parent] = min(keep.get(parent, 1 << 62), fork)
+            branch = parent
+        for branch in list(self.branches):
+            if branch not in keep:
+                self._count_pruned(branch, len(self.branches.pop(branch)))
+                self.forks.pop(branch, None)
+                continue
+            thoughts = self.branches[branch]
+            kept = [t for t in thoughts if t.number <= keep[branch]]
+            if len(kept) != len(thoughts):
+                self._count_pruned(branch, len(thoughts) - len(kept))
+                self.branches[branch] = kept
+
+    def _count_pruned(self, branch: str, count: int):
+        if count:
+            self.pruned[branch] = self.pruned.get(branch, 0) + count
+
+    def status(self, number: int, branch_id: Optional[str]) -> str:
+        """ "active", "revised" or "pruned" for a thought recorded earlier."""
+        branch = branch_id or MAIN_BRANCH
+        for thought in self.branches.get(branch, []):
+            if thought.number == number:
+                return "revised" if thought.revised_by is not None else "active"
+        return "pruned"
+
+    def render(self) -> str:
+        """Condensed state of the active path, returned to the model after each thought."""
+        path = self.path()
+        latest = path[-1] if path else None
+        header = f"thought {latest.number if latest else 0}/{self.total_thoughts}"
+        if self.active != MAIN_BRANCH:
+            header += f" on branch {self.active} (from thought {self.forks[self.active][1]})"
+        lines = [f"{header}, next_thought_needed={self.next_thought_needed}", f"active path ({len(path)} thoughts):"]
+        if len(path) > self.max_path:
+            lines.append(f"  ... {len(path) - self.max_path} earlier thoughts")
+        for thought in path[-self.max_path:]:
+            label = str(thought.number) if thought.branch_id == MAIN_BRANCH else f"{thought.branch_id}/{thought.number}"
+            if thought.revised_by is not None:
+                lines.append(f"  {label}. (revised by thought {thought.revised_by})")
+                continue
+            prefix = f"(revises {thought.revises}) " if thought.revises is not None else ""
+            lines.append(f"  {label}. {prefix}{digest(thought.text, self.digest_chars)}")
+        if self.pruned:
+            dropped = ", ".join(f"{branch}: {count}" for branch, count in self.pruned.items())
+            lines.append(f"pruned thoughts off the active path ({dropped})")
+        return "\n".join(lines)
+
+
+class ThoughtStore:
+    """ThoughtGraph per thread_id, with least recently used sessions evicted."""
+
+    def __init__(self, max_sessions: int = 1024, **graph_options):
+        self.max_sessions = max_sessions
+        self.graph_options = graph_options
+        self._graphs: "OrderedDict[str, ThoughtGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> ThoughtGraph:
+        with self._lock:
+            graph = self._graphs.get(thread_id)
+            if graph is None:
+                graph = self._graphs[thread_id] = ThoughtGraph(**self.graph_options)
+                while len(self._graphs) > self.max_sessions:
+                    self._graphs.popitem(last=False)
+            self._graphs.move_to_end(thread_id)
+            return graph
+
+    def peek(self, thread_id: str) -> Optional[ThoughtGraph]:
+        """The graph of ``thread_id`` if the session has one, without creating it."""
+        with self._lock:
+            return self._graphs.get(thread_id)
+
+    def drop(self, thread_id: str):
+        with self._lock:
+            self._graphs.pop(thread_id, None)
+
+
+# Shared by the sequential_thinking tool and ThoughtCompactionMiddleware in this process
+thought_store = ThoughtStore()